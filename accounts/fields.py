@@ -1,38 +1,159 @@
+import os
+import time
 import uuid
-from datetime import datetime
+from collections import namedtuple
+from datetime import datetime, timezone
 try:
     from typing import Self
 except ImportError:
     from typing_extensions import Self
 
+from django.conf import settings
 from django.db import models
 
 
+# Crockford's base32 alphabet is in ASCII order, so encoded keys sort like the integers they encode
+CROCKFORD_ALPHABET = '0123456789ABCDEFGHJKMNPQRSTVWXYZ'
+CROCKFORD_PAIRS = [first + second for first in CROCKFORD_ALPHABET for second in CROCKFORD_ALPHABET]
+FROM_CROCKFORD = str.maketrans(CROCKFORD_ALPHABET, '0123456789abcdefghijklmnopqrstuv')
+
+COMPACT_KEY_LENGTH = 26
+RANDOM_BITS = 80
+RANDOM_MASK = (1 << RANDOM_BITS) - 1
+
+ParsedID = namedtuple('ParsedID', ['prefix', 'timestamp', 'key', 'compact'])
+
+
+def encode_compact_key(key: int) -> str:
+    """
+    Render a 128 bits key as 26 Crockford base32 characters, the canonical ULID form.
+    """
+    return ''.join(CROCKFORD_ALPHABET[(key >> shift) & 31] for shift in range(125, -1, -5))
+
+
+def encode_compact_keys(first_key: int, count: int) -> list:
+    """
+    Render `count` consecutive keys starting at `first_key`.
+    Consecutive keys share their leading characters, only the last four are looked up for each key.
+    """
+    encoded = []
+    head_key = None
+    for key in range(first_key, first_key + count):
+        if key >> 20 != head_key:
+            head_key = key >> 20
+            head = encode_compact_key(key)[:-4]
+        low = key & 0xFFFFF
+        encoded.append(head + CROCKFORD_PAIRS[low >> 10] + CROCKFORD_PAIRS[low & 0x3FF])
+    return encoded
+
+
+def decode_compact_key(value: str) -> int:
+    """
+    Parse 26 Crockford base32 characters back into the 128 bits key they render.
+    """
+    return int(value.upper().translate(FROM_CROCKFORD), 32)
+
+
 class PrefixedIDField(models.CharField):
     """
     Custom Django field that generates IDs in the format:
     PREFIX-YYYYMMDD-HHMMSS-UUID
 
     Example: USER-20241215-143022-A1B2C3D4-E5F6-7890-ABCD-EF1234567890
+
+    When the `PREFIXED_ID_FORMAT` setting is `compact`, new IDs are generated in the format:
+    PREFIX-KEY
+
+    Example: USER-01JF3Q8Z5W4XKVB2M9R7T6YD0C
+
+    KEY renders a ULID-like 128 bits integer, 48 bits of milliseconds since the epoch followed by 80 random bits,
+    so compact IDs are about half as long and sort by creation time, and new rows are appended at the end of the
+    indexes instead of being scattered across them. Both formats can live in the same column, the max length is
+    kept so switching formats needs no schema migration, and `parse` reads both. Compact keys start with `0` until
+    the year 3084 while legacy ones start with the year, so once a table holds both formats the compact IDs sort
+    first and primary key order is not creation order anymore, order by the creation timestamp instead.
     """
 
     def __init__(self, prefix: str = "PREFIX", *args, **kwargs) -> None:
         self.prefix = prefix
-        # Set max_length to accommodate the full ID format
-        # PREFIX (variable) + "-" + YYYYMMDD (8) + "-" + HHMMSS (6) + "-" + UUID (36) = variable + 51
-        kwargs.setdefault('max_length', len(prefix) + 51)
-        kwargs.setdefault('unique', True)
+        # Set max_length to accommodate the full ID format, the legacy one being the longest
+        # PREFIX (variable) + "-" + YYYYMMDD (8) + "-" + HHMMSS (6) + "-" + UUID (36) = variable + 53
+        kwargs.setdefault('max_length', len(prefix) + 53)
+        # primary_key implies unique, declaring it as well is redundant
         kwargs.setdefault('primary_key', True)
         kwargs.setdefault('editable', False)
         super().__init__(*args, **kwargs)
 
+    @property
+    def is_compact(self) -> bool:
+        return getattr(settings, 'PREFIXED_ID_FORMAT', 'legacy') == 'compact'
+
     def generate_id(self) -> str:
         """
         Generate a new ID in the specified format
         """
+        if self.is_compact:
+            return self.generate_compact_ids(1)[0]
+
         now = datetime.now()
         return f"{self.prefix}-{now.strftime('%Y%m%d-%H%M%S')}-{str(uuid.uuid4()).upper()}"
 
+    def generate_ids(self, count: int) -> list:
+        """
+        Generate many IDs at once for bulk inserts, in the specified format
+        """
+        if self.is_compact:
+            return self.generate_compact_ids(count)
+        return self.generate_legacy_ids(count)
+
+    def generate_legacy_ids(self, count: int) -> list:
+        """
+        Generate many legacy IDs, the timestamp part is computed a single time
+        """
+        timestamp = datetime.now().strftime('%Y%m%d-%H%M%S')
+        return [f"{self.prefix}-{timestamp}-{str(uuid.uuid4()).upper()}" for _ in range(count)]
+
+    def generate_compact_ids(self, count: int) -> list:
+        """
+        Generate many compact IDs from a single clock read and random draw, incremented per ID,
+        so they keep their generation order
+        """
+        # The top random bit is left clear so incrementing can never carry into the timestamp
+        key = (time.time_ns() // 1_000_000) << RANDOM_BITS
+        key |= int.from_bytes(os.urandom(RANDOM_BITS // 8), 'big') & (RANDOM_MASK >> 1)
+        return [f"{self.prefix}-{encoded}" for encoded in encode_compact_keys(key, count)]
+
+    def parse(self, value: str) -> ParsedID:
+        """
+        Parse an ID of either format.
+
+        Returns:
+            - A ParsedID with the prefix, the creation timestamp, the 128 bits key as an integer, usable as a binary
+              or numeric key, and whether the ID is compact.
+
+        Raises:
+            - ValueError: If the value is not an ID of this field.
+        """
+        if not value or not value.startswith(f'{self.prefix}-'):
+            raise ValueError(f'{value!r} is not a {self.prefix} ID.')
+        body = value[len(self.prefix) + 1:]
+
+        if len(body) == COMPACT_KEY_LENGTH:
+            key = decode_compact_key(body)
+            timestamp = datetime.fromtimestamp((key >> RANDOM_BITS) / 1000, tz=timezone.utc)
+            return ParsedID(self.prefix, timestamp, key, True)
+
+        if len(body) != 52:
+            raise ValueError(f'{value!r} is not a {self.prefix} ID.')
+        timestamp, key = body[:15], body[16:]
+        return ParsedID(self.prefix, datetime.strptime(timestamp, '%Y%m%d-%H%M%S'), uuid.UUID(key).int, False)
+
+    def render(self, key: int) -> str:
+        """
+        Render a compact key, as returned by `parse`, back into its prefixed string form.
+        """
+        return f'{self.prefix}-{encode_compact_key(key)}'
+
     def pre_save(self, model_instance: Self, add: bool) -> str:
         """
         Generate the ID before saving if it's a new instance.
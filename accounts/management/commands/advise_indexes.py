@@ -0,0 +1,81 @@
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, migrations
+from django.db.migrations.autodetector import MigrationAutodetector
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.writer import MigrationWriter
+
+from core.indexes import advise_indexes
+
+
+class Command(BaseCommand):
+    help = ('Report the redundant indexes of the live schema and the hot queries no index serves, '
+            'optionally writing the migrations fixing them.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--app', action='append', dest='app_labels',
+            help='Only inspect the models of this app, can be repeated.'
+        )
+        parser.add_argument(
+            '--database', default=DEFAULT_DB_ALIAS,
+            help='The database whose schema is inspected.'
+        )
+        parser.add_argument(
+            '--write-migrations', action='store_true',
+            help='Write one migration per app with the operations fixing the findings.'
+        )
+        parser.add_argument(
+            '--name', default='advise_indexes',
+            help='The name of the written migrations.'
+        )
+
+    def handle(self, *args, **options):
+        findings = advise_indexes(options['app_labels'], options['database'])
+        if not findings:
+            self.stdout.write(self.style.SUCCESS('No redundant or missing index found.'))
+            return
+
+        operations = defaultdict(list)
+        for finding in findings:
+            style = self.style.WARNING if finding.kind == 'redundant' else self.style.ERROR
+            self.stdout.write(style(
+                f"{finding.kind.capitalize()} {finding.model} {finding.name or 'primary key'} "
+                f"({', '.join(finding.columns)})"
+            ))
+            self.stdout.write(f'    {finding.reason}')
+            if finding.operation is not None:
+                self.stdout.write(f'    Fix: {finding.operation.describe()}')
+                operations[finding.model.split('.')[0]].append(finding.operation)
+            else:
+                self.stdout.write('    Fix: no operation can be written for it, change it by hand.')
+
+        if options['write_migrations']:
+            self.write_migrations(operations, options['name'])
+        elif operations:
+            self.stdout.write('Run again with --write-migrations to write the migrations fixing them.')
+
+    def write_migrations(self, operations: dict, name: str):
+        """
+        Write one migration per app after its latest one. The models must be changed the same way, so that
+        `makemigrations` does not revert them.
+        """
+        loader = MigrationLoader(None, ignore_no_migrations=True)
+        for app_label, app_operations in sorted(operations.items()):
+            leaf = max(loader.graph.leaf_nodes(app_label))
+            number = (MigrationAutodetector.parse_number(leaf[1]) or 0) + 1
+
+            migration = migrations.Migration(f'{number:04d}_{name}', app_label)
+            migration.dependencies = [leaf]
+            migration.operations = app_operations
+
+            writer = MigrationWriter(migration)
+            with open(writer.path, 'w', encoding='utf-8') as migration_file:
+                migration_file.write(writer.as_string())
+            self.stdout.write(self.style.SUCCESS(f'Wrote {writer.path}'))
+
+        self.stdout.write(
+            'Mirror the migrations in the models, drop the removed Meta.indexes, add the new ones and set '
+            'db_index=False on the altered fields, then check that `makemigrations --check` finds no changes.'
+        )
@@ -0,0 +1,118 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from accounts.fields import PrefixedIDField
+from core.benchmarks import benchmark_database
+
+
+class Command(BaseCommand):
+    help = ('Compare the insert rate and index size of legacy and compact prefixed IDs, and of the binary keys '
+            'they render, on a throwaway database.')
+
+    # Column type of the binary key per database vendor
+    binary_types = {
+        'sqlite': 'BLOB',
+        'postgresql': 'BYTEA',
+    }
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help='Number of rows inserted per key format.')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Number of rows per insert batch.')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the random generator.')
+
+    def handle(self, *args, **options):
+        if connection.vendor not in self.binary_types:
+            raise CommandError(f'Index sizes cannot be measured on {connection.vendor}.')
+
+        rng = random.Random(options['seed'])
+        field = PrefixedIDField(prefix='ORD-ITM')
+        formats = {
+            'legacy': ('VARCHAR(64)', field.generate_legacy_ids),
+            'compact': ('VARCHAR(64)', field.generate_compact_ids),
+            'binary': (self.binary_types[connection.vendor], lambda count: [
+                field.parse(value).key.to_bytes(16, 'big') for value in field.generate_compact_ids(count)
+            ]),
+        }
+
+        results = {}
+        with benchmark_database():
+            for name, (column_type, generate) in formats.items():
+                results[name] = self.run(f'benchmark_{name}_ids', column_type, generate, rng, options)
+
+        self.stdout.write(
+            f"{'format':<10}{'key bytes':>10}{'generate s':>12}{'insert s':>10}{'rows/s':>12}"
+            f"{'pk index KiB':>14}{'fk index KiB':>14}"
+        )
+        for name, result in results.items():
+            self.stdout.write(
+                f"{name:<10}{result['key_bytes']:>10}{result['generate']:>12.3f}{result['insert']:>10.3f}"
+                f"{options['rows'] / result['insert']:>12.0f}{result['pk_index'] / 1024:>14.0f}"
+                f"{result['fk_index'] / 1024:>14.0f}"
+            )
+
+    def run(self, table, column_type, generate, rng, options):
+        """
+        Insert rows keyed by one format, each pointing to an earlier row like a foreign key does, and measure
+        the generation time, the insert time and the size of both indexes.
+        """
+        rows = options['rows']
+        batch_size = options['batch_size']
+
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TABLE {table} (id {column_type} PRIMARY KEY, parent_id {column_type}, quantity INTEGER)'
+            )
+            cursor.execute(f'CREATE INDEX {table}_parent ON {table} (parent_id)')
+
+        started_at = time.perf_counter()
+        keys = []
+        while len(keys) < rows:
+            keys.extend(generate(min(batch_size, rows - len(keys))))
+        generate_seconds = time.perf_counter() - started_at
+
+        started_at = time.perf_counter()
+        with transaction.atomic(), connection.cursor() as cursor:
+            for start in range(0, rows, batch_size):
+                cursor.executemany(
+                    f'INSERT INTO {table} (id, parent_id, quantity) VALUES (%s, %s, %s)',
+                    [
+                        (key, keys[rng.randrange(index + 1)], 1)
+                        for index, key in enumerate(keys[start:start + batch_size], start)
+                    ]
+                )
+        insert_seconds = time.perf_counter() - started_at
+
+        return {
+            'key_bytes': len(keys[0]),
+            'generate': generate_seconds,
+            'insert': insert_seconds,
+            'pk_index': self.get_primary_key_index_size(table),
+            'fk_index': self.get_index_size(f'{table}_parent'),
+        }
+
+    @staticmethod
+    def get_index_size(index):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute('SELECT SUM(pgsize) FROM dbstat WHERE name = %s', [index])
+            else:
+                cursor.execute('SELECT pg_relation_size(%s::regclass)', [index])
+            return cursor.fetchone()[0] or 0
+
+    def get_primary_key_index_size(self, table):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'sqlite':
+                cursor.execute(
+                    "SELECT name FROM sqlite_master "
+                    "WHERE type = 'index' AND tbl_name = %s AND name LIKE 'sqlite_autoindex%%'",
+                    [table]
+                )
+            else:
+                cursor.execute(
+                    'SELECT indexrelid::regclass::text FROM pg_index WHERE indrelid = %s::regclass AND indisprimary',
+                    [table]
+                )
+            return self.get_index_size(cursor.fetchone()[0])
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:25
+
+import accounts.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_index_cleanup'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='user',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=56, primary_key=True, serialize=False, verbose_name='User ID'),
+        ),
+    ]
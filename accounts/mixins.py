@@ -0,0 +1,61 @@
+class FieldTrackerMixin:
+    """
+    Model mixin remembering the values of `tracked_fields` as they were loaded from the database,
+    so a save can tell what changed without fetching the old row again.
+
+    The snapshot is taken in `from_db` and refreshed after every save, which means `post_save`
+    receivers still see the previous values through `old_value`.
+
+    Example:
+        class Order(FieldTrackerMixin, models.Model):
+            tracked_fields = ('status',)
+    """
+
+    tracked_fields: tuple = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance.snapshot_tracked_fields()
+        return instance
+
+    def refresh_from_db(self, *args, **kwargs) -> None:
+        super().refresh_from_db(*args, **kwargs)
+        self.snapshot_tracked_fields()
+
+    def save(self, *args, **kwargs) -> None:
+        super().save(*args, **kwargs)
+        self.snapshot_tracked_fields()
+
+    def snapshot_tracked_fields(self) -> None:
+        """
+        Store the current value of every loaded tracked field, deferred fields are skipped.
+        """
+        self._tracked_values = {
+            field_name: self.__dict__[attname]
+            for field_name, attname in self._get_tracked_attnames()
+            if attname in self.__dict__
+        }
+
+    def has_changed(self, field_name: str) -> bool:
+        """
+        Check if a tracked field differs from its loaded value, always True for new instances.
+        """
+        if self._state.adding or field_name not in self._get_tracked_values():
+            return True
+        attname = self._meta.get_field(field_name).attname
+        return self._tracked_values[field_name] != getattr(self, attname)
+
+    def old_value(self, field_name: str, default=None):
+        """
+        Get the loaded value of a tracked field, `default` for new or never loaded instances.
+        Relations are returned as their raw value, i.e. the related object id.
+        """
+        return self._get_tracked_values().get(field_name, default)
+
+    def _get_tracked_values(self) -> dict:
+        return getattr(self, '_tracked_values', {})
+
+    @classmethod
+    def _get_tracked_attnames(cls):
+        return [(field_name, cls._meta.get_field(field_name).attname) for field_name in cls.tracked_fields]
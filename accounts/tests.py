@@ -1,3 +1,252 @@
-from django.test import TestCase
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.apps import apps
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, migrations
+from django.db.migrations.loader import MigrationLoader
+from django.db.migrations.writer import MigrationWriter
+from django.db.models.signals import post_save
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from accounts.fields import PrefixedIDField
+from accounts.models import CustomerUser, InventoryCoordinatorUser, TransporterUser, WorkerUser
+from core.indexes import IndexFinding, advise_indexes, find_missing_indexes, find_redundant_indexes
+from inventory.models import Category, ReadyMaterial, PackagedMaterial
+from orders.enums import OrderStatus
+from orders.models import Order
+from restaurant.models import Restaurant, StockReservation
+
+
+class PrefixedIDFieldTests(SimpleTestCase):
+
+    def setUp(self):
+        self.field = PrefixedIDField(prefix='CAT')
+
+    def test_legacy_format_is_the_default(self):
+        with override_settings():
+            del settings.PREFIXED_ID_FORMAT
+            self.assertFalse(self.field.parse(self.field.generate_id()).compact)
+
+    def test_parses_both_formats(self):
+        legacy = self.field.parse('CAT-20241215-143022-A1B2C3D4-E5F6-7890-ABCD-EF1234567890')
+        self.assertFalse(legacy.compact)
+        self.assertEqual(legacy.timestamp.strftime('%Y%m%d%H%M%S'), '20241215143022')
+
+        with override_settings(PREFIXED_ID_FORMAT='compact'):
+            value = self.field.generate_id()
+        compact = self.field.parse(value)
+        self.assertTrue(compact.compact)
+        self.assertEqual(self.field.render(compact.key), value)
+
+        for invalid in ('', 'CAT-123', 'USR-20241215-143022-A1B2C3D4-E5F6-7890-ABCD-EF1234567890'):
+            with self.assertRaises(ValueError):
+                self.field.parse(invalid)
+
+    def test_max_length_fits_both_formats(self):
+        for model in apps.get_models():
+            for field in model._meta.local_fields:
+                if not isinstance(field, PrefixedIDField):
+                    continue
+                with self.subTest(field=str(field)):
+                    self.assertEqual(len(field.generate_id()), field.max_length)
+                    with override_settings(PREFIXED_ID_FORMAT='compact'):
+                        self.assertLess(len(field.generate_id()), field.max_length)
+
+    @override_settings(PREFIXED_ID_FORMAT='compact')
+    def test_compact_ids_keep_their_generation_order(self):
+        values = self.field.generate_ids(1000)
+        self.assertEqual(sorted(values), values)
+        self.assertEqual(len(set(values)), len(values))
+
+
+class MixedPrefixedIDTests(TestCase):
+
+    def test_both_formats_live_in_the_same_table(self):
+        legacy = Category.objects.create(name='Legacy')
+        with override_settings(PREFIXED_ID_FORMAT='compact'):
+            compact = Category.objects.create(name='Compact')
+
+        self.assertEqual(Category.objects.get(pk=legacy.pk).name, 'Legacy')
+        self.assertEqual(Category.objects.get(pk=compact.pk).name, 'Compact')
+        # Compact IDs sort before legacy ones whatever their creation time
+        self.assertEqual(list(Category.objects.order_by('pk')), [compact, legacy])
+
+
+class IndexAdvisorTests(TestCase):
+
+    def get_index(self, name, *columns, **kwargs) -> dict:
+        return {'name': name, 'columns': list(columns), 'primary_key': False, 'unique': False, **kwargs}
+
+    def test_live_schema_has_no_findings(self):
+        self.assertEqual(advise_indexes(), [])
+
+        output = StringIO()
+        call_command('advise_indexes', stdout=output)
+        self.assertIn('No redundant or missing index found.', output.getvalue())
+
+    def test_redundant_indexes_are_found_with_their_fix(self):
+        findings = find_redundant_indexes(StockReservation, [
+            self.get_index('pk', 'id', primary_key=True),
+            self.get_index('order_material_uniq', 'order_id', 'material_id', unique=True),
+            # Kept, it backs a unique constraint
+            self.get_index('order_uniq', 'order_id', unique=True),
+            self.get_index('rs_res_expires_at_index', 'expires_at'),
+            self.get_index('expires_quantity', 'expires_at', 'quantity'),
+            self.get_index('restaurant_index', 'restaurant_id'),
+            self.get_index('restaurant_material', 'restaurant_id', 'material_id'),
+            self.get_index('id_quantity', 'id', 'quantity'),
+            # Of two identical indexes, the one whose name sorts last is reported
+            self.get_index('quantity_a', 'quantity'),
+            self.get_index('quantity_b', 'quantity'),
+        ])
+
+        self.assertEqual(
+            {finding.name: finding.reason for finding in findings},
+            {
+                'rs_res_expires_at_index': 'Covered by expires_quantity (expires_at, quantity).',
+                'restaurant_index': 'Covered by restaurant_material (restaurant_id, material_id).',
+                'id_quantity': 'Leads with the primary key id, which is unique already.',
+                'quantity_b': 'Covered by quantity_a (quantity).',
+            }
+        )
+        operations = {finding.name: finding.operation for finding in findings}
+        # Declared by Meta.indexes, dropped with RemoveIndex
+        self.assertIsInstance(operations['rs_res_expires_at_index'], migrations.RemoveIndex)
+        # Created by the db_index of the field, which is turned off instead
+        self.assertIsInstance(operations['restaurant_index'], migrations.AlterField)
+        self.assertFalse(operations['restaurant_index'].field.db_index)
+        # Not declared by the models, fixed by hand
+        self.assertIsNone(operations['id_quantity'])
+
+    def test_hot_queries_without_index_are_missing(self):
+        findings = find_missing_indexes(StockReservation, [self.get_index('pk', 'id', primary_key=True)])
+
+        self.assertEqual(
+            [(finding.name, finding.columns) for finding in findings],
+            [('rs_res_order_index', ['order_id']), ('rs_res_expires_at_index', ['expires_at'])]
+        )
+        self.assertEqual(findings[0].operation.index.fields, ['order'])
+
+        # An index leading with the columns of a hot query serves it
+        findings = find_missing_indexes(StockReservation, [
+            self.get_index('order_material_uniq', 'order_id', 'material_id', unique=True),
+            self.get_index('expires_quantity', 'expires_at', 'quantity'),
+        ])
+        self.assertEqual(findings, [])
+
+    def test_write_migrations_writes_the_fixing_migration(self):
+        finding = IndexFinding(
+            'restaurant.StockReservation', 'redundant', 'rs_res_expires_at_index', ['expires_at'], 'Covered.',
+            migrations.RemoveIndex(model_name='stockreservation', name='rs_res_expires_at_index')
+        )
+        leaf = max(MigrationLoader(None, ignore_no_migrations=True).graph.leaf_nodes('restaurant'))
+        number = int(leaf[1].split('_')[0]) + 1
+
+        output = StringIO()
+        with tempfile.TemporaryDirectory() as directory, \
+                mock.patch('accounts.management.commands.advise_indexes.advise_indexes', return_value=[finding]), \
+                mock.patch.object(MigrationWriter, 'basedir', new_callable=mock.PropertyMock, return_value=directory):
+            call_command('advise_indexes', '--write-migrations', '--name', 'drop_expiry', stdout=output)
+            migration = (Path(directory) / f'{number:04d}_drop_expiry.py').read_text()
+
+        self.assertIn(f"('restaurant', '{leaf[1]}')", migration)
+        self.assertIn("migrations.RemoveIndex(\n            model_name='stockreservation',", migration)
+        self.assertIn('Redundant restaurant.StockReservation rs_res_expires_at_index (expires_at)', output.getvalue())
+
+
+class FieldTrackerTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        customer = CustomerUser.objects.create(username='customer', email='cu@example.com')
+        restaurant = Restaurant.objects.create(name='Restaurant', location='Location')
+        cls.order = Order.objects.create(restaurant=restaurant, customer=customer)
+
+        coordinator = InventoryCoordinatorUser.objects.create(username='coordinator', email='c@example.com')
+        ready_material = ReadyMaterial.objects.create(
+            inventory_coordinator=coordinator, initial_quantity=10,
+            transporter=TransporterUser.objects.create(username='transporter', email='t@example.com')
+        )
+        cls.packaged_material = PackagedMaterial.objects.create(
+            ready_material=ready_material, worker=WorkerUser.objects.create(username='worker', email='w@example.com'),
+            quantity=5
+        )
+
+    def get_selects(self, queries, model) -> list:
+        return [
+            query['sql'] for query in queries
+            if query['sql'].startswith('SELECT') and f'FROM "{model._meta.db_table}"' in query['sql']
+        ]
+
+    def test_loaded_values_are_tracked_until_saved(self):
+        order = Order.objects.get(pk=self.order.pk)
+        self.assertFalse(order.has_changed('status'))
+        self.assertEqual(order.old_value('status'), OrderStatus.PENDING)
+
+        order.status = OrderStatus.CANCELLED
+        self.assertTrue(order.has_changed('status'))
+        self.assertEqual(order.old_value('status'), OrderStatus.PENDING)
+
+        order.save()
+        self.assertFalse(order.has_changed('status'))
+        self.assertEqual(order.old_value('status'), OrderStatus.CANCELLED)
+
+    def test_refresh_takes_a_new_snapshot(self):
+        order = Order.objects.get(pk=self.order.pk)
+        Order.objects.filter(pk=order.pk).update(status=OrderStatus.CANCELLED)
+
+        order.refresh_from_db()
+        self.assertFalse(order.has_changed('status'))
+        self.assertEqual(order.old_value('status'), OrderStatus.CANCELLED)
+
+    def test_new_and_deferred_values_are_unknown(self):
+        order = Order(status=OrderStatus.CONFIRMED)
+        self.assertTrue(order.has_changed('status'))
+        self.assertIsNone(order.old_value('status'))
+
+        order = Order.objects.only('pk').get(pk=self.order.pk)
+        self.assertTrue(order.has_changed('status'))
+        self.assertEqual(order.old_value('status', default='unknown'), 'unknown')
+
+    def test_post_save_receivers_see_the_previous_values(self):
+        seen = []
+
+        def receiver(sender, instance, **kwargs):
+            seen.append((instance.old_value('status'), instance.status))
+
+        post_save.connect(receiver, sender=Order)
+        try:
+            order = Order.objects.get(pk=self.order.pk)
+            order.status = OrderStatus.CANCELLED
+            order.save()
+        finally:
+            post_save.disconnect(receiver, sender=Order)
+
+        self.assertEqual(seen, [(OrderStatus.PENDING, OrderStatus.CANCELLED)])
+
+    def test_order_save_does_not_read_the_previous_row(self):
+        order = Order.objects.get(pk=self.order.pk)
+        order.note = 'Note'
+
+        # The items of the order checked for availability, and the update in its savepoint
+        with self.assertNumQueries(4), CaptureQueriesContext(connection) as queries:
+            order.save()
+        self.assertEqual(self.get_selects(queries, Order), [])
+
+    def test_packaging_save_does_not_read_the_previous_row(self):
+        packaged_material = PackagedMaterial.objects.select_related('ready_material').get(
+            pk=self.packaged_material.pk
+        )
+        packaged_material.quantity = 3
+
+        # The update, then the increment of the ready material and its ledger movement in their savepoint
+        with self.assertNumQueries(5), CaptureQueriesContext(connection) as queries:
+            packaged_material.save()
+        self.assertEqual(self.get_selects(queries, PackagedMaterial), [])
+        self.assertEqual(ReadyMaterial.objects.get(pk=packaged_material.ready_material_id).current_quantity, 7)
+        self.assertEqual(packaged_material.old_value('quantity'), 3)
@@ -3,6 +3,9 @@ ASGI config for core project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+The order intake endpoint (``orders.views.OrderIntakeView``) is async and keeps its queue and workers
+on the event loop of this application, serve it with an ASGI server such as uvicorn or daphne.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
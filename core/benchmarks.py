@@ -0,0 +1,106 @@
+import json
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+@contextmanager
+def benchmark_database(verbosity: int = 0):
+    """
+    Run the enclosed block against a throwaway copy of the default database, built like the test database,
+    so benchmarks can commit transactions without touching real data.
+    """
+    old_name = connection.settings_dict['NAME']
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True)
+    try:
+        yield connection
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+
+
+def measure(func, *args, **kwargs) -> dict:
+    """
+    Call a function and report its wall time in seconds and the number of queries it ran.
+    When tracemalloc is tracing, the peak memory the call allocated is reported as well, in KiB.
+    """
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+        allocated_before = tracemalloc.get_traced_memory()[0]
+
+    with CaptureQueriesContext(connection) as context:
+        started_at = time.perf_counter()
+        result = func(*args, **kwargs)
+        elapsed = time.perf_counter() - started_at
+
+    measurement = {
+        'seconds': elapsed,
+        'queries': len(context.captured_queries),
+        'result': result,
+    }
+    if tracing:
+        measurement['allocated_kib'] = (tracemalloc.get_traced_memory()[1] - allocated_before) / 1024
+    return measurement
+
+
+def load_baseline(path) -> dict:
+    """
+    Read a committed baseline, a JSON object with the database `vendor` it was recorded on, the `tolerance` of each
+    metric and the metrics of each of its `steps`.
+    """
+    with open(path, encoding='utf-8') as baseline_file:
+        return json.load(baseline_file)
+
+
+def write_baseline(path, measurements: dict, tolerance: dict) -> None:
+    """
+    Write the measurements of many steps as the new baseline, keeping the given tolerance.
+    """
+    baseline = {
+        'vendor': connection.vendor,
+        'tolerance': tolerance,
+        'steps': {
+            step: {
+                'queries': measurement['queries'],
+                'seconds': round(measurement['seconds'], 4),
+                'allocated_kib': round(measurement['allocated_kib'], 1),
+            }
+            for step, measurement in measurements.items()
+        },
+    }
+    with open(path, 'w', encoding='utf-8') as baseline_file:
+        json.dump(baseline, baseline_file, indent=2)
+        baseline_file.write('\n')
+
+
+def get_budget_errors(measurements: dict, baseline: dict) -> list:
+    """
+    Compare the measurements of many steps with their baseline.
+
+    A step may not run more queries than its baseline, query counts do not depend on the machine. Time and
+    allocations do, a step may exceed its baseline by the tolerance factor of the metric, and time budgets
+    never go under `min_seconds`, so that very fast steps are not failed by noise.
+
+    Returns:
+        - A list of error messages, one per exceeded budget or step missing from the baseline.
+    """
+    tolerance = baseline['tolerance']
+    errors = []
+    for step, measurement in measurements.items():
+        budget = baseline['steps'].get(step)
+        if budget is None:
+            errors.append(f'{step}: no baseline, record one.')
+            continue
+
+        budgets = {
+            'queries': budget['queries'],
+            'seconds': max(budget['seconds'] * tolerance['seconds'], tolerance['min_seconds']),
+            'allocated_kib': budget['allocated_kib'] * tolerance['allocated_kib'],
+        }
+        for metric, limit in budgets.items():
+            if metric in measurement and measurement[metric] > limit:
+                errors.append(f'{step}: {metric} {measurement[metric]:g} exceeds its budget of {limit:g}.')
+    return errors
@@ -0,0 +1,254 @@
+from collections import namedtuple
+from pathlib import Path
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections, migrations, models
+
+
+# A query run on a hot path, with the leading columns an index needs to serve it
+HotQuery = namedtuple('HotQuery', ['model', 'fields', 'name', 'description'])
+
+# A redundant or missing index, with the migration operation fixing it when there is one
+IndexFinding = namedtuple('IndexFinding', ['model', 'kind', 'name', 'columns', 'reason', 'operation'])
+
+
+HOT_QUERIES = [
+    HotQuery(
+        'restaurant.RestaurantPackagedMaterial',
+        ('restaurant', 'material', 'current_package_quantity', 'expiration_date', 'created_at'),
+        'rpm_lot_scan_index',
+        'Candidate lots locked by `consume_ingredients`, non empty unexpired lots of a restaurant per material.'
+    ),
+    HotQuery(
+        'restaurant.RecipeIngredient', ('product',), 'ing_product_index',
+        'Ingredients of a level of the recipe graph loaded by `RecipeCache.load`.'
+    ),
+    HotQuery(
+        'restaurant.RecipeComponent', ('product',), 'ing_sub_product_index',
+        'Components of a level of the recipe graph loaded by `RecipeCache.load` and `get_sub_products`.'
+    ),
+    HotQuery(
+        'restaurant.RecipeComponent', ('component',), 'ing_sub_component_index',
+        'Products using a component, walked by `get_parent_products` on every recipe invalidation.'
+    ),
+    HotQuery(
+        'orders.OrderItem', ('order', 'created_at'), 'ord_itm_order_created_index',
+        'Items of an order in creation order, read when checking availability and consuming ingredients.'
+    ),
+    HotQuery(
+        'restaurant.RestaurantStockPosition', ('restaurant', 'material'), 'rs_pos_restaurant_material_index',
+        'Stock positions read and updated per restaurant and material by the stock position manager.'
+    ),
+    HotQuery(
+        'restaurant.StockReservation', ('order',), 'rs_res_order_index',
+        'Reservations of an order, released when it is reserved again, consumed, cancelled or deleted.'
+    ),
+    HotQuery(
+        'restaurant.StockReservation', ('expires_at',), 'rs_res_expires_at_index',
+        'Expired reservations released by `sweep_reservations`.'
+    ),
+    HotQuery(
+        'restaurant.RestaurantPackagedMaterialConsumption', ('order_item',), 'cons_order_item_index',
+        'Consumptions of the items of an order, restored when the order is cancelled.'
+    ),
+    HotQuery(
+        'restaurant.MaterialLineage', ('raw_material',), 'lin_raw_material_index',
+        'Lineage of recalled raw material lots, read by `iter_recall_impact`.'
+    ),
+    HotQuery(
+        'inventory.RawMaterial', ('supplier',), 'raw_mat_supplier_index',
+        'Raw material lots of recalled suppliers, read by `get_recalled_raw_materials`.'
+    ),
+    HotQuery(
+        'inventory.RawMaterial', ('expiration_date',), 'raw_mat_expiry_index',
+        'Expired raw material lots not written off yet, swept by `sweep_expired_lots`.'
+    ),
+    HotQuery(
+        'inventory.PackagedMaterial', ('expiration_date',), 'pkg_mat_expiry_index',
+        'Expired packaged materials not flagged yet, swept by `sweep_expired_lots`.'
+    ),
+    HotQuery(
+        'restaurant.RestaurantPackagedMaterial', ('expiration_date',), 'rpm_expiry_index',
+        'Expired restaurant lots not written off yet, swept by `sweep_expired_lots`.'
+    ),
+    HotQuery(
+        'inventory.StockMovement', ('lot_type', 'lot_id', 'occurred_at'), 'mov_lot_occurred_index',
+        'Movements of lots since their latest snapshot, replayed by `get_stock_as_of` and `take_snapshots`.'
+    ),
+    HotQuery(
+        'inventory.StockSnapshot', ('lot_type', 'lot_id', 'taken_at'), 'snap_lot_taken_index',
+        'Latest snapshot of lots before a date, read by `get_stock_as_of`.'
+    ),
+    HotQuery(
+        'inventory.StockMovement', ('lot_type', 'occurred_at', 'lot_id'), 'mov_type_occurred_index',
+        'Lots moved since the latest snapshot of their type, read by `take_snapshots`.'
+    ),
+    HotQuery(
+        'inventory.StockSnapshot', ('lot_type', 'taken_at'), 'snap_type_taken_index',
+        'Latest snapshot of a lot type, the watermark of `take_snapshots`.'
+    ),
+]
+
+
+def get_project_models(app_labels=None) -> list:
+    """
+    Get the concrete models of the apps living in this project, or of the given apps only.
+    """
+    base_dir = Path(settings.BASE_DIR)
+    return [
+        model
+        for app_config in apps.get_app_configs()
+        if (app_labels and app_config.label in app_labels)
+        or (not app_labels and Path(app_config.path).is_relative_to(base_dir))
+        for model in app_config.get_models()
+        if model._meta.managed and not model._meta.proxy
+    ]
+
+
+def get_live_indexes(model, using: str = 'default') -> list:
+    """
+    Get the indexes the table of a model has in the database, including those backing primary key and unique
+    constraints. Returns a list of dictionaries with `name`, `columns`, `primary_key` and `unique`.
+    """
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if model._meta.db_table not in connection.introspection.table_names(cursor):
+            return []
+        constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+
+    return [
+        {
+            'name': name,
+            'columns': list(constraint['columns']),
+            'primary_key': constraint['primary_key'],
+            'unique': constraint['unique'],
+        }
+        for name, constraint in sorted(constraints.items())
+        if constraint['columns'] and not constraint.get('foreign_key') and not constraint.get('check')
+        and (constraint['primary_key'] or constraint['unique'] or constraint['index'])
+    ]
+
+
+def get_index_field(model, index: dict):
+    """
+    Get the field whose `db_index` creates an index, or None if the index is declared another way.
+    """
+    if len(index['columns']) != 1 or index['primary_key'] or index['unique']:
+        return None
+    for field in model._meta.local_fields:
+        if field.column == index['columns'][0] and field.db_index and not field.unique:
+            return field
+    return None
+
+
+def get_fix_operation(model, index: dict):
+    """
+    Get the migration operation dropping a redundant index, or None if it is not declared by the models.
+    """
+    if index['name'] in {meta_index.name for meta_index in model._meta.indexes}:
+        return migrations.RemoveIndex(model_name=model._meta.model_name, name=index['name'])
+
+    field = get_index_field(model, index)
+    if field is not None:
+        name, path, args, kwargs = field.deconstruct()
+        kwargs['db_index'] = False
+        return migrations.AlterField(
+            model_name=model._meta.model_name, name=name, field=field.__class__(*args, **kwargs)
+        )
+    return None
+
+
+def is_covered(columns: list, index: dict) -> bool:
+    return index['columns'][:len(columns)] == list(columns)
+
+
+def find_missing_indexes(model, indexes: list) -> list:
+    """
+    Get the hot queries on a model that no index serves, i.e. whose columns do not lead any index.
+    """
+    findings = []
+    label = model._meta.label
+    for query in HOT_QUERIES:
+        if query.model != label:
+            continue
+        columns = [model._meta.get_field(field).column for field in query.fields]
+        if not any(is_covered(columns, index) for index in indexes):
+            findings.append(IndexFinding(
+                label, 'missing', query.name, columns, query.description,
+                migrations.AddIndex(
+                    model_name=model._meta.model_name,
+                    index=models.Index(fields=list(query.fields), name=query.name)
+                )
+            ))
+    return findings
+
+
+def find_redundant_indexes(model, indexes: list) -> list:
+    """
+    Get the indexes of a model that never serve a query another index does not serve as well: those leading with
+    the primary key, which is unique already, and those whose columns lead another index.
+    Indexes backing unique constraints are kept, they enforce more than they serve.
+    """
+    findings = []
+    label = model._meta.label
+    pk_column = model._meta.pk.column
+
+    if model._meta.pk._unique:
+        findings.append(IndexFinding(
+            label, 'redundant', None, [pk_column],
+            f'`{model._meta.pk.name}` declares unique=True on top of primary_key=True, which implies it.', None
+        ))
+
+    for index in indexes:
+        if index['primary_key'] or index['unique'] or index.get('planned'):
+            continue
+
+        if index['columns'][0] == pk_column:
+            reason = f'Leads with the primary key {pk_column}, which is unique already.'
+        else:
+            covering = next((
+                other for other in indexes
+                if other is not index and is_covered(index['columns'], other) and (
+                    len(other['columns']) > len(index['columns'])
+                    or other['primary_key'] or other['unique'] or other['name'] < index['name']
+                )
+            ), None)
+            if covering is None:
+                continue
+            reason = f"Covered by {covering['name']} ({', '.join(covering['columns'])})."
+
+        findings.append(IndexFinding(
+            label, 'redundant', index['name'], index['columns'], reason, get_fix_operation(model, index)
+        ))
+    return findings
+
+
+def advise_indexes(app_labels=None, using: str = 'default') -> list:
+    """
+    Compare the live schema of the project models with the catalog of hot queries.
+
+    Missing indexes are found first and counted as existing when looking for redundant ones, so that the
+    indexes they make useless are reported in the same run.
+
+    Args:
+        - app_labels: Only inspect the models of these apps, every app of the project by default.
+        - using: The alias of the database to inspect.
+
+    Returns:
+        - A list of IndexFinding, the missing indexes first.
+    """
+    missing = []
+    redundant = []
+    for model in get_project_models(app_labels):
+        indexes = get_live_indexes(model, using)
+        if not indexes:
+            continue
+        model_missing = find_missing_indexes(model, indexes)
+        planned = [
+            {'name': finding.name, 'columns': finding.columns, 'primary_key': False, 'unique': False, 'planned': True}
+            for finding in model_missing
+        ]
+        missing.extend(model_missing)
+        redundant.extend(find_redundant_indexes(model, indexes + planned))
+    return missing + redundant
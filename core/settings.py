@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import os
 from pathlib import Path
 from django.utils.translation import gettext_lazy as _
 
@@ -132,6 +133,53 @@ STATICFILES_DIRS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Order intake
+# The async order intake endpoint queues submissions in memory and drains them in micro-batches,
+# callers get a 503 with a Retry-After header when the queue is full. It must be served by core.asgi.
+# The queue size is a number of orders, it must be at least the largest submission, 1000 orders.
+
+ORDER_INTAKE_QUEUE_SIZE = int(os.getenv("ORDER_INTAKE_QUEUE_SIZE", 1000))
+
+ORDER_INTAKE_WORKERS = int(os.getenv("ORDER_INTAKE_WORKERS", 2))
+
+ORDER_INTAKE_BATCH_SIZE = 100
+
+ORDER_INTAKE_BATCH_WAIT = 0.05  # seconds
+
+ORDER_INTAKE_RETRY_AFTER = 1  # seconds
+
+# Order API keys
+# Point of sale systems post orders to the ingestion and intake endpoints with one of these keys, sent as
+# `Authorization: Bearer <key>`, instead of a session and a CSRF token. Comma separated, none by default.
+
+ORDER_API_KEYS = [key for key in os.getenv("ORDER_API_KEYS", "").split(",") if key]
+
+# Recipe cache
+# Bills of materials are cached per product in a process-local LRU in front of the cache framework,
+# local entries expire after RECIPE_CACHE_LOCAL_TTL seconds to pick up changes made by other processes.
+
+RECIPE_CACHE_SIZE = 1024
+
+RECIPE_CACHE_LOCAL_TTL = 60  # seconds
+
+RECIPE_CACHE_TIMEOUT = 24 * 60 * 60  # seconds, shared entries are left behind when a recipe changes
+
+# Stock reservations
+# Confirmed orders reserve their ingredients until they are consumed or cancelled. Reservations are taken with
+# compare-and-swap updates retried up to STOCK_RESERVATION_MAX_RETRIES times, and the ones older than
+# STOCK_RESERVATION_TTL are released by the sweep_stock_reservations command.
+
+STOCK_RESERVATION_MAX_RETRIES = 5
+
+STOCK_RESERVATION_TTL = int(os.getenv("STOCK_RESERVATION_TTL", 2 * 60 * 60))  # seconds
+
+# Primary keys
+# New PrefixedIDField values are generated as PREFIX-YYYYMMDD-HHMMSS-UUID by default. When compact, they are
+# PREFIX-<ULID-like key>, time-ordered and about half the length. Both formats can coexist in the same tables, but
+# compact IDs sort before every legacy ID, so a table switched to compact does not sort by creation by primary key.
+
+PREFIXED_ID_FORMAT = os.getenv("PREFIXED_ID_FORMAT", "legacy")  # legacy or compact
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
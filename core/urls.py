@@ -22,6 +22,7 @@ from django.urls import path, include, re_path
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/orders/', include('orders.urls')),
 ]
 
 if settings.DEBUG:
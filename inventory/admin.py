@@ -1,7 +1,24 @@
 from django.contrib import admin
+from django.http import StreamingHttpResponse
+from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
-from inventory.models import Supplier, Category, Material, RawMaterial, ReadyMaterial, PackagedMaterial
+from inventory.models import (Supplier, Category, Material, RawMaterial, ReadyMaterial, PackagedMaterial, StockMovement,
+                              StockSnapshot)
+from inventory.recall import iter_recall_impact_jsonl
+
+
+def get_recall_impact_response(supplier_ids=(), raw_material_ids=()) -> StreamingHttpResponse:
+    """
+    Stream the recall impact of suppliers or raw material lots as a JSON lines download.
+    """
+    response = StreamingHttpResponse(
+        iter_recall_impact_jsonl(supplier_ids, raw_material_ids),
+        content_type='application/x-ndjson'
+    )
+    filename = f"recall-impact-{timezone.now().strftime('%Y%m%d-%H%M%S')}.jsonl"
+    response['Content-Disposition'] = f'attachment; filename="{filename}"'
+    return response
 
 
 @admin.register(Supplier)
@@ -9,11 +26,16 @@ class SupplierAdmin(admin.ModelAdmin):
     list_display = ('name', 'created_at', 'updated_at')
     search_fields = ('name',)
     readonly_fields = ('created_at', 'updated_at')
+    actions = ('export_recall_impact', )
+
+    @admin.action(description=_('Export the recall impact of the selected suppliers'))
+    def export_recall_impact(self, request, queryset):
+        return get_recall_impact_response(supplier_ids=list(queryset.values_list('id', flat=True)))
 
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
-    list_display = ('name', 'created_at', 'updated_at')
+    list_display = ('name', 'allocation_strategy', 'created_at', 'updated_at')
     search_fields = ('name',)
     readonly_fields = ('created_at', 'updated_at')
 
@@ -38,12 +60,13 @@ class MaterialAdmin(admin.ModelAdmin):
 class RawMaterialAdmin(admin.ModelAdmin):
     list_display = ('material', 'supplier', 'current_quantity', 'unit', 'created_at', 'updated_at')
     list_filter = ('unit', 'status')
-    readonly_fields = ('current_quantity', 'created_at', 'updated_at')
+    readonly_fields = ('current_quantity', 'expired_at', 'created_at', 'updated_at')
+    actions = ('export_recall_impact', )
     fieldsets = (
         (
             _("General info"),
             {"fields": ("supplier", "material", "initial_quantity", "current_quantity", "unit",
-                        "received_date", "production_date", "expiration_date")},
+                        "received_date", "production_date", "expiration_date", "expired_at")},
         ),
         (
             _("Coordinator info"),
@@ -59,6 +82,10 @@ class RawMaterialAdmin(admin.ModelAdmin):
         ),
     )
 
+    @admin.action(description=_('Export the recall impact of the selected raw materials'))
+    def export_recall_impact(self, request, queryset):
+        return get_recall_impact_response(raw_material_ids=list(queryset.values_list('id', flat=True)))
+
 
 @admin.register(ReadyMaterial)
 class ReadyMaterialAdmin(admin.ModelAdmin):
@@ -93,7 +120,7 @@ class ReadyMaterialAdmin(admin.ModelAdmin):
 class PackagedMaterialAdmin(admin.ModelAdmin):
     list_display = ('ready_material', 'created_at', 'updated_at')
     list_filter = ('unit',)
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('expired_at', 'created_at', 'updated_at')
     fieldsets = (
         (
             _("General info"),
@@ -102,7 +129,7 @@ class PackagedMaterialAdmin(admin.ModelAdmin):
         (
             _('Packing Info'),
             {'fields': ("package_date", "package_type", "package_quantity", "package_unit", "production_date",
-                        "expiration_date")}
+                        "expiration_date", "expired_at")}
         ),
         (
             _("Worker info"),
@@ -117,3 +144,34 @@ class PackagedMaterialAdmin(admin.ModelAdmin):
             {"fields": ('created_at', 'updated_at')},
         ),
     )
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ('lot_id', 'lot_type', 'kind', 'quantity', 'reference', 'occurred_at')
+    list_filter = ('lot_type', 'kind')
+    search_fields = ('lot_id', 'reference')
+    readonly_fields = ('lot_type', 'lot_id', 'kind', 'quantity', 'reference', 'occurred_at')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(StockSnapshot)
+class StockSnapshotAdmin(admin.ModelAdmin):
+    list_display = ('lot_id', 'lot_type', 'quantity', 'movement_count', 'taken_at')
+    list_filter = ('lot_type',)
+    search_fields = ('lot_id',)
+    readonly_fields = ('lot_type', 'lot_id', 'quantity', 'movement_count', 'taken_at', 'created_at')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
@@ -25,3 +25,27 @@ class PackageType(models.TextChoices):
     PACKET = 'packet', _('Packet')
     BOTTLE = 'bottle', _('Bottle')
     OTHER = 'other', _('Other')
+
+
+class LotType(models.TextChoices):
+    RAW_MATERIAL = 'raw_material', _('Raw Material')
+    READY_MATERIAL = 'ready_material', _('Ready Material')
+    RESTAURANT_PACKAGE_MATERIAL = 'restaurant_package_material', _('Restaurant Packaged Material')
+
+
+class MovementKind(models.TextChoices):
+    RECEIPT = 'receipt', _('Receipt')
+    CONSUMPTION = 'consumption', _('Consumption')
+    PACKAGING = 'packaging', _('Packaging')
+    TRANSFER = 'transfer', _('Transfer')
+    RESTORATION = 'restoration', _('Restoration')
+    ADJUSTMENT = 'adjustment', _('Adjustment')
+    WRITE_OFF = 'write_off', _('Write-off')
+    OPENING = 'opening', _('Opening')
+
+
+class AllocationStrategy(models.TextChoices):
+    FIFO = 'fifo', _('First in, first out')
+    FEFO = 'fefo', _('First expired, first out')
+    FEWEST_LOTS = 'fewest_lots', _('Fewest lots')
+    EXPIRY_RISK = 'expiry_risk', _('Expiry risk weighted')
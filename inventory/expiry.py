@@ -0,0 +1,153 @@
+from collections import defaultdict, namedtuple
+
+from django.db import models, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from inventory.enums import MovementKind
+from inventory.stock import get_movement, record_ledger_movements
+
+
+# The lots written off or flagged by one sweep of a table, the quantity they still held, and the stock
+# reservations released because they reserved written off stock
+SweepResult = namedtuple('SweepResult', ['model', 'lots', 'written_off', 'released'], defaults=[0])
+
+
+class ExpiringLotQuerySet(models.QuerySet):
+    """
+    The expiry rule of the lots, shared by the sweep and every reader of stock. A lot expires the day after its
+    expiration date, so a lot whose date passed is not usable anymore even before the sweep writes it off.
+    """
+
+    def expired(self, today=None):
+        """
+        The lots that expired before `today` and were not swept yet, served by the expiry index of their table.
+        """
+        return self.filter(expiration_date__lt=today or timezone.localdate(), expired_at__isnull=True)
+
+    def usable(self, today=None):
+        """
+        The lots that can still be consumed on `today`: not expired, whether swept or not.
+        """
+        return self.filter(
+            Q(expiration_date__isnull=True) | Q(expiration_date__gte=today or timezone.localdate()),
+            expired_at__isnull=True
+        )
+
+
+def get_expired_lots(model, today):
+    """
+    Get the lots of a table that expired before `today` and were not swept yet, see `ExpiringLotQuerySet`.
+    """
+    return model.objects.expired(today)
+
+
+def sweep_expired_packages(today, now) -> int:
+    """
+    Flag the expired packaged materials with one UPDATE. Their quantity is the record of a packaging, the stock
+    they hold lives in the ready and restaurant lots, so it is left alone.
+    Returns the number of flagged packages.
+    """
+    from inventory.models import PackagedMaterial
+
+    return get_expired_lots(PackagedMaterial, today).update(expired_at=now, updated_at=now)
+
+
+def write_off_batch(model, quantity_field: str, today, now, batch_size: int, *fields) -> list:
+    """
+    Lock a batch of expired lots of a table, then zero their quantity and flag them with one UPDATE, and record
+    what they still held as write-offs in the ledger with one INSERT. Must run in a transaction.
+
+    Returns:
+        - The (pk, quantity, *fields) rows of the batch, empty once every expired lot was swept.
+    """
+    rows = list(
+        get_expired_lots(model, today).select_for_update().order_by('pk').values_list(
+            'pk', quantity_field, *fields
+        )[:batch_size]
+    )
+    if not rows:
+        return []
+
+    model.objects.filter(pk__in=[pk for pk, *_ in rows]).update(
+        **{quantity_field: 0}, expired_at=now, updated_at=now
+    )
+    record_ledger_movements(
+        get_movement(model, pk, -quantity, MovementKind.WRITE_OFF)
+        for pk, quantity, *_ in rows
+        if quantity
+    )
+    return rows
+
+
+def sweep_expired_raw_materials(today, now, batch_size: int) -> tuple:
+    """
+    Write off the expired raw material lots, `batch_size` lots per transaction.
+    Returns a (lots, written off quantity) tuple.
+    """
+    from inventory.models import RawMaterial
+
+    lots = written_off = 0
+    while True:
+        with transaction.atomic():
+            rows = write_off_batch(RawMaterial, 'current_quantity', today, now, batch_size)
+        if not rows:
+            return lots, written_off
+        lots += len(rows)
+        written_off += sum(quantity or 0 for _, quantity in rows)
+
+
+def sweep_expired_restaurant_lots(today, now, batch_size: int) -> tuple:
+    """
+    Write off the expired restaurant lots, `batch_size` lots per transaction, and take what they held out of the
+    restaurant stock positions in the same transaction. Positions left reserving more than they hold release
+    their latest reservations, see `release_overcommitted_reservations`.
+    Returns a (lots, written off quantity, released reservations) tuple.
+    """
+    from orders.reservations import release_overcommitted_reservations
+    from restaurant.models import RestaurantPackagedMaterial, RestaurantStockPosition
+
+    lots = written_off = released = 0
+    while True:
+        with transaction.atomic():
+            rows = write_off_batch(
+                RestaurantPackagedMaterial, 'current_package_quantity', today, now, batch_size,
+                'restaurant_id', 'material_id'
+            )
+            deltas = defaultdict(int)
+            for _, quantity, restaurant_id, material_id in rows:
+                deltas[restaurant_id, material_id] -= quantity or 0
+            RestaurantStockPosition.objects.apply_deltas(deltas)
+            released += release_overcommitted_reservations(key for key, delta in deltas.items() if delta)
+        if not rows:
+            return lots, written_off, released
+        lots += len(rows)
+        written_off += sum(quantity or 0 for _, quantity, *_ in rows)
+
+
+def sweep_expired_lots(today=None, batch_size: int = 10000) -> list:
+    """
+    Write off every lot whose expiration date passed, across the raw material, packaged material and restaurant
+    lot tables, without loading nor saving a single model instance.
+
+    Each table is swept with set-based statements through a partial index holding only the lots not swept yet,
+    so a sweep costs the same whatever the number of lots already written off. Lots expire the day after their
+    expiration date, and a swept lot is never swept again.
+
+    Args:
+        - today: The date lots are compared with, today by default.
+        - batch_size: The number of lots written off per transaction.
+
+    Returns:
+        - A list of SweepResult, one per table.
+    """
+    from inventory.models import RawMaterial, PackagedMaterial
+    from restaurant.models import RestaurantPackagedMaterial
+
+    today = today or timezone.localdate()
+    now = timezone.now()
+    return [
+        SweepResult(RawMaterial, *sweep_expired_raw_materials(today, now, batch_size)),
+        SweepResult(PackagedMaterial, sweep_expired_packages(today, now), 0),
+        SweepResult(RestaurantPackagedMaterial, *sweep_expired_restaurant_lots(today, now, batch_size)),
+    ]
@@ -0,0 +1,270 @@
+from django.apps import apps
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Count, Exists, OuterRef, Q, Subquery, Sum
+from django.utils import timezone
+
+from inventory.enums import MovementKind
+from inventory.stock import LOT_MODELS, get_movement, write_movements
+
+
+# Number of lots whose replay conditions are sent in one query
+REPLAY_CHUNK_SIZE = 500
+
+# Kinds of the first movement of a lot, holding the quantity it started with
+OPENING_KINDS = [MovementKind.RECEIPT, MovementKind.TRANSFER, MovementKind.OPENING]
+
+
+def get_lot_model(lot_type: str) -> tuple:
+    """
+    Get the model of a lot type along with the name of the field caching its current quantity.
+    """
+    label, quantity_field = LOT_MODELS[lot_type]
+    return apps.get_model(label), quantity_field
+
+
+def get_latest_snapshots(lot_type: str, lot_ids, as_of) -> dict:
+    """
+    Read the latest snapshot taken until `as_of` of many lots with one query.
+    Returns a dictionary with the lot id as key and a (quantity, taken_at) tuple as value.
+    """
+    from inventory.models import StockSnapshot
+
+    latest_taken_at = StockSnapshot.objects.filter(
+        lot_type=lot_type,
+        lot_id=OuterRef('lot_id'),
+        taken_at__lte=as_of
+    ).order_by('-taken_at').values('taken_at')[:1]
+
+    return {
+        lot_id: (quantity, taken_at)
+        for lot_id, quantity, taken_at in StockSnapshot.objects.filter(
+            lot_type=lot_type,
+            lot_id__in=lot_ids,
+            taken_at=Subquery(latest_taken_at)
+        ).values_list('lot_id', 'quantity', 'taken_at')
+    }
+
+
+def replay_movements(lot_type: str, since: dict, as_of) -> dict:
+    """
+    Sum the movements of many lots that occurred after their own starting date and until `as_of`, with one query.
+
+    Args:
+        - lot_type: The LotType of the lots.
+        - since: Mapping of lot id to the date after which its movements are summed, None for all of them.
+        - as_of: The date until which the movements are summed.
+
+    Returns:
+        - A dictionary with the lot id as key and a (quantity, movement count) tuple as value, for the lots having
+          movements only.
+    """
+    from inventory.models import StockMovement
+
+    replayed = Q(lot_id__in=[lot_id for lot_id, taken_at in since.items() if taken_at is None])
+    for lot_id, taken_at in since.items():
+        if taken_at is not None:
+            replayed |= Q(lot_id=lot_id, occurred_at__gt=taken_at)
+
+    return {
+        lot_id: (quantity, count)
+        for lot_id, quantity, count in StockMovement.objects.filter(
+            replayed,
+            lot_type=lot_type,
+            occurred_at__lte=as_of
+        ).values('lot_id').annotate(
+            total=Sum('quantity'),
+            count=Count('pk')
+        ).values_list('lot_id', 'total', 'count')
+    }
+
+
+def get_stock_as_of(lot_type: str, lot_ids, as_of=None) -> dict:
+    """
+    Get the quantity many lots held at a date, from their latest snapshot before it and the short replay of the
+    movements that occurred since, instead of summing their whole history.
+
+    Costs two queries per REPLAY_CHUNK_SIZE lots, both served by the lot and date indexes of the snapshots and
+    movements.
+
+    Args:
+        - lot_type: The LotType of the lots.
+        - lot_ids: The ids of the lots.
+        - as_of: The date of the stock, now by default.
+
+    Returns:
+        - A dictionary with the lot id as key and the quantity as value, for the lots the ledger knows only.
+    """
+    as_of = as_of or timezone.now()
+    lot_ids = sorted(set(lot_ids))
+
+    quantities = {}
+    for start in range(0, len(lot_ids), REPLAY_CHUNK_SIZE):
+        chunk = lot_ids[start:start + REPLAY_CHUNK_SIZE]
+        snapshots = get_latest_snapshots(lot_type, chunk, as_of)
+        replayed = replay_movements(
+            lot_type,
+            {lot_id: snapshots[lot_id][1] if lot_id in snapshots else None for lot_id in chunk},
+            as_of
+        )
+        for lot_id in chunk:
+            if lot_id in snapshots or lot_id in replayed:
+                quantities[lot_id] = snapshots.get(lot_id, (0,))[0] + replayed.get(lot_id, (0,))[0]
+    return quantities
+
+
+def take_snapshots(lot_type: str, taken_at=None, min_movements: int = 1) -> int:
+    """
+    Snapshot the lots having at least `min_movements` movements since their latest snapshot.
+
+    Only the lots moved since the latest snapshot of the lot type, the watermark, are considered: the others hold
+    the same movements since their own snapshot as when the watermark was taken, so they were either snapshotted
+    then or are still below the `min_movements` of that run. Each run therefore reads the movements of one period
+    instead of the whole ledger, both lookups being served by the (lot_type, date) indexes of the snapshots and
+    movements.
+
+    Snapshots should be taken a little in the past, see `--lag` of the `snapshot_stock` command: a movement
+    occurring before `taken_at` but committed after the snapshot would be left out of it for good.
+
+    Args:
+        - lot_type: The LotType of the lots.
+        - taken_at: The date of the snapshots, now by default.
+        - min_movements: The number of movements since the latest snapshot making a lot worth a new one.
+
+    Returns:
+        - The number of snapshots taken.
+    """
+    from inventory.models import StockMovement, StockSnapshot
+
+    taken_at = taken_at or timezone.now()
+    watermark = StockSnapshot.objects.filter(
+        lot_type=lot_type,
+        taken_at__lte=taken_at
+    ).order_by('-taken_at').values_list('taken_at', flat=True).first()
+
+    movements = StockMovement.objects.filter(lot_type=lot_type, occurred_at__lte=taken_at)
+    if watermark is not None:
+        movements = movements.filter(occurred_at__gt=watermark)
+    # Deduplicated here, DISTINCT would make the database walk the lot index of the whole type for its order
+    lot_ids = sorted(set(movements.order_by().values_list('lot_id', flat=True)))
+
+    snapshots = []
+    for start in range(0, len(lot_ids), REPLAY_CHUNK_SIZE):
+        chunk = lot_ids[start:start + REPLAY_CHUNK_SIZE]
+        previous = get_latest_snapshots(lot_type, chunk, taken_at)
+        replayed = replay_movements(
+            lot_type,
+            {lot_id: previous[lot_id][1] if lot_id in previous else None for lot_id in chunk},
+            taken_at
+        )
+        snapshots.extend(
+            StockSnapshot(
+                lot_type=lot_type,
+                lot_id=lot_id,
+                quantity=previous.get(lot_id, (0,))[0] + quantity,
+                movement_count=count,
+                taken_at=taken_at
+            )
+            for lot_id, (quantity, count) in replayed.items()
+            if count >= min_movements
+        )
+
+    ids = StockSnapshot._meta.pk.generate_ids(len(snapshots))
+    for snapshot, snapshot_id in zip(snapshots, ids):
+        snapshot.id = snapshot_id
+    return len(StockSnapshot.objects.bulk_create(snapshots, batch_size=1000))
+
+
+def rebuild_quantities(lot_type: str, batch_size: int = 1000, dry_run: bool = False) -> list:
+    """
+    Rebuild the cached current quantity of the lots from the ledger, `batch_size` lots at a time.
+
+    The lots of a batch are locked while their quantity is recomputed, the ones the ledger does not know are left
+    alone, see `backfill_ledger`. The stock positions of the restaurants whose lots changed are rebuilt as well.
+
+    A negative ledger quantity means the ledger of the lot was never opened, a batch holding one is refused and
+    nothing of it is written, run `backfill_ledger` first.
+
+    Args:
+        - lot_type: The LotType of the lots.
+        - batch_size: The number of lots read, locked and written at once.
+        - dry_run: Only report the lots whose cached quantity drifted, without fixing them.
+
+    Returns:
+        - A list of (lot id, cached quantity, ledger quantity) tuples for the drifted lots.
+
+    Raises:
+        - ValidationError: When the ledger quantity of a lot is negative, unless `dry_run` is set.
+    """
+    from restaurant.models import RestaurantPackagedMaterial, RestaurantStockPosition
+
+    model, quantity_field = get_lot_model(lot_type)
+    drifted = []
+    last_pk = None
+    while True:
+        with transaction.atomic():
+            lots = model.objects.select_for_update().order_by('pk')
+            if last_pk is not None:
+                lots = lots.filter(pk__gt=last_pk)
+            lots = list(lots[:batch_size])
+            if not lots:
+                return drifted
+            last_pk = lots[-1].pk
+
+            quantities = get_stock_as_of(lot_type, [lot.pk for lot in lots])
+            changed = []
+            now = timezone.now()
+            for lot in lots:
+                cached_quantity = getattr(lot, quantity_field) or 0
+                if lot.pk in quantities and quantities[lot.pk] != cached_quantity:
+                    drifted.append((lot.pk, cached_quantity, quantities[lot.pk]))
+                    setattr(lot, quantity_field, quantities[lot.pk])
+                    lot.updated_at = now
+                    changed.append(lot)
+
+            if dry_run or not changed:
+                continue
+
+            negative = sorted(lot.pk for lot in changed if getattr(lot, quantity_field) < 0)
+            if negative:
+                raise ValidationError(
+                    f"The ledger of {', '.join(negative)} holds a negative quantity, backfill it before rebuilding."
+                )
+
+            model.objects.bulk_update(changed, [quantity_field, 'updated_at'])
+            if model is RestaurantPackagedMaterial:
+                RestaurantStockPosition.objects.rebuild({lot.restaurant_id for lot in changed})
+
+
+def backfill_ledger(lot_type: str, batch_size: int = 1000) -> int:
+    """
+    Open the ledger of the lots it does not know the starting quantity of, like those written before it existed or
+    by bulk imports, `batch_size` lots at a time.
+
+    Each lot without a receipt, transfer or opening movement gets an opening movement of its current quantity minus
+    the movements it already has, like the write-offs of the expiry sweep, so that its ledger then matches its cached
+    quantity. The lots of a batch are locked meanwhile, running it again writes nothing.
+    Returns the number of movements written.
+    """
+    from inventory.models import StockMovement
+
+    model, quantity_field = get_lot_model(lot_type)
+    lots = model.objects.exclude(
+        Exists(StockMovement.objects.filter(lot_type=lot_type, lot_id=OuterRef('pk'), kind__in=OPENING_KINDS))
+    ).order_by('pk')
+
+    count = 0
+    last_pk = None
+    while True:
+        with transaction.atomic():
+            batch = lots.filter(pk__gt=last_pk) if last_pk is not None else lots
+            batch = list(batch.select_for_update().values_list('pk', quantity_field)[:batch_size])
+            if not batch:
+                return count
+            last_pk = batch[-1][0]
+
+            moved = get_stock_as_of(lot_type, [pk for pk, _ in batch])
+            count += len(write_movements(
+                get_movement(model, pk, (quantity or 0) - moved.get(pk, 0), MovementKind.OPENING)
+                for pk, quantity in batch
+            ))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from inventory.enums import LotType
+from inventory.ledger import backfill_ledger
+
+
+class Command(BaseCommand):
+    help = 'Open the stock ledger of the lots it does not know the starting quantity of, from their current quantity.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of lots handled per batch.'
+        )
+
+    def handle(self, *args, **options):
+        for lot_type in LotType.values:
+            count = backfill_ledger(lot_type, batch_size=options['batch_size'])
+            self.stdout.write(self.style.SUCCESS(f'Wrote {count} {lot_type} opening movements.'))
@@ -0,0 +1,35 @@
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.enums import LotType
+from inventory.ledger import rebuild_quantities
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the cached current quantity of the lots from the stock ledger.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lot-type', action='append', dest='lot_types', choices=LotType.values,
+            help='Only rebuild the lots of this type, can be repeated.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of lots locked and rebuilt per batch.'
+        )
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Only report the lots whose cached quantity drifted from the ledger.'
+        )
+
+    def handle(self, *args, **options):
+        for lot_type in options['lot_types'] or LotType.values:
+            try:
+                drifted = rebuild_quantities(lot_type, options['batch_size'], options['dry_run'])
+            except ValidationError as error:
+                raise CommandError(error.message)
+            for lot_id, cached_quantity, ledger_quantity in drifted:
+                self.stdout.write(self.style.WARNING(f'{lot_id}: cached {cached_quantity}, ledger {ledger_quantity}'))
+
+            action = 'drifted from' if options['dry_run'] else 'rebuilt from'
+            self.stdout.write(self.style.SUCCESS(f'{len(drifted)} {lot_type} lots {action} the ledger.'))
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory.recall import iter_recall_impact_jsonl
+
+
+class Command(BaseCommand):
+    help = 'Write every record affected by a recall of suppliers or raw material lots as JSON lines.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--supplier', action='append', dest='suppliers', default=[],
+            help='Recall every raw material lot of this supplier id, can be repeated.'
+        )
+        parser.add_argument(
+            '--raw-material', action='append', dest='raw_materials', default=[],
+            help='Recall this raw material lot id, can be repeated.'
+        )
+        parser.add_argument(
+            '--output', default='-',
+            help='File to write the records to, the standard output by default.'
+        )
+
+    def handle(self, *args, **options):
+        if not options['suppliers'] and not options['raw_materials']:
+            raise CommandError('Give at least one --supplier or --raw-material.')
+
+        lines = iter_recall_impact_jsonl(options['suppliers'], options['raw_materials'])
+        if options['output'] == '-':
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+
+        count = 0
+        with open(options['output'], 'w') as output:
+            for line in lines:
+                output.write(line)
+                count += 1
+        self.stderr.write(self.style.SUCCESS(f"Wrote {count} affected records to {options['output']}."))
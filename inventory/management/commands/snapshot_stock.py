@@ -0,0 +1,31 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from inventory.enums import LotType
+from inventory.ledger import take_snapshots
+
+
+class Command(BaseCommand):
+    help = 'Snapshot the quantity of the lots that moved since their latest snapshot, meant to be run periodically.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--lot-type', action='append', dest='lot_types', choices=LotType.values,
+            help='Only snapshot the lots of this type, can be repeated.'
+        )
+        parser.add_argument(
+            '--min-movements', type=int, default=1,
+            help='Number of movements since the latest snapshot making a lot worth a new one.'
+        )
+        parser.add_argument(
+            '--lag', type=int, default=300,
+            help='Seconds the snapshots are taken in the past, so that no transaction is still writing movements.'
+        )
+
+    def handle(self, *args, **options):
+        taken_at = timezone.now() - timedelta(seconds=options['lag'])
+        for lot_type in options['lot_types'] or LotType.values:
+            count = take_snapshots(lot_type, taken_at, options['min_movements'])
+            self.stdout.write(self.style.SUCCESS(f'Took {count} {lot_type} snapshots as of {taken_at}.'))
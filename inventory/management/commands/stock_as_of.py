@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from inventory.enums import LotType
+from inventory.ledger import get_lot_model, get_stock_as_of
+
+
+class Command(BaseCommand):
+    help = 'Print the quantity lots held at a date, computed from the stock ledger.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('lot_type', choices=LotType.values, help='The type of the lots.')
+        parser.add_argument(
+            '--lot', action='append', dest='lots',
+            help='Only print this lot id, can be repeated. Every lot of the type by default.'
+        )
+        parser.add_argument(
+            '--as-of',
+            help='The date of the stock, as an ISO 8601 date and time, now by default.'
+        )
+
+    def handle(self, *args, **options):
+        as_of = timezone.now()
+        if options['as_of']:
+            as_of = parse_datetime(options['as_of'])
+            if as_of is None:
+                raise CommandError(f"Invalid date: {options['as_of']}.")
+            if timezone.is_naive(as_of):
+                as_of = timezone.make_aware(as_of)
+
+        lot_ids = options['lots']
+        if not lot_ids:
+            model, _ = get_lot_model(options['lot_type'])
+            lot_ids = model.objects.values_list('pk', flat=True)
+
+        quantities = get_stock_as_of(options['lot_type'], lot_ids, as_of)
+        for lot_id, quantity in sorted(quantities.items()):
+            self.stdout.write(f'{lot_id}\t{quantity}')
+        self.stderr.write(self.style.SUCCESS(f'{len(quantities)} lots as of {as_of}.'))
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from inventory.expiry import sweep_expired_lots
+
+
+class Command(BaseCommand):
+    help = 'Write off the raw material and restaurant lots whose expiration date passed, and flag expired packages.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            help='Write off the lots that expired before this ISO 8601 date, today by default.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=10000,
+            help='Number of lots written off per transaction.'
+        )
+        parser.add_argument(
+            '--interval', type=float, default=None,
+            help='Keep sweeping every given number of seconds instead of sweeping once.'
+        )
+
+    def handle(self, *args, **options):
+        today = None
+        if options['date']:
+            today = parse_date(options['date'])
+            if today is None:
+                raise CommandError(f"Invalid date: {options['date']}.")
+        interval = options['interval']
+
+        while True:
+            for result in sweep_expired_lots(today, options['batch_size']):
+                self.stdout.write(self.style.SUCCESS(
+                    f'Swept {result.lots} expired {result.model._meta.verbose_name_plural}, '
+                    f'{result.written_off} units written off.'
+                ))
+                if result.released:
+                    self.stdout.write(self.style.WARNING(
+                        f'Released {result.released} stock reservations holding written off stock.'
+                    ))
+            if interval is None:
+                break
+            time.sleep(interval)
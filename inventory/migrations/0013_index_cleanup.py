@@ -0,0 +1,68 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:22
+
+import accounts.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0012_material_created_at_material_updated_at'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='category',
+            name='category_id_index',
+        ),
+        migrations.RemoveIndex(
+            model_name='material',
+            name='material_id_index',
+        ),
+        migrations.RemoveIndex(
+            model_name='packagedmaterial',
+            name='pac_mat_id_index',
+        ),
+        migrations.RemoveIndex(
+            model_name='rawmaterial',
+            name='raw_mat_id_index',
+        ),
+        migrations.RemoveIndex(
+            model_name='readymaterial',
+            name='raw_mat_ready_id_index',
+        ),
+        migrations.RemoveIndex(
+            model_name='supplier',
+            name='supplier_id_index',
+        ),
+        migrations.AlterField(
+            model_name='category',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=54, primary_key=True, serialize=False, verbose_name='Category ID'),
+        ),
+        migrations.AlterField(
+            model_name='material',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=52, primary_key=True, serialize=False, verbose_name='Raw Material ID'),
+        ),
+        migrations.AlterField(
+            model_name='packagedmaterial',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=53, primary_key=True, serialize=False, verbose_name='Packaged Material ID'),
+        ),
+        migrations.AlterField(
+            model_name='rawmaterial',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=53, primary_key=True, serialize=False, verbose_name='Raw Material ID'),
+        ),
+        migrations.AlterField(
+            model_name='readymaterial',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=59, primary_key=True, serialize=False, verbose_name='Ready Material ID'),
+        ),
+        migrations.AlterField(
+            model_name='supplier',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=59, primary_key=True, serialize=False, verbose_name='Supplier ID'),
+        ),
+    ]
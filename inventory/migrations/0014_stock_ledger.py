@@ -0,0 +1,49 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:39
+
+import accounts.fields
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0013_index_cleanup'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', accounts.fields.PrefixedIDField(editable=False, max_length=54, primary_key=True, serialize=False, verbose_name='Movement ID')),
+                ('lot_type', models.CharField(choices=[('raw_material', 'Raw Material'), ('ready_material', 'Ready Material'), ('restaurant_package_material', 'Restaurant Packaged Material')], max_length=30, verbose_name='Lot Type')),
+                ('lot_id', models.CharField(max_length=64, verbose_name='Lot ID')),
+                ('kind', models.CharField(choices=[('receipt', 'Receipt'), ('consumption', 'Consumption'), ('packaging', 'Packaging'), ('transfer', 'Transfer'), ('restoration', 'Restoration'), ('adjustment', 'Adjustment')], max_length=20, verbose_name='Kind')),
+                ('quantity', models.IntegerField(help_text='Negative when stock leaves the lot', verbose_name='Quantity')),
+                ('reference', models.CharField(blank=True, help_text='ID of the record causing the movement', max_length=64, null=True, verbose_name='Reference')),
+                ('occurred_at', models.DateTimeField(default=django.utils.timezone.now, verbose_name='Occurred At')),
+            ],
+            options={
+                'verbose_name': 'Stock Movement',
+                'verbose_name_plural': 'Stock Movements',
+                'indexes': [models.Index(fields=['lot_type', 'lot_id', 'occurred_at'], name='mov_lot_occurred_index')],
+            },
+        ),
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', accounts.fields.PrefixedIDField(editable=False, max_length=55, primary_key=True, serialize=False, verbose_name='Snapshot ID')),
+                ('lot_type', models.CharField(choices=[('raw_material', 'Raw Material'), ('ready_material', 'Ready Material'), ('restaurant_package_material', 'Restaurant Packaged Material')], max_length=30, verbose_name='Lot Type')),
+                ('lot_id', models.CharField(max_length=64, verbose_name='Lot ID')),
+                ('quantity', models.IntegerField(verbose_name='Quantity')),
+                ('movement_count', models.PositiveIntegerField(help_text='Movements folded since the previous snapshot', verbose_name='Movement Count')),
+                ('taken_at', models.DateTimeField(verbose_name='Taken At')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+            ],
+            options={
+                'verbose_name': 'Stock Snapshot',
+                'verbose_name_plural': 'Stock Snapshots',
+                'constraints': [models.UniqueConstraint(fields=('lot_type', 'lot_id', 'taken_at'), name='snap_lot_taken_unique')],
+            },
+        ),
+    ]
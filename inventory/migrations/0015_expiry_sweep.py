@@ -0,0 +1,37 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_index_cleanup'),
+        ('inventory', '0014_stock_ledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='packagedmaterial',
+            name='expired_at',
+            field=models.DateTimeField(blank=True, help_text='When the expiry sweep flagged the package', null=True, verbose_name='Expired At'),
+        ),
+        migrations.AddField(
+            model_name='rawmaterial',
+            name='expired_at',
+            field=models.DateTimeField(blank=True, help_text='When the expiry sweep wrote the lot off', null=True, verbose_name='Expired At'),
+        ),
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='kind',
+            field=models.CharField(choices=[('receipt', 'Receipt'), ('consumption', 'Consumption'), ('packaging', 'Packaging'), ('transfer', 'Transfer'), ('restoration', 'Restoration'), ('adjustment', 'Adjustment'), ('write_off', 'Write-off')], max_length=20, verbose_name='Kind'),
+        ),
+        migrations.AddIndex(
+            model_name='packagedmaterial',
+            index=models.Index(condition=models.Q(('expired_at__isnull', True)), fields=['expiration_date'], name='pkg_mat_expiry_index'),
+        ),
+        migrations.AddIndex(
+            model_name='rawmaterial',
+            index=models.Index(condition=models.Q(('expired_at__isnull', True)), fields=['expiration_date'], name='raw_mat_expiry_index'),
+        ),
+    ]
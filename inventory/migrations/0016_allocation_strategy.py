@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0015_expiry_sweep'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='allocation_strategy',
+            field=models.CharField(blank=True, choices=[('fifo', 'First in, first out'), ('fefo', 'First expired, first out'), ('fewest_lots', 'Fewest lots'), ('expiry_risk', 'Expiry risk weighted')], help_text='Order in which the lots of its materials are consumed, overrides the one of the restaurant', max_length=20, null=True, verbose_name='Allocation Strategy'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0016_allocation_strategy'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='stockmovement',
+            index=models.Index(fields=['lot_type', 'occurred_at', 'lot_id'], name='mov_type_occurred_index'),
+        ),
+        migrations.AddIndex(
+            model_name='stocksnapshot',
+            index=models.Index(fields=['lot_type', 'taken_at'], name='snap_type_taken_index'),
+        ),
+    ]
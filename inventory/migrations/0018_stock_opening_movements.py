@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0017_snapshot_watermark_indexes'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='kind',
+            field=models.CharField(choices=[('receipt', 'Receipt'), ('consumption', 'Consumption'), ('packaging', 'Packaging'), ('transfer', 'Transfer'), ('restoration', 'Restoration'), ('adjustment', 'Adjustment'), ('write_off', 'Write-off'), ('opening', 'Opening')], max_length=20, verbose_name='Kind'),
+        ),
+    ]
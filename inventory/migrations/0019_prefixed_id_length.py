@@ -0,0 +1,54 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:25
+
+import accounts.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0018_stock_opening_movements'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='category',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=56, primary_key=True, serialize=False, verbose_name='Category ID'),
+        ),
+        migrations.AlterField(
+            model_name='material',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=54, primary_key=True, serialize=False, verbose_name='Raw Material ID'),
+        ),
+        migrations.AlterField(
+            model_name='packagedmaterial',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=55, primary_key=True, serialize=False, verbose_name='Packaged Material ID'),
+        ),
+        migrations.AlterField(
+            model_name='rawmaterial',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=55, primary_key=True, serialize=False, verbose_name='Raw Material ID'),
+        ),
+        migrations.AlterField(
+            model_name='readymaterial',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=61, primary_key=True, serialize=False, verbose_name='Ready Material ID'),
+        ),
+        migrations.AlterField(
+            model_name='stockmovement',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=56, primary_key=True, serialize=False, verbose_name='Movement ID'),
+        ),
+        migrations.AlterField(
+            model_name='stocksnapshot',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=57, primary_key=True, serialize=False, verbose_name='Snapshot ID'),
+        ),
+        migrations.AlterField(
+            model_name='supplier',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=61, primary_key=True, serialize=False, verbose_name='Supplier ID'),
+        ),
+    ]
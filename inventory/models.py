@@ -1,11 +1,14 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import ValidationError, MinValueValidator, MaxValueValidator
 
 from accounts.fields import PrefixedIDField
+from accounts.mixins import FieldTrackerMixin
 from accounts.models import InventoryCoordinatorUser, TransporterUser, WorkerUser
-from inventory.enums import Unit, Status, PackageType
+from inventory.enums import Unit, Status, PackageType, LotType, MovementKind, AllocationStrategy
+from inventory.expiry import ExpiringLotQuerySet
+from inventory.stock import add_stock_delta, get_available_quantity, get_movement, record_ledger_movements
 
 
 class Supplier(models.Model):
@@ -18,9 +21,6 @@ class Supplier(models.Model):
     class Meta:
         verbose_name = _('Supplier')
         verbose_name_plural = _('Suppliers')
-        indexes = [
-            models.Index(fields=['id'], name='supplier_id_index')
-        ]
 
     def __str__(self):
         return self.name
@@ -34,15 +34,17 @@ class Category(models.Model):
     max_processing_time_hours = models.PositiveIntegerField(
         null=True, blank=True, verbose_name=_('Max Processing Time (Hours)')
     )
+    allocation_strategy = models.CharField(
+        max_length=20, choices=AllocationStrategy.choices, null=True, blank=True,
+        verbose_name=_('Allocation Strategy'),
+        help_text=_('Order in which the lots of its materials are consumed, overrides the one of the restaurant')
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Created At'))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Updated At'))
 
     class Meta:
         verbose_name = _('Category')
         verbose_name_plural = _('Categories')
-        indexes = [
-            models.Index(fields=['id'], name='category_id_index')
-        ]
 
     def __str__(self):
         return self.name
@@ -68,9 +70,6 @@ class Material(models.Model):
     class Meta:
         verbose_name = _('Material')
         verbose_name_plural = _('Materials')
-        indexes = [
-            models.Index(fields=['id'], name='material_id_index')
-        ]
 
     def __str__(self):
         return self.material_name
@@ -95,6 +94,8 @@ class RawMaterial(models.Model):
     # Dates
     production_date = models.DateField(null=True, blank=True, verbose_name=_('Production Date'))
     expiration_date = models.DateField(null=True, blank=True, verbose_name=_('Expiration Date'))
+    expired_at = models.DateTimeField(null=True, blank=True, verbose_name=_('Expired At'),
+                                      help_text=_('When the expiry sweep wrote the lot off'))
 
     # Quality and status
     inventory_coordinator = models.ForeignKey(
@@ -120,11 +121,15 @@ class RawMaterial(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Created At'))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Updated At'))
 
+    objects = ExpiringLotQuerySet.as_manager()
+
     class Meta:
         verbose_name = _('Raw Material')
         verbose_name_plural = _('Raw Materials')
         indexes = [
-            models.Index(fields=['id'], name='raw_mat_id_index')
+            # Serves the expiry sweep, only the lots it did not write off yet are indexed
+            models.Index(fields=['expiration_date'], condition=models.Q(expired_at__isnull=True),
+                         name='raw_mat_expiry_index')
         ]
 
     def clean(self):
@@ -153,26 +158,31 @@ class RawMaterial(models.Model):
         if not self.pk and not self.current_quantity:
             self.current_quantity = self.initial_quantity
         self.clean()
-        super().save(*args, **kwargs)
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                # Open the ledger of the lot with the quantity it was received with
+                record_ledger_movements([
+                    get_movement(RawMaterial, self.pk, self.current_quantity or 0, MovementKind.RECEIPT)
+                ])
 
     def __str__(self):
         return self.material.material_name
 
     def reduce_quantity(self, quantity):
-        if quantity > self.current_quantity:
+        if quantity > get_available_quantity(self):
             raise ValueError(
                 "Not enough quantity available to reduce."
             )
-        self.current_quantity -= quantity
-        self.save()
+        add_stock_delta(RawMaterial, self.pk, -quantity, instance=self)
 
     def increase_quantity(self, quantity):
         if quantity < 0:
             raise ValueError(
                 "Cannot increase quantity by a negative amount."
             )
-        self.current_quantity += quantity
-        self.save()
+        add_stock_delta(RawMaterial, self.pk, quantity, instance=self)
 
 
 class ReadyMaterial(models.Model):
@@ -206,9 +216,6 @@ class ReadyMaterial(models.Model):
     class Meta:
         verbose_name = _('Ready Material')
         verbose_name_plural = _('Ready Materials')
-        indexes = [
-            models.Index(fields=['id'], name='raw_mat_ready_id_index')
-        ]
 
     def clean(self):
         # Ensure consumed quantity doesn't exceed available raw material quantity
@@ -227,13 +234,21 @@ class ReadyMaterial(models.Model):
         if not self.pk and not self.current_quantity:
             self.current_quantity = self.initial_quantity
         self.clean()
-        super().save(*args, **kwargs)
+        adding = self._state.adding
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if adding:
+                # Open the ledger of the lot with the quantity the workstation delivered
+                record_ledger_movements([
+                    get_movement(ReadyMaterial, self.pk, self.current_quantity or 0, MovementKind.RECEIPT,
+                                 self.workstation_prepared_material_id)
+                ])
 
     def __str__(self):
         return self.id
 
 
-class PackagedMaterial(models.Model):
+class PackagedMaterial(FieldTrackerMixin, models.Model):
     id = PrefixedIDField(prefix='PM', verbose_name=_('Packaged Material ID'))
     ready_material = models.ForeignKey(ReadyMaterial, on_delete=models.CASCADE, related_name='packed_materials',
                                        verbose_name=_('Ready Material'))
@@ -253,6 +268,8 @@ class PackagedMaterial(models.Model):
 
     production_date = models.DateField(null=True, blank=True, verbose_name=_('Production Date'))
     expiration_date = models.DateField(null=True, blank=True, verbose_name=_('Expiration Date'))
+    expired_at = models.DateTimeField(null=True, blank=True, verbose_name=_('Expired At'),
+                                      help_text=_('When the expiry sweep flagged the package'))
 
     storage_location = models.CharField(max_length=100, null=True, blank=True, verbose_name=_('Stored Location'))
     storage_temperature = models.PositiveIntegerField(null=True, blank=True, verbose_name=_('Stored Temperature'))
@@ -260,19 +277,26 @@ class PackagedMaterial(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Created At'))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Updated At'))
 
+    objects = ExpiringLotQuerySet.as_manager()
+
+    tracked_fields = ('quantity',)
+
     class Meta:
         verbose_name = _('Packaged Material')
         verbose_name_plural = _('Packaged Materials')
         indexes = [
-            models.Index(fields=['id'], name='pac_mat_id_index')
+            # Serves the expiry sweep, only the packages it did not flag yet are indexed
+            models.Index(fields=['expiration_date'], condition=models.Q(expired_at__isnull=True),
+                         name='pkg_mat_expiry_index')
         ]
 
     def clean(self):
         # Ensure packaged quantity doesn't exceed ready material quantity
         if self.ready_material:
-            if self.quantity > self.ready_material.current_quantity:
+            available_quantity = get_available_quantity(self.ready_material)
+            if self.quantity > available_quantity:
                 raise ValidationError(
-                    {'quantity': f'Only {self.ready_material.current_quantity} units available.'}
+                    {'quantity': f'Only {available_quantity} units available.'}
                 )
 
         # Validate expiration date is after production date
@@ -288,3 +312,71 @@ class PackagedMaterial(models.Model):
 
     def __str__(self):
         return self.id
+
+
+class StockMovement(models.Model):
+    """
+    A change of the quantity of a lot, never updated nor deleted once written, see `inventory.ledger`.
+    """
+    id = PrefixedIDField(prefix='MOV', verbose_name=_('Movement ID'))
+
+    # Not a foreign key, the movements of a lot outlive it
+    lot_type = models.CharField(max_length=30, choices=LotType.choices, verbose_name=_('Lot Type'))
+    lot_id = models.CharField(max_length=64, verbose_name=_('Lot ID'))
+    kind = models.CharField(max_length=20, choices=MovementKind.choices, verbose_name=_('Kind'))
+    quantity = models.IntegerField(verbose_name=_('Quantity'), help_text=_('Negative when stock leaves the lot'))
+    reference = models.CharField(max_length=64, null=True, blank=True, verbose_name=_('Reference'),
+                                 help_text=_('ID of the record causing the movement'))
+    occurred_at = models.DateTimeField(default=timezone.now, verbose_name=_('Occurred At'))
+
+    class Meta:
+        verbose_name = _('Stock Movement')
+        verbose_name_plural = _('Stock Movements')
+        indexes = [
+            # Serves the replay of the movements of a lot since its latest snapshot
+            models.Index(fields=['lot_type', 'lot_id', 'occurred_at'], name='mov_lot_occurred_index'),
+            # Serves the lookup of the lots moved since the latest snapshot of a lot type
+            models.Index(fields=['lot_type', 'occurred_at', 'lot_id'], name='mov_type_occurred_index'),
+        ]
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValidationError('Stock movements cannot be changed, record a new one instead.')
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValidationError('Stock movements cannot be deleted, record a new one instead.')
+
+    def __str__(self):
+        return f'{self.lot_id} {self.kind}: {self.quantity}'
+
+
+class StockSnapshot(models.Model):
+    """
+    The quantity of a lot as of `taken_at`, i.e. the sum of its movements that occurred until then.
+    """
+    id = PrefixedIDField(prefix='SNAP', verbose_name=_('Snapshot ID'))
+
+    lot_type = models.CharField(max_length=30, choices=LotType.choices, verbose_name=_('Lot Type'))
+    lot_id = models.CharField(max_length=64, verbose_name=_('Lot ID'))
+    quantity = models.IntegerField(verbose_name=_('Quantity'))
+    movement_count = models.PositiveIntegerField(verbose_name=_('Movement Count'),
+                                                 help_text=_('Movements folded since the previous snapshot'))
+    taken_at = models.DateTimeField(verbose_name=_('Taken At'))
+
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Created At'))
+
+    class Meta:
+        verbose_name = _('Stock Snapshot')
+        verbose_name_plural = _('Stock Snapshots')
+        constraints = [
+            # Also serves the lookup of the latest snapshot of a lot before a date
+            models.UniqueConstraint(fields=['lot_type', 'lot_id', 'taken_at'], name='snap_lot_taken_unique')
+        ]
+        indexes = [
+            # Serves the lookup of the latest snapshot of a lot type, the watermark of `take_snapshots`
+            models.Index(fields=['lot_type', 'taken_at'], name='snap_type_taken_index')
+        ]
+
+    def __str__(self):
+        return f'{self.lot_id} @ {self.taken_at}: {self.quantity}'
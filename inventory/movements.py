@@ -0,0 +1,109 @@
+from collections import defaultdict
+
+from django.core.exceptions import ValidationError
+from django.utils import timezone
+
+from inventory.enums import MovementKind
+from inventory.stock import add_stock_delta, get_available_quantity, stock_unit_of_work
+
+
+def record_movements(rows, lot_field: str, quantity_field: str, kind: str, batch_size: int = None) -> list:
+    """
+    Write many stock movements of one model at once, keeping the current quantity of their lots in step.
+
+    New rows are inserted with `bulk_create` and existing ones written with `bulk_update`, which both skip the
+    `post_save` receivers, so the stock deltas they would have applied are summed per lot and applied by the
+    surrounding unit of work instead, one increment per lot, with one ledger movement per row. The lots are read
+    and locked with one query, every row is validated as its `save` would, and the batch as a whole must fit in
+    the stock of each lot: nothing is written if any row is refused.
+
+    Args:
+        - rows: Iterable of unsaved or changed instances of the same model.
+        - lot_field: The name of the foreign key to the lot the movement takes stock from.
+        - quantity_field: The name of the field holding the quantity taken from the lot.
+        - kind: The MovementKind recorded in the ledger.
+        - batch_size: The number of rows written per statement, all of them by default.
+
+    Returns:
+        - The written rows, with their ids.
+
+    Raises:
+        - ValidationError: With one message per refused row or short lot.
+    """
+    rows = list(rows)
+    if not rows:
+        return []
+
+    model = rows[0].__class__
+    field = model._meta.get_field(lot_field)
+    lot_model = field.related_model
+
+    with stock_unit_of_work():
+        lots = lot_model.objects.select_for_update().in_bulk({getattr(row, field.attname) for row in rows})
+
+        errors = []
+        row_deltas = []
+        deltas = defaultdict(int)
+        for index, row in enumerate(rows):
+            lot = lots.get(getattr(row, field.attname))
+            if lot is None:
+                errors.append(f'Row {index}: unknown {lot_model._meta.verbose_name} {getattr(row, field.attname)}.')
+                continue
+            field.set_cached_value(row, lot)
+
+            try:
+                row.clean()
+            except ValidationError as error:
+                errors.extend(f'Row {index}: {message}' for message in error.messages)
+                continue
+
+            quantity = getattr(row, quantity_field)
+            old_quantity = 0 if row._state.adding else row.old_value(quantity_field, default=quantity)
+            row_deltas.append((row, lot.pk, old_quantity - quantity))
+            deltas[lot.pk] += old_quantity - quantity
+
+        for lot_id, delta in deltas.items():
+            available_quantity = get_available_quantity(lots[lot_id])
+            if available_quantity + delta < 0:
+                errors.append(f'Only {available_quantity} units of {lot_id} available, {-delta} requested.')
+
+        if errors:
+            raise ValidationError(errors)
+
+        created = [row for row in rows if row._state.adding]
+        updated = [row for row in rows if not row._state.adding]
+
+        ids = model._meta.pk.generate_ids(sum(1 for row in created if not row.pk))
+        ids.reverse()
+        for row in created:
+            if not row.pk:
+                row.pk = ids.pop()
+        model.objects.bulk_create(created, batch_size=batch_size)
+
+        now = timezone.now()
+        for row in updated:
+            row.updated_at = now
+        model.objects.bulk_update(updated, [quantity_field, 'updated_at'], batch_size=batch_size)
+
+        for row, lot_id, delta in row_deltas:
+            add_stock_delta(lot_model, lot_id, delta, kind, row.pk)
+
+    for row in rows:
+        row.snapshot_tracked_fields()
+    return rows
+
+
+def record_raw_material_consumptions(consumptions, batch_size: int = None) -> list:
+    """
+    Write many workstation raw material consumptions at once, taking their quantity from the raw material lots.
+    See `record_movements`.
+    """
+    return record_movements(consumptions, 'raw_material', 'quantity_consumed', MovementKind.CONSUMPTION, batch_size)
+
+
+def record_packagings(packagings, batch_size: int = None) -> list:
+    """
+    Write many packagings at once, taking their quantity from the ready material lots.
+    See `record_movements`.
+    """
+    return record_movements(packagings, 'ready_material', 'quantity', MovementKind.PACKAGING, batch_size)
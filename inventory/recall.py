@@ -0,0 +1,155 @@
+import json
+from collections import defaultdict
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+
+from orders.enums import OrderStatus
+
+
+OPEN_ORDER_STATUSES = [
+    OrderStatus.PENDING,
+    OrderStatus.CONFIRMED,
+    OrderStatus.PREPARING,
+    OrderStatus.READY,
+]
+
+
+def get_recalled_raw_materials(supplier_ids=(), raw_material_ids=()) -> list:
+    """
+    Get the raw material lots hit by a recall of whole suppliers or of single lots, in one query.
+    """
+    from inventory.models import RawMaterial
+
+    return list(
+        RawMaterial.objects.filter(
+            Q(supplier_id__in=set(supplier_ids)) | Q(id__in=set(raw_material_ids))
+        ).values('id', 'supplier_id', 'material_id', 'current_quantity', 'expiration_date')
+    )
+
+
+def iter_recall_impact(supplier_ids=(), raw_material_ids=()):
+    """
+    Walk the supply chain forward from recalled suppliers or raw material lots and yield every affected record.
+
+    Each level of the chain is read with one batched IN query on the ids of the previous one, and the consumed
+    lots are mapped to their orders through the material lineage index, so the number of queries does not depend
+    on the number of affected records.
+
+    Records are dictionaries with `restaurant_id`, `type`, `id` and details. The inventory level records, raw,
+    ready and packaged lots, come first with no restaurant, then the records of each restaurant: its lots, then
+    the open orders that consumed or reserved the recalled stock, then the delivered ones.
+
+    Args:
+        - supplier_ids: Suppliers whose every raw material lot is recalled.
+        - raw_material_ids: Raw material lots recalled on their own.
+    """
+    from inventory.models import ReadyMaterial, PackagedMaterial
+    from workstation.models import WorkstationRawMaterialConsumption, WorkstationPreparedMaterial
+    from restaurant.models import RestaurantPackagedMaterial, MaterialLineage, StockReservation
+
+    raw_materials = get_recalled_raw_materials(supplier_ids, raw_material_ids)
+    for raw_material in raw_materials:
+        yield {'restaurant_id': None, 'type': 'raw_material', **raw_material}
+
+    raw_material_ids = [raw_material['id'] for raw_material in raw_materials]
+    if not raw_material_ids:
+        return
+
+    # Workstations only link raw lots to ready lots, they are walked without being reported
+    consumption_ids = list(
+        WorkstationRawMaterialConsumption.objects.filter(
+            raw_material_id__in=raw_material_ids
+        ).values_list('id', flat=True)
+    )
+    prepared_ids = list(
+        WorkstationPreparedMaterial.objects.filter(
+            workstation_raw_material_consumption_id__in=consumption_ids
+        ).values_list('id', flat=True)
+    ) if consumption_ids else []
+
+    ready_materials = list(
+        ReadyMaterial.objects.filter(
+            workstation_prepared_material_id__in=prepared_ids
+        ).values('id', 'workstation_prepared_material_id', 'current_quantity', 'delivery_date')
+    ) if prepared_ids else []
+    for ready_material in ready_materials:
+        yield {'restaurant_id': None, 'type': 'ready_material', **ready_material}
+
+    packaged_materials = list(
+        PackagedMaterial.objects.filter(
+            ready_material_id__in=[ready_material['id'] for ready_material in ready_materials]
+        ).values('id', 'ready_material_id', 'quantity', 'expiration_date')
+    ) if ready_materials else []
+    for packaged_material in packaged_materials:
+        yield {'restaurant_id': None, 'type': 'packaged_material', **packaged_material}
+
+    restaurant_lots = defaultdict(list)
+    if packaged_materials:
+        for lot in RestaurantPackagedMaterial.objects.filter(
+            package_material_id__in=[packaged_material['id'] for packaged_material in packaged_materials]
+        ).values('id', 'restaurant_id', 'material_id', 'package_material_id', 'current_package_quantity',
+                 'expiration_date'):
+            restaurant_lots[lot['restaurant_id']].append(lot)
+
+    # Orders that already consumed recalled lots, found through the lineage index
+    orders = defaultdict(dict)
+    for restaurant_id, order_id, status, order_item_id, quantity_consumed in MaterialLineage.objects.filter(
+        raw_material_id__in=raw_material_ids
+    ).values_list(
+        'restaurant_id', 'order_item__order_id', 'order_item__order__status', 'order_item_id', 'quantity_consumed'
+    ).order_by('order_item__order_id'):
+        order = orders[restaurant_id].setdefault(
+            order_id, {'status': status, 'order_item_ids': set(), 'quantity_consumed': 0, 'quantity_reserved': 0}
+        )
+        order['order_item_ids'].add(order_item_id)
+        order['quantity_consumed'] += quantity_consumed
+
+    # Confirmed orders holding reservations on materials whose recalled lots still have stock
+    stocked_keys = {
+        (lot['restaurant_id'], lot['material_id'])
+        for lots in restaurant_lots.values()
+        for lot in lots
+        if lot['current_package_quantity']
+    }
+    if stocked_keys:
+        for restaurant_id, material_id, order_id, status, quantity in StockReservation.objects.filter(
+            restaurant_id__in={restaurant_id for restaurant_id, _ in stocked_keys},
+            material_id__in={material_id for _, material_id in stocked_keys}
+        ).values_list('restaurant_id', 'material_id', 'order_id', 'order__status', 'quantity'):
+            if (restaurant_id, material_id) in stocked_keys:
+                order = orders[restaurant_id].setdefault(
+                    order_id,
+                    {'status': status, 'order_item_ids': set(), 'quantity_consumed': 0, 'quantity_reserved': 0}
+                )
+                order['quantity_reserved'] += quantity
+
+    restaurant_ids = sorted(restaurant_lots.keys() | orders.keys(), key=lambda restaurant_id: restaurant_id or '')
+    for restaurant_id in restaurant_ids:
+        for lot in restaurant_lots.get(restaurant_id, []):
+            yield {'restaurant_id': restaurant_id, 'type': 'restaurant_package_material', **lot}
+
+        restaurant_orders = orders.get(restaurant_id, {})
+        for record_type, statuses in [
+            ('open_order', OPEN_ORDER_STATUSES),
+            ('delivered_order', [OrderStatus.DELIVERED])
+        ]:
+            for order_id, order in restaurant_orders.items():
+                if order['status'] in statuses:
+                    yield {
+                        'restaurant_id': restaurant_id,
+                        'type': record_type,
+                        'id': order_id,
+                        'status': OrderStatus(order['status']).label,
+                        'order_item_ids': sorted(order['order_item_ids']),
+                        'quantity_consumed': order['quantity_consumed'],
+                        'quantity_reserved': order['quantity_reserved'],
+                    }
+
+
+def iter_recall_impact_jsonl(supplier_ids=(), raw_material_ids=()):
+    """
+    Serialize the records of `iter_recall_impact` as JSON lines.
+    """
+    for record in iter_recall_impact(supplier_ids, raw_material_ids):
+        yield json.dumps(record, cls=DjangoJSONEncoder) + '\n'
@@ -0,0 +1,504 @@
+import random
+from collections import Counter, defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from decimal import Decimal
+
+import django
+import faker
+from django.contrib.auth.hashers import make_password
+from django.db import connections, transaction
+from django.utils import timezone
+
+from inventory.enums import MovementKind, Unit, PackageType
+from inventory.factories import _FOOD_CATEGORIES, _FOOD_WORKSTATION, _STORAGE_LOCATIONS
+
+
+SEED_PASSWORD = 'defaultpassword'
+
+PRODUCT_STYLES = ['bowl', 'salad', 'plate', 'soup', 'wrap', 'skillet', 'platter', 'stew']
+
+PRODUCT_CATEGORIES = ['Starters', 'Mains', 'Sides', 'Desserts', 'Drinks']
+
+# Share of the seeded orders per final status, the delivered ones consume their ingredients
+ORDER_STATUS_WEIGHTS = {
+    'delivered': 6,
+    'pending': 3,
+    'cancelled': 1,
+}
+
+# A restaurant lot and the upstream lots it was packaged from, before anything is written
+SeedLot = namedtuple('SeedLot', [
+    'id', 'material_id', 'supplier_id', 'unit', 'quantity', 'expiration_date',
+    'raw_material_id', 'consumption_id', 'prepared_material_id', 'ready_material_id', 'package_material_id',
+])
+
+
+def get_or_create_many(model, objects: list, key: str, batch_size: int) -> dict:
+    """
+    Insert the objects whose `key` is not taken yet, then map every key to the primary key it has in the database.
+    The taken keys are read first, so keys without a unique constraint, like the workstation names, are not
+    inserted twice either. Costs two reads and one insert per batch, whatever the number of existing rows.
+    """
+    keys = [getattr(obj, key) for obj in objects]
+    existing = set(model.objects.filter(**{f'{key}__in': keys}).values_list(key, flat=True))
+    model.objects.bulk_create(
+        [obj for obj in objects if getattr(obj, key) not in existing], batch_size=batch_size, ignore_conflicts=True
+    )
+    return dict(model.objects.filter(**{f'{key}__in': keys}).values_list(key, 'pk'))
+
+
+def seed_users(seed: int, counts: dict, batch_size: int) -> dict:
+    """
+    Create the users of every role with a single password hash shared by all of them.
+    Returns a dictionary with the role as key and the list of user ids as value.
+    """
+    from accounts.enums import UserRole
+    from accounts.models import User
+
+    password = make_password(SEED_PASSWORD)
+    users = {}
+    for role, count in counts.items():
+        role_name = UserRole(role).name.lower()
+        ids = get_or_create_many(User, [
+            User(
+                username=f'seed{seed}-{role_name}-{index:06d}',
+                email=f'seed{seed}-{role_name}-{index:06d}@example.com',
+                password=password,
+                role=role
+            )
+            for index in range(count)
+        ], 'username', batch_size)
+        users[role] = [pk for _, pk in sorted(ids.items())]
+    return users
+
+
+def seed_catalog(rng: random.Random, fake, seed: int, options: dict) -> dict:
+    """
+    Create the shared part of the supply chain: users, suppliers, categories and materials from the food
+    vocabularies, workstations with their equipment, restaurants, and products with their recipes.
+    The users, suppliers, categories, materials, workstations and product categories that an earlier run with the
+    same seed created are reused, the restaurants and products are created again, so every run seeds its own
+    restaurants and orders on top of the shared catalog.
+
+    Returns:
+        - The ids and attributes every restaurant seeding needs, so workers do not read them back.
+    """
+    from accounts.enums import UserRole
+    from inventory.models import Supplier, Category, Material
+    from workstation.models import Workstation, Equipment
+    from restaurant.models import Restaurant, ProductCategory, Product, RecipeIngredient
+
+    batch_size = options['batch_size']
+
+    users = seed_users(seed, {
+        UserRole.INVENTORY_COORDINATOR: 5,
+        UserRole.WORKER: 20,
+        UserRole.TRANSPORTER: 10,
+        UserRole.CUSTOMER: options['customers'],
+    }, batch_size)
+
+    supplier_ids = [pk for _, pk in sorted(get_or_create_many(Supplier, [
+        Supplier(name=f'{fake.company()} {seed}-{index}'[:100], contact_info=fake.phone_number())
+        for index in range(options['suppliers'])
+    ], 'name', batch_size).items())]
+
+    category_ids = get_or_create_many(Category, [
+        Category(
+            name=name,
+            requires_temperature_control=name in ('proteins', 'dairy', 'frozen_items'),
+            max_processing_time_hours=rng.randint(1, 48)
+        )
+        for name in _FOOD_CATEGORIES
+    ], 'name', batch_size)
+
+    existing = {
+        (category_id, name): pk
+        for pk, category_id, name in Material.objects.filter(
+            category_id__in=category_ids.values()
+        ).values_list('pk', 'category_id', 'material_name')
+    }
+    new_materials = [
+        Material(category_id=category_ids[category], material_name=name)
+        for category, names in _FOOD_CATEGORIES.items()
+        for name in names
+        if (category_ids[category], name) not in existing
+    ]
+    Material.objects.bulk_create(new_materials, batch_size=batch_size)
+    existing.update({(material.category_id, material.material_name): material.pk for material in new_materials})
+    # Ids are not part of the seeded data, everything is drawn in the order of the vocabularies
+    material_ids = [
+        existing[(category_ids[category], name)] for category, names in _FOOD_CATEGORIES.items() for name in names
+    ]
+
+    materials = {}
+    Through = Material.suppliers.through
+    links = []
+    for material_id in material_ids:
+        material_suppliers = sorted(rng.sample(supplier_ids, min(len(supplier_ids), rng.randint(1, 3))))
+        materials[material_id] = {'suppliers': material_suppliers, 'unit': rng.choice(Unit.values)}
+        links.extend(Through(material_id=material_id, supplier_id=supplier_id) for supplier_id in material_suppliers)
+    Through.objects.bulk_create(links, batch_size=batch_size, ignore_conflicts=True)
+
+    workstations = get_or_create_many(Workstation, [
+        Workstation(
+            name=name.replace('_', ' ').title(),
+            description=details['description'],
+            location=fake.street_address(),
+            max_daily_capacity=rng.randint(100, 1000)
+        )
+        for name, details in _FOOD_WORKSTATION.items()
+    ], 'name', batch_size)
+    if not Equipment.objects.filter(workstation_id__in=workstations.values()).exists():
+        Equipment.objects.bulk_create([
+            Equipment(workstation_id=workstations[name.replace('_', ' ').title()], name=equipment[:100])
+            for name, details in _FOOD_WORKSTATION.items()
+            for equipment in details['equipment']
+        ], batch_size=batch_size)
+
+    restaurants = Restaurant.objects.bulk_create([
+        Restaurant(name=f'{fake.city()} Kitchen', location=fake.address())
+        for _ in range(options['restaurants'])
+    ], batch_size=batch_size)
+
+    product_category_ids = get_or_create_many(ProductCategory, [
+        ProductCategory(name=name) for name in PRODUCT_CATEGORIES
+    ], 'name', batch_size)
+
+    names = {material_id: name for (_, name), material_id in existing.items()}
+    products = {}
+    new_products = []
+    ingredients = []
+    for product_id in Product._meta.pk.generate_ids(options['products']):
+        recipe = {
+            material_id: rng.randint(1, 5)
+            for material_id in rng.sample(material_ids, rng.randint(2, 5))
+        }
+        price = Decimal(rng.randint(500, 3000)) / 100
+        main = names[next(iter(recipe))]
+        new_products.append(Product(
+            id=product_id,
+            name=f'{main.title()} {rng.choice(PRODUCT_STYLES)}',
+            category_id=product_category_ids[rng.choice(PRODUCT_CATEGORIES)],
+            selling_price=price
+        ))
+        ingredients.extend(
+            RecipeIngredient(product_id=product_id, material_id=material_id, quantity_consumed=quantity)
+            for material_id, quantity in recipe.items()
+        )
+        products[product_id] = {'price': price, 'recipe': recipe}
+    Product.objects.bulk_create(new_products, batch_size=batch_size)
+    RecipeIngredient.objects.bulk_create(ingredients, batch_size=batch_size)
+
+    return {
+        'users': users,
+        'materials': materials,
+        'workstations': [pk for _, pk in sorted(workstations.items())],
+        'restaurants': [restaurant.pk for restaurant in restaurants],
+        'products': products,
+    }
+
+
+def build_lots(rng: random.Random, catalog: dict, count: int, today) -> list:
+    """
+    Draw the restaurant lots of one restaurant with their upstream lots, one raw lot per restaurant lot.
+    Every id is generated up front, so the rows of each level can point to the next without reading them back.
+    """
+    from inventory.models import RawMaterial, ReadyMaterial, PackagedMaterial
+    from workstation.models import WorkstationRawMaterialConsumption, WorkstationPreparedMaterial
+    from restaurant.models import RestaurantPackagedMaterial
+
+    # Only stock the materials some recipe uses
+    used = {material_id for product in catalog['products'].values() for material_id in product['recipe']}
+    material_ids = [material_id for material_id in catalog['materials'] if material_id in used]
+    ids = zip(
+        RestaurantPackagedMaterial._meta.pk.generate_ids(count),
+        RawMaterial._meta.pk.generate_ids(count),
+        WorkstationRawMaterialConsumption._meta.pk.generate_ids(count),
+        WorkstationPreparedMaterial._meta.pk.generate_ids(count),
+        ReadyMaterial._meta.pk.generate_ids(count),
+        PackagedMaterial._meta.pk.generate_ids(count),
+    )
+
+    lots = []
+    for lot_id, raw_id, consumption_id, prepared_id, ready_id, package_id in ids:
+        material_id = rng.choice(material_ids)
+        material = catalog['materials'][material_id]
+        lots.append(SeedLot(
+            id=lot_id,
+            material_id=material_id,
+            supplier_id=rng.choice(material['suppliers']),
+            unit=material['unit'],
+            quantity=rng.randint(20, 200),
+            # A few lots are expired already
+            expiration_date=today + timedelta(days=rng.randint(-7, 90)),
+            raw_material_id=raw_id,
+            consumption_id=consumption_id,
+            prepared_material_id=prepared_id,
+            ready_material_id=ready_id,
+            package_material_id=package_id,
+        ))
+    return lots
+
+
+def build_lot_rows(rng: random.Random, catalog: dict, restaurant_id, lots: list, remaining: dict, today) -> dict:
+    """
+    Build the rows of every level of the chain of many lots, the restaurant lots holding what the orders left, and
+    the movements opening their ledger.
+    Returns a dictionary with the model as key and its rows as value, in insert order.
+    """
+    from accounts.enums import UserRole
+    from inventory.models import RawMaterial, ReadyMaterial, PackagedMaterial, StockMovement
+    from inventory.stock import get_movement
+    from workstation.models import WorkstationRawMaterialConsumption, WorkstationPreparedMaterial
+    from restaurant.models import RestaurantPackagedMaterial
+
+    users = catalog['users']
+    rows = defaultdict(list)
+    now = timezone.now()
+    for lot in lots:
+        coordinator_id = rng.choice(users[UserRole.INVENTORY_COORDINATOR])
+        worker_id = rng.choice(users[UserRole.WORKER])
+        transporter_id = rng.choice(users[UserRole.TRANSPORTER])
+        production_date = lot.expiration_date - timedelta(days=rng.randint(30, 180))
+        leftover = rng.randint(0, 50)
+
+        rows[RawMaterial].append(RawMaterial(
+            id=lot.raw_material_id, supplier_id=lot.supplier_id, material_id=lot.material_id,
+            initial_quantity=lot.quantity + leftover, current_quantity=leftover, unit=lot.unit,
+            production_date=production_date, expiration_date=lot.expiration_date + timedelta(days=30),
+            inventory_coordinator_id=coordinator_id, quality_score=rng.randint(5, 10),
+            received_date=now - timedelta(days=rng.randint(10, 60)),
+            storage_location=rng.choice(_STORAGE_LOCATIONS), storage_temperature=rng.choice([0, 4, 20])
+        ))
+        rows[WorkstationRawMaterialConsumption].append(WorkstationRawMaterialConsumption(
+            id=lot.consumption_id, workstation_id=rng.choice(catalog['workstations']),
+            raw_material_id=lot.raw_material_id, worker_id=worker_id, quantity_consumed=lot.quantity,
+            unit=lot.unit, transporter_id=transporter_id
+        ))
+        rows[WorkstationPreparedMaterial].append(WorkstationPreparedMaterial(
+            id=lot.prepared_material_id, workstation_raw_material_consumption_id=lot.consumption_id,
+            quantity=lot.quantity, unit=lot.unit
+        ))
+        rows[ReadyMaterial].append(ReadyMaterial(
+            id=lot.ready_material_id, workstation_prepared_material_id=lot.prepared_material_id,
+            inventory_coordinator_id=coordinator_id, quality_score=rng.randint(5, 10),
+            initial_quantity=lot.quantity, current_quantity=0, unit=lot.unit, transporter_id=transporter_id
+        ))
+        rows[PackagedMaterial].append(PackagedMaterial(
+            id=lot.package_material_id, ready_material_id=lot.ready_material_id, worker_id=worker_id,
+            quantity=lot.quantity, unit=lot.unit, package_date=today - timedelta(days=rng.randint(1, 7)),
+            package_type=rng.choice(PackageType.values), production_date=production_date,
+            expiration_date=lot.expiration_date, storage_location=rng.choice(_STORAGE_LOCATIONS)
+        ))
+        rows[RestaurantPackagedMaterial].append(RestaurantPackagedMaterial(
+            id=lot.id, restaurant_id=restaurant_id, material_id=lot.material_id,
+            package_material_id=lot.package_material_id, initial_package_quantity=lot.quantity,
+            current_package_quantity=remaining[lot.id], unit=lot.unit, transporter_id=transporter_id,
+            production_date=production_date, expiration_date=lot.expiration_date,
+            finished_date=now if not remaining[lot.id] else None
+        ))
+
+    # The seeded history is not replayed in the ledger, each lot opens it with the quantity it holds
+    movements = [
+        get_movement(model, row.pk, getattr(row, quantity_field) or 0, MovementKind.OPENING)
+        for model, quantity_field in (
+            (RawMaterial, 'current_quantity'),
+            (ReadyMaterial, 'current_quantity'),
+            (RestaurantPackagedMaterial, 'current_package_quantity'),
+        )
+        for row in rows[model]
+    ]
+    for movement, movement_id in zip(movements, StockMovement._meta.pk.generate_ids(len(movements))):
+        movement.id = movement_id
+    rows[StockMovement] = movements
+    return rows
+
+
+def allocate(lots_by_material: dict, remaining: dict, required: dict, today):
+    """
+    Take the required quantities from the unexpired lots in FIFO order, or nothing if any material is short.
+    Returns a list of (lot, quantity) tuples, or None on shortage.
+    """
+    taken = []
+    for material_id, quantity in required.items():
+        for lot in lots_by_material.get(material_id, []):
+            if quantity == 0:
+                break
+            if remaining[lot.id] <= 0 or lot.expiration_date < today:
+                continue
+            amount = min(remaining[lot.id], quantity)
+            taken.append((lot, amount))
+            quantity -= amount
+        if quantity:
+            return None
+    return taken
+
+
+def build_order_rows(rng: random.Random, catalog: dict, restaurant_id, lots: list, remaining: dict, count: int,
+                     today) -> dict:
+    """
+    Draw the orders of one restaurant with their items, and consume the ingredients of the delivered ones from
+    the lots, recording the consumption and its lineage. Orders whose ingredients are short stay pending.
+    Returns a dictionary with the model as key and its rows as value, in insert order.
+    """
+    from accounts.enums import UserRole
+    from orders.enums import OrderStatus
+    from orders.models import Order, OrderItem
+    from restaurant.models import RestaurantPackagedMaterialConsumption, MaterialLineage
+
+    lots_by_material = defaultdict(list)
+    for _, lot in sorted(enumerate(lots), key=lambda item: (item[1].expiration_date, item[0])):
+        lots_by_material[lot.material_id].append(lot)
+
+    product_ids = list(catalog['products'])
+    statuses = list(ORDER_STATUS_WEIGHTS)
+    weights = list(ORDER_STATUS_WEIGHTS.values())
+    now = timezone.now()
+
+    rows = defaultdict(list)
+    for order_id in Order._meta.pk.generate_ids(count):
+        status = rng.choices(statuses, weights)[0]
+        order_date = now - timedelta(minutes=rng.randint(60, 90 * 24 * 60))
+
+        items = []
+        order_product_ids = rng.sample(product_ids, min(len(product_ids), rng.randint(1, 4)))
+        for item_id, product_id in zip(OrderItem._meta.pk.generate_ids(len(order_product_ids)), order_product_ids):
+            product = catalog['products'][product_id]
+            quantity = rng.randint(1, 3)
+            items.append((item_id, product_id, quantity, product))
+
+        consumptions = []
+        if status == 'delivered':
+            for item_id, product_id, quantity, product in items:
+                required = {material_id: used * quantity for material_id, used in product['recipe'].items()}
+                taken = allocate(lots_by_material, remaining, required, today)
+                if taken is None:
+                    status = 'pending'
+                    break
+                for lot, amount in taken:
+                    remaining[lot.id] -= amount
+                consumptions.extend((item_id, lot, amount) for lot, amount in taken)
+            if status == 'pending':
+                # Give back what the first items of a short order took
+                for _, lot, amount in consumptions:
+                    remaining[lot.id] += amount
+                consumptions = []
+
+        order_status = {
+            'delivered': OrderStatus.DELIVERED,
+            'pending': OrderStatus.PENDING,
+            'cancelled': OrderStatus.CANCELLED,
+        }[status]
+        rows[Order].append(Order(
+            id=order_id, restaurant_id=restaurant_id, customer_id=rng.choice(catalog['users'][UserRole.CUSTOMER]),
+            status=order_status,
+            total_amount=sum(product['price'] * quantity for _, _, quantity, product in items),
+            order_date=order_date,
+            delivered_date=order_date + timedelta(minutes=rng.randint(15, 90)) if status == 'delivered' else None
+        ))
+        rows[OrderItem].extend(
+            OrderItem(
+                id=item_id, order_id=order_id, product_id=product_id, quantity=quantity,
+                unit_price=product['price'], total_price=product['price'] * quantity
+            )
+            for item_id, product_id, quantity, product in items
+        )
+        for consumption_id, (item_id, lot, amount) in zip(
+            RestaurantPackagedMaterialConsumption._meta.pk.generate_ids(len(consumptions)), consumptions
+        ):
+            rows[RestaurantPackagedMaterialConsumption].append(RestaurantPackagedMaterialConsumption(
+                id=consumption_id, order_item_id=item_id, restaurant_package_material_id=lot.id,
+                material_id=lot.material_id, quantity_consumed=amount, consumption_date=order_date
+            ))
+            rows[MaterialLineage].append(MaterialLineage(
+                consumption_id=consumption_id, order_item_id=item_id, restaurant_id=restaurant_id,
+                material_id=lot.material_id, restaurant_package_material_id=lot.id,
+                package_material_id=lot.package_material_id, ready_material_id=lot.ready_material_id,
+                raw_material_id=lot.raw_material_id, supplier_id=lot.supplier_id, quantity_consumed=amount
+            ))
+    return rows
+
+
+def setup_worker():
+    """
+    Initialize Django in a process of the pool, the parent closed its connections before forking.
+    """
+    django.setup()
+
+
+def seed_restaurant(catalog: dict, index: int, options: dict) -> Counter:
+    """
+    Seed the lots and the orders of one restaurant in one transaction, `batch_size` rows per insert.
+    The random generator is seeded from the run seed and the restaurant index, so the data of a restaurant does
+    not depend on which process seeds it.
+
+    Returns:
+        - The number of rows written per model label.
+    """
+    from restaurant.models import RestaurantStockPosition
+
+    rng = random.Random(f"{options['seed']}:{index}")
+    restaurant_id = catalog['restaurants'][index]
+    today = timezone.localdate()
+
+    lots = build_lots(rng, catalog, options['lots'], today)
+    remaining = {lot.id: lot.quantity for lot in lots}
+    # The orders are drawn first, so the lots are written once with what they left
+    order_rows = build_order_rows(rng, catalog, restaurant_id, lots, remaining, options['orders'], today)
+
+    counts = Counter()
+    with transaction.atomic():
+        chunk_size = options['batch_size']
+        for start in range(0, len(lots), chunk_size):
+            lot_rows = build_lot_rows(rng, catalog, restaurant_id, lots[start:start + chunk_size], remaining, today)
+            for model, objects in lot_rows.items():
+                model.objects.bulk_create(objects, batch_size=chunk_size)
+                counts[model._meta.label] += len(objects)
+
+        for model, objects in order_rows.items():
+            model.objects.bulk_create(objects, batch_size=chunk_size)
+            counts[model._meta.label] += len(objects)
+
+        counts['restaurant.RestaurantStockPosition'] += RestaurantStockPosition.objects.rebuild(
+            restaurant_ids=[restaurant_id]
+        )
+    return counts
+
+
+def seed_supply_chain(options: dict) -> Counter:
+    """
+    Seed a consistent supply chain, from suppliers down to delivered orders, with deterministic data.
+
+    The shared catalog is written first, then the restaurants, each with its lots, their upstream chain and its
+    orders, optionally fanned out across a pool of processes. Rows are written with `bulk_create` and their ids
+    are generated beforehand, so no row is read back and signals do not run; the quantities, the stock positions,
+    the stock ledger and the material lineage are kept consistent by the seeding itself.
+
+    Args:
+        - options: `seed`, `restaurants`, `lots` and `orders` per restaurant, `products`, `suppliers`,
+          `customers`, `batch_size` and `processes`.
+
+    Returns:
+        - The number of rows written per model label, the shared catalog excluded.
+    """
+    rng = random.Random(options['seed'])
+    fake = faker.Faker('en_US')
+    fake.seed_instance(options['seed'])
+
+    with transaction.atomic():
+        catalog = seed_catalog(rng, fake, options['seed'], options)
+
+    indexes = range(len(catalog['restaurants']))
+    counts = Counter({'restaurant.Restaurant': len(catalog['restaurants'])})
+    if options['processes'] > 1:
+        # Forked workers must open their own connections
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=options['processes'], initializer=setup_worker) as pool:
+            results = pool.map(seed_restaurant, [catalog] * len(indexes), indexes, [options] * len(indexes))
+            for result in results:
+                counts.update(result)
+    else:
+        for index in indexes:
+            counts.update(seed_restaurant(catalog, index, options))
+    return counts
@@ -1,59 +1,37 @@
 from django.dispatch import receiver
-from django.db import transaction
-from django.db.models.signals import post_save, post_delete, pre_save
+from django.db.models.signals import post_save, post_delete
 
-from inventory.models import PackagedMaterial
+from inventory.enums import MovementKind
+from inventory.models import PackagedMaterial, ReadyMaterial
+from inventory.stock import add_stock_delta
 
 
-@receiver(post_save, sender=PackagedMaterial)
-def update_ready_material_on_packaging_save(sender, instance, created, **kwargs):
+def add_ready_material_delta(instance, delta: int, kind: str, using=None) -> None:
     """
-    Update ready material current_quantity when packaging is created or updated
+    Add a delta to the ready material of a packaging, without loading it when it is not loaded yet
     """
-    with transaction.atomic():
-        ready_material = instance.ready_material
-
-        if created:
-            # New packaging record - subtract from current quantity
-            ready_material.current_quantity -= instance.quantity
-            ready_material.save(update_fields=['current_quantity'])
-        else:
-            # Existing record updated - need to handle the difference
-            # Get the old quantity from the stored original value
-            old_quantity = getattr(instance, '_original_quantity', instance.quantity)
-
-            quantity_difference = instance.quantity - old_quantity
-
-            if quantity_difference > 0:
-                # Increased packaging quantity
-                ready_material.current_quantity -= quantity_difference
-            elif quantity_difference < 0:
-                # Decreased packaging quantity - add back to stock
-                ready_material.current_quantity += abs(quantity_difference)
-
-            ready_material.save(update_fields=['current_quantity'])
+    ready_material = PackagedMaterial._meta.get_field('ready_material').get_cached_value(instance, None)
+    add_stock_delta(ReadyMaterial, instance.ready_material_id, delta, kind, instance.pk, ready_material, using)
 
 
-@receiver(post_delete, sender=PackagedMaterial)
-def update_ready_material_on_packaging_delete(sender, instance, **kwargs):
+@receiver(post_save, sender=PackagedMaterial)
+def update_ready_material_on_packaging_save(sender, instance, created, using=None, **kwargs):
     """
-    Update ready material current_quantity when packaging record is deleted
+    Update ready material current_quantity when packaging is created or updated
     """
-    with transaction.atomic():
-        ready_material = instance.ready_material
-        # Add back the packaged quantity to current stock
-        ready_material.current_quantity += instance.quantity
-        ready_material.save(update_fields=['current_quantity'])
+    if created:
+        # New packaging record - subtract from current quantity
+        add_ready_material_delta(instance, -instance.quantity, MovementKind.PACKAGING, using)
+    else:
+        # Existing record updated - subtract the difference with the quantity tracked when the instance was loaded
+        old_quantity = instance.old_value('quantity', default=instance.quantity)
+        add_ready_material_delta(instance, old_quantity - instance.quantity, MovementKind.PACKAGING, using)
 
 
-@receiver(pre_save, sender=PackagedMaterial)
-def store_original_packaging_quantity(sender, instance, **kwargs):
+@receiver(post_delete, sender=PackagedMaterial)
+def update_ready_material_on_packaging_delete(sender, instance, using=None, **kwargs):
     """
-    Store original quantity before saving to handle updates properly
+    Update ready material current_quantity when packaging record is deleted
     """
-    if instance.pk:  # Only for existing instances
-        try:
-            original = PackagedMaterial.objects.get(pk=instance.pk)
-            instance._original_quantity = original.quantity
-        except PackagedMaterial.DoesNotExist:
-            instance._original_quantity = 0
+    # Add back the packaged quantity to current stock
+    add_ready_material_delta(instance, instance.quantity, MovementKind.RESTORATION, using)
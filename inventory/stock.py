@@ -0,0 +1,185 @@
+from collections import defaultdict
+from contextlib import contextmanager
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from inventory.enums import LotType, MovementKind
+
+
+# Lots holding stock, with the field caching their current quantity
+LOT_MODELS = {
+    LotType.RAW_MATERIAL: ('inventory.RawMaterial', 'current_quantity'),
+    LotType.READY_MATERIAL: ('inventory.ReadyMaterial', 'current_quantity'),
+    LotType.RESTAURANT_PACKAGE_MATERIAL: ('restaurant.RestaurantPackagedMaterial', 'current_package_quantity'),
+}
+
+
+def get_lot_type(model) -> str:
+    return next(lot_type for lot_type, (label, _) in LOT_MODELS.items() if label == model._meta.label)
+
+
+def get_movement(model, pk, quantity: int, kind: str, reference=None):
+    """
+    Build an unsaved ledger movement of a lot.
+    """
+    from inventory.models import StockMovement
+
+    return StockMovement(
+        lot_type=get_lot_type(model), lot_id=pk, kind=kind, quantity=quantity, reference=reference
+    )
+
+
+def write_movements(movements, using=None) -> list:
+    """
+    Insert many ledger movements with one statement, their ids generated at once.
+    """
+    from inventory.models import StockMovement
+
+    movements = list(movements)
+    ids = StockMovement._meta.pk.generate_ids(len(movements))
+    for movement, movement_id in zip(movements, ids):
+        movement.id = movement_id
+    return StockMovement.objects.using(using).bulk_create(movements)
+
+
+class StockDeltas:
+    """
+    Quantity deltas of stock lots collected by a unit of work, summed per lot, on top of those of the unit of work
+    it is nested in, if any, along with the ledger movements explaining them.
+    """
+
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.deltas = defaultdict(int)
+        self.movements = []
+
+    def add(self, model, pk, delta: int) -> None:
+        self.deltas[model, pk] += delta
+
+    def get(self, model, pk) -> int:
+        pending = self.deltas.get((model, pk), 0)
+        return pending + self.parent.get(model, pk) if self.parent is not None else pending
+
+    def merge(self, other) -> None:
+        for key, delta in other.deltas.items():
+            self.deltas[key] += delta
+        self.movements.extend(other.movements)
+
+    def flush(self, using=None) -> int:
+        """
+        Apply every non zero delta as one atomic increment of its lot, then write the movements with one insert.
+        Lots are updated in primary key order, so two units of work touching the same lots lock them in the same
+        order. Returns the number of lots updated.
+        """
+        count = 0
+        now = timezone.now()
+        for (model, pk), delta in sorted(self.deltas.items(), key=lambda item: (item[0][0]._meta.label, item[0][1])):
+            if not delta:
+                continue
+            # `auto_now` is not applied by UPDATE statements, the timestamp is what readers revalidate against
+            model._default_manager.using(using).filter(pk=pk).update(
+                current_quantity=F('current_quantity') + delta, updated_at=now
+            )
+            count += 1
+        write_movements(self.movements, using)
+        self.deltas.clear()
+        self.movements = []
+        return count
+
+
+def get_stock_deltas(using=None):
+    """
+    Get the deltas of the innermost unit of work running on a connection, None outside of any.
+    """
+    return getattr(transaction.get_connection(using), 'stock_deltas', None)
+
+
+@contextmanager
+def stock_unit_of_work(using=None):
+    """
+    Run a block in a transaction, collecting the stock deltas of its lots and flushing them right before it ends.
+
+    A lot touched many times costs one UPDATE whatever the number of packagings or consumptions, and their ledger
+    movements a single INSERT. As the UPDATE increments the column instead of writing a value computed in Python,
+    concurrent units of work never lose each other's changes. Nested units of work hand their deltas to the outer
+    one when they succeed and drop them when they fail, like the savepoint they run in.
+
+    The lot instances in memory are not updated, refresh them to read their quantities after the block.
+
+    Example:
+        with stock_unit_of_work():
+            for ready_material in ready_materials:
+                PackagedMaterial.objects.create(ready_material=ready_material, ...)
+    """
+    connection = transaction.get_connection(using)
+    outer = getattr(connection, 'stock_deltas', None)
+    deltas = StockDeltas(outer)
+    connection.stock_deltas = deltas
+    try:
+        with transaction.atomic(using=using):
+            yield deltas
+            if outer is not None:
+                outer.merge(deltas)
+            else:
+                deltas.flush(using)
+    finally:
+        connection.stock_deltas = outer
+
+
+def record_ledger_movements(movements, using=None) -> None:
+    """
+    Record ledger movements whose quantity change is applied to the lots by the caller, like the restaurant lots
+    whose quantity also drives the stock positions. Inside a unit of work they are written when it is flushed.
+    """
+    deltas = get_stock_deltas(using)
+    if deltas is not None:
+        deltas.movements.extend(movements)
+    else:
+        write_movements(movements, using)
+
+
+def add_stock_delta(model, pk, delta: int, kind: str = MovementKind.ADJUSTMENT, reference=None, instance=None,
+                    using=None) -> None:
+    """
+    Add a delta to the current quantity of a stock lot and record it in the ledger.
+
+    Inside a unit of work the delta is collected and flushed with the others, outside of any it is applied straight
+    away by a single atomic UPDATE, and its movement by a single INSERT.
+
+    Args:
+        - model: The model of the lot, which must have a `current_quantity` field.
+        - pk: The primary key of the lot.
+        - delta: The quantity to add, negative to remove stock.
+        - kind: The MovementKind recorded in the ledger.
+        - reference: The id of the record causing the change, if any.
+        - instance: The lot loaded in memory, if any, whose quantity is kept in step when the delta is applied.
+        - using: The alias of the database the lot lives in.
+    """
+    if pk is None or not delta:
+        return
+
+    movement = get_movement(model, pk, delta, kind, reference)
+    deltas = get_stock_deltas(using)
+    if deltas is not None:
+        deltas.add(model, pk, delta)
+        deltas.movements.append(movement)
+        return
+
+    with transaction.atomic(using=using):
+        model._default_manager.using(using).filter(pk=pk).update(
+            current_quantity=F('current_quantity') + delta, updated_at=timezone.now()
+        )
+        write_movements([movement], using)
+    if instance is not None and instance.current_quantity is not None:
+        instance.current_quantity += delta
+
+
+def get_available_quantity(instance, using=None) -> int:
+    """
+    Get the current quantity of a stock lot loaded in memory, counting the deltas its unit of work did not flush yet.
+    """
+    deltas = get_stock_deltas(using)
+    pending = deltas.get(instance.__class__, instance.pk) if deltas is not None else 0
+    return (instance.current_quantity or 0) + pending
@@ -1,3 +1,537 @@
+import json
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+
+from django.apps import apps
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from accounts.models import User, CustomerUser, InventoryCoordinatorUser, TransporterUser, WorkerUser
+from inventory.enums import LotType, MovementKind
+from inventory.expiry import sweep_expired_lots
+from inventory.ledger import backfill_ledger, get_stock_as_of, rebuild_quantities, take_snapshots
+from inventory.models import (Supplier, Category, Material, RawMaterial, ReadyMaterial, PackagedMaterial, StockMovement,
+                              StockSnapshot)
+from inventory.movements import record_raw_material_consumptions
+from inventory.recall import iter_recall_impact
+from inventory.seeding import seed_supply_chain
+from inventory.stock import add_stock_delta, get_available_quantity, get_movement, stock_unit_of_work, write_movements
+from orders.enums import OrderStatus
+from orders.models import Order, OrderItem
+from restaurant.models import Restaurant, RestaurantPackagedMaterial, Product, RecipeIngredient
+from workstation.models import Workstation, WorkstationRawMaterialConsumption, WorkstationPreparedMaterial
+
+
+class InventoryTestCase(TestCase):
+    """
+    Two raw material lots of the same material.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.coordinator = InventoryCoordinatorUser.objects.create(username='coordinator', email='c@example.com')
+        cls.supplier = Supplier.objects.create(name='Supplier')
+        cls.material = Material.objects.create(category=Category.objects.create(name='Category'),
+                                               material_name='Flour')
+        cls.material.suppliers.add(cls.supplier)
+        cls.lots = [cls.create_raw_material(quantity) for quantity in (10, 20)]
+
+    @classmethod
+    def create_raw_material(cls, quantity, **kwargs):
+        return RawMaterial.objects.create(
+            supplier=cls.supplier, material=cls.material, inventory_coordinator=cls.coordinator,
+            initial_quantity=quantity, storage_location='Storage', **kwargs
+        )
+
+    def get_quantities(self) -> list:
+        return [RawMaterial.objects.get(pk=lot.pk).current_quantity for lot in self.lots]
+
+    def get_movements(self, kind=MovementKind.ADJUSTMENT) -> list:
+        return sorted(
+            StockMovement.objects.filter(lot_type=LotType.RAW_MATERIAL, kind=kind).values_list('lot_id', 'quantity')
+        )
+
+
+class StockUnitOfWorkTests(InventoryTestCase):
+
+    def test_delta_outside_unit_of_work_is_applied_at_once(self):
+        lot = self.lots[0]
+
+        add_stock_delta(RawMaterial, lot.pk, -4, instance=lot)
+
+        self.assertEqual(lot.current_quantity, 6)
+        self.assertEqual(self.get_quantities(), [6, 20])
+        self.assertEqual(self.get_movements(), [(lot.pk, -4)])
+
+    def test_deltas_are_applied_as_one_update_per_lot(self):
+        first, second = self.lots
+
+        with CaptureQueriesContext(connection) as queries:
+            with stock_unit_of_work():
+                for _ in range(5):
+                    add_stock_delta(RawMaterial, first.pk, -1)
+                add_stock_delta(RawMaterial, second.pk, 3)
+                add_stock_delta(RawMaterial, second.pk, -3)
+                # Nothing is written until the unit of work ends, pending deltas are still counted
+                self.assertEqual(self.get_quantities(), [10, 20])
+                self.assertEqual(get_available_quantity(first), 5)
+
+        updates = [query for query in queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 1)
+        self.assertEqual(self.get_quantities(), [5, 20])
+        self.assertEqual(len(self.get_movements()), 7)
+
+    def test_nested_unit_of_work_hands_its_deltas_to_the_outer_one(self):
+        first, second = self.lots
+
+        with stock_unit_of_work():
+            add_stock_delta(RawMaterial, first.pk, -2)
+            with stock_unit_of_work():
+                add_stock_delta(RawMaterial, first.pk, -3)
+                add_stock_delta(RawMaterial, second.pk, 4)
+            self.assertEqual(self.get_quantities(), [10, 20])
+            self.assertEqual(get_available_quantity(first), 5)
+
+        self.assertEqual(self.get_quantities(), [5, 24])
+        self.assertEqual(self.get_movements(), sorted([(first.pk, -2), (first.pk, -3), (second.pk, 4)]))
+
+    def test_failed_nested_unit_of_work_drops_its_deltas(self):
+        first, second = self.lots
+
+        with stock_unit_of_work():
+            add_stock_delta(RawMaterial, first.pk, -2)
+            with self.assertRaises(ValidationError):
+                with stock_unit_of_work():
+                    add_stock_delta(RawMaterial, second.pk, -5)
+                    raise ValidationError('Failed')
+
+        self.assertEqual(self.get_quantities(), [8, 20])
+        self.assertEqual(self.get_movements(), [(first.pk, -2)])
+
+    def test_failed_unit_of_work_writes_nothing(self):
+        with self.assertRaises(ValidationError):
+            with stock_unit_of_work():
+                add_stock_delta(RawMaterial, self.lots[0].pk, -2)
+                raise ValidationError('Failed')
+
+        self.assertEqual(self.get_quantities(), [10, 20])
+        self.assertEqual(self.get_movements(), [])
+
+    def test_pending_deltas_prevent_over_consumption(self):
+        lot = RawMaterial.objects.get(pk=self.lots[0].pk)
+
+        with self.assertRaises(ValueError):
+            with stock_unit_of_work():
+                lot.reduce_quantity(6)
+                lot.reduce_quantity(6)
+
+        self.assertEqual(self.get_quantities(), [10, 20])
+
+
+class RecordMovementsTests(InventoryTestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.workstation = Workstation.objects.create(name='Workstation', location='Location')
+        cls.worker = WorkerUser.objects.create(username='worker', email='w@example.com')
+        cls.transporter = TransporterUser.objects.create(username='transporter', email='t@example.com')
+
+    def build_consumption(self, lot, quantity):
+        return WorkstationRawMaterialConsumption(
+            workstation=self.workstation, raw_material_id=lot.pk, worker=self.worker, quantity_consumed=quantity,
+            transporter=self.transporter
+        )
+
+    def test_batch_takes_its_total_from_each_lot(self):
+        first, second = self.lots
+
+        with CaptureQueriesContext(connection) as queries:
+            consumptions = record_raw_material_consumptions([
+                self.build_consumption(first, 3), self.build_consumption(second, 5),
+                self.build_consumption(first, 4),
+            ])
+
+        self.assertTrue(all(consumption.pk for consumption in consumptions))
+        self.assertEqual(WorkstationRawMaterialConsumption.objects.count(), 3)
+        self.assertEqual(self.get_quantities(), [3, 15])
+        self.assertEqual(
+            self.get_movements(MovementKind.CONSUMPTION), sorted([(first.pk, -3), (first.pk, -4), (second.pk, -5)])
+        )
+        updates = [query for query in queries if query['sql'].startswith('UPDATE')]
+        self.assertEqual(len(updates), 2)
+
+    def test_changed_rows_apply_their_difference(self):
+        first = self.lots[0]
+        [consumption] = record_raw_material_consumptions([self.build_consumption(first, 3)])
+
+        consumption.quantity_consumed = 5
+        record_raw_material_consumptions([consumption])
+
+        self.assertEqual(self.get_quantities(), [5, 20])
+        self.assertEqual(WorkstationRawMaterialConsumption.objects.get().quantity_consumed, 5)
+
+    def test_batch_over_consuming_a_lot_is_refused_entirely(self):
+        first, second = self.lots
+
+        with self.assertRaisesMessage(ValidationError, f'Only 10 units of {first.pk} available, 12 requested.'):
+            record_raw_material_consumptions([
+                self.build_consumption(second, 5), self.build_consumption(first, 6),
+                self.build_consumption(first, 6),
+            ])
+
+        self.assertFalse(WorkstationRawMaterialConsumption.objects.exists())
+        self.assertEqual(self.get_quantities(), [10, 20])
+        self.assertEqual(self.get_movements(MovementKind.CONSUMPTION), [])
+
+    def test_invalid_rows_are_reported_together(self):
+        first = self.lots[0]
+
+        with self.assertRaises(ValidationError) as context:
+            record_raw_material_consumptions([
+                self.build_consumption(first, 11),
+                WorkstationRawMaterialConsumption(
+                    workstation=self.workstation, raw_material_id='RM-UNKNOWN', worker=self.worker,
+                    quantity_consumed=1, transporter=self.transporter
+                ),
+            ])
+
+        self.assertEqual(len(context.exception.messages), 2)
+        self.assertFalse(WorkstationRawMaterialConsumption.objects.exists())
+
+
+class LedgerTests(InventoryTestCase):
+
+    def get_ledger_quantities(self, as_of=None) -> list:
+        quantities = get_stock_as_of(LotType.RAW_MATERIAL, [lot.pk for lot in self.lots], as_of)
+        return [quantities[lot.pk] for lot in self.lots]
+
+    def get_snapshot_lots(self) -> list:
+        return sorted(StockSnapshot.objects.values_list('lot_id', 'quantity', 'movement_count'))
+
+    def test_ledger_matches_cached_quantities(self):
+        first, second = self.lots
+        before = timezone.now()
+        add_stock_delta(RawMaterial, first.pk, -4)
+        add_stock_delta(RawMaterial, second.pk, 5)
+
+        self.assertEqual(self.get_ledger_quantities(), self.get_quantities())
+        self.assertEqual(self.get_ledger_quantities(before), [10, 20])
+
+    def test_snapshots_and_replay_match_whole_history(self):
+        first, second = self.lots
+        add_stock_delta(RawMaterial, first.pk, -4)
+        take_snapshots(LotType.RAW_MATERIAL)
+        add_stock_delta(RawMaterial, first.pk, -1)
+        add_stock_delta(RawMaterial, second.pk, 2)
+
+        self.assertEqual(self.get_ledger_quantities(), [5, 22])
+        self.assertEqual(self.get_ledger_quantities(), self.get_quantities())
+
+    def test_snapshots_only_lots_moved_since_the_watermark(self):
+        first, second = self.lots
+        taken_at = timezone.now()
+        self.assertEqual(take_snapshots(LotType.RAW_MATERIAL, taken_at), 2)
+        self.assertEqual(take_snapshots(LotType.RAW_MATERIAL, taken_at + timedelta(seconds=1)), 0)
+
+        add_stock_delta(RawMaterial, first.pk, -3)
+        self.assertEqual(take_snapshots(LotType.RAW_MATERIAL), 1)
+
+        self.assertEqual(self.get_snapshot_lots(), sorted([(first.pk, 10, 1), (first.pk, 7, 1), (second.pk, 20, 1)]))
+
+    def test_lots_below_min_movements_are_snapshotted_once_they_reach_it(self):
+        first, second = self.lots
+        add_stock_delta(RawMaterial, first.pk, -1)
+        self.assertEqual(take_snapshots(LotType.RAW_MATERIAL, min_movements=2), 1)
+
+        # The second lot only moved before the watermark, its movements since then still count
+        add_stock_delta(RawMaterial, second.pk, -1)
+        self.assertEqual(take_snapshots(LotType.RAW_MATERIAL, min_movements=2), 1)
+
+        self.assertEqual(self.get_snapshot_lots(), sorted([(first.pk, 9, 2), (second.pk, 19, 2)]))
+
+    def test_rebuild_fixes_drifted_quantities(self):
+        first, second = self.lots
+        add_stock_delta(RawMaterial, first.pk, -4)
+        RawMaterial.objects.filter(pk=first.pk).update(current_quantity=3)
+
+        self.assertEqual(rebuild_quantities(LotType.RAW_MATERIAL, dry_run=True), [(first.pk, 3, 6)])
+        self.assertEqual(self.get_quantities(), [3, 20])
+
+        self.assertEqual(rebuild_quantities(LotType.RAW_MATERIAL, batch_size=1), [(first.pk, 3, 6)])
+        self.assertEqual(self.get_quantities(), [6, 20])
+        self.assertEqual(rebuild_quantities(LotType.RAW_MATERIAL), [])
+
+    def test_backfill_opens_ledger_of_unknown_lots(self):
+        [lot] = RawMaterial.objects.bulk_create([
+            RawMaterial(
+                id='RM-BULK', supplier=self.supplier, material=self.material, inventory_coordinator=self.coordinator,
+                initial_quantity=8, current_quantity=8, storage_location='Storage'
+            )
+        ])
+
+        self.assertEqual(backfill_ledger(LotType.RAW_MATERIAL), 1)
+        self.assertEqual(backfill_ledger(LotType.RAW_MATERIAL), 0)
+        self.assertEqual(get_stock_as_of(LotType.RAW_MATERIAL, [lot.pk]), {lot.pk: 8})
+
+    def test_backfill_opens_ledger_of_lots_moved_before_it(self):
+        [lot] = RawMaterial.objects.bulk_create([
+            RawMaterial(
+                id='RM-BULK', supplier=self.supplier, material=self.material, inventory_coordinator=self.coordinator,
+                initial_quantity=8, current_quantity=8, storage_location='Storage'
+            )
+        ])
+        # Like a write-off of the expiry sweep, recorded while the ledger of the lot was not opened yet
+        add_stock_delta(RawMaterial, lot.pk, -8, MovementKind.WRITE_OFF)
+        self.assertEqual(get_stock_as_of(LotType.RAW_MATERIAL, [lot.pk]), {lot.pk: -8})
+
+        self.assertEqual(backfill_ledger(LotType.RAW_MATERIAL), 1)
+        self.assertEqual(self.get_movements(MovementKind.OPENING), [(lot.pk, 8)])
+        self.assertEqual(get_stock_as_of(LotType.RAW_MATERIAL, [lot.pk]), {lot.pk: 0})
+        self.assertEqual(backfill_ledger(LotType.RAW_MATERIAL), 0)
+        self.assertEqual(rebuild_quantities(LotType.RAW_MATERIAL), [])
+
+    def test_rebuild_refuses_negative_quantities(self):
+        first, second = self.lots
+        RawMaterial.objects.filter(pk=second.pk).update(current_quantity=5)
+        write_movements([get_movement(RawMaterial, first.pk, -25, MovementKind.WRITE_OFF)])
+
+        self.assertEqual(
+            sorted(rebuild_quantities(LotType.RAW_MATERIAL, dry_run=True)),
+            sorted([(first.pk, 10, -15), (second.pk, 5, 20)])
+        )
+        # The whole batch is refused, not only the negative lot
+        with self.assertRaisesMessage(ValidationError, f'The ledger of {first.pk} holds a negative quantity'):
+            rebuild_quantities(LotType.RAW_MATERIAL)
+        self.assertEqual(self.get_quantities(), [10, 5])
+
+
+
+class RecallTestCase(InventoryTestCase):
+    """
+    The flour of a recalled supplier delivered to two restaurants, and the sugar of another supplier delivered to the
+    first one, each consumed by orders at every stage.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.worker = WorkerUser.objects.create(username='worker', email='w@example.com')
+        cls.transporter = TransporterUser.objects.create(username='transporter', email='t@example.com')
+        cls.customer = CustomerUser.objects.create(username='customer', email='cu@example.com')
+        cls.workstation = Workstation.objects.create(name='Workstation', location='Location')
+        cls.restaurant = Restaurant.objects.create(name='Restaurant', location='Location')
+        cls.other_restaurant = Restaurant.objects.create(name='Other restaurant', location='Location')
+
+        cls.other_supplier = Supplier.objects.create(name='Other supplier')
+        cls.other_material = Material.objects.create(category=cls.material.category, material_name='Sugar')
+        cls.other_material.suppliers.add(cls.other_supplier)
+        cls.raw_material = cls.create_raw_material(100)
+        cls.other_raw_material = RawMaterial.objects.create(
+            supplier=cls.other_supplier, material=cls.other_material, inventory_coordinator=cls.coordinator,
+            initial_quantity=100, storage_location='Storage'
+        )
+
+        cls.product = Product.objects.create(name='Bread', selling_price=Decimal('3'))
+        RecipeIngredient.objects.create(product=cls.product, material=cls.material, quantity_consumed=2)
+        cls.other_product = Product.objects.create(name='Candy', selling_price=Decimal('3'))
+        RecipeIngredient.objects.create(product=cls.other_product, material=cls.other_material, quantity_consumed=1)
+
+    @classmethod
+    def deliver(cls, raw_material, restaurant, quantity):
+        """
+        Walk a quantity of a raw material lot through a workstation and packaging down to a restaurant lot.
+        """
+        consumption = WorkstationRawMaterialConsumption.objects.create(
+            workstation=cls.workstation, raw_material=raw_material, worker=cls.worker, quantity_consumed=quantity,
+            transporter=cls.transporter
+        )
+        ready_material = ReadyMaterial.objects.create(
+            workstation_prepared_material=WorkstationPreparedMaterial.objects.create(
+                workstation_raw_material_consumption=consumption, quantity=quantity
+            ),
+            inventory_coordinator=cls.coordinator, initial_quantity=quantity, transporter=cls.transporter
+        )
+        packaged_material = PackagedMaterial.objects.create(ready_material=ready_material, worker=cls.worker,
+                                                            quantity=quantity)
+        return RestaurantPackagedMaterial.objects.create(
+            restaurant=restaurant, material=raw_material.material, package_material=packaged_material,
+            initial_package_quantity=quantity, transporter=cls.transporter
+        )
+
+    def create_order(self, restaurant, product, status, quantity=1):
+        """
+        Create an order and walk it through the lifecycle up to a status, reserving and consuming its ingredients.
+        """
+        order = Order.objects.create(restaurant=restaurant, customer=self.customer)
+        OrderItem.objects.create(order=order, product=product, quantity=quantity)
+        for next_status in (OrderStatus.CONFIRMED, OrderStatus.PREPARING, OrderStatus.READY, OrderStatus.DELIVERED):
+            if order.status == status:
+                break
+            order.status = next_status
+            order.save()
+        return order
+
+
+class RecallImpactTests(RecallTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.lot = self.deliver(self.raw_material, self.restaurant, 30)
+        self.other_restaurant_lot = self.deliver(self.raw_material, self.other_restaurant, 30)
+        self.sugar_lot = self.deliver(self.other_raw_material, self.restaurant, 30)
+
+        self.delivered = self.create_order(self.restaurant, self.product, OrderStatus.DELIVERED)
+        self.preparing = self.create_order(self.restaurant, self.product, OrderStatus.PREPARING, quantity=2)
+        self.confirmed = self.create_order(self.restaurant, self.product, OrderStatus.CONFIRMED, quantity=3)
+        self.other_restaurant_order = self.create_order(self.other_restaurant, self.product, OrderStatus.DELIVERED)
+        self.create_order(self.restaurant, self.other_product, OrderStatus.DELIVERED)
+
+    def test_records_are_grouped_by_level_then_restaurant(self):
+        records = list(iter_recall_impact(supplier_ids=[self.supplier.pk]))
+
+        groups = {
+            self.restaurant.pk: ['restaurant_package_material', 'open_order', 'open_order', 'delivered_order'],
+            self.other_restaurant.pk: ['restaurant_package_material', 'delivered_order'],
+        }
+        self.assertEqual(
+            [(record['restaurant_id'], record['type']) for record in records],
+            # The unused lots of the supplier are recalled as well
+            [(None, 'raw_material')] * 3 + [(None, 'ready_material')] * 2 + [(None, 'packaged_material')] * 2
+            + [(restaurant_id, record_type)
+               for restaurant_id in sorted(groups) for record_type in groups[restaurant_id]]
+        )
+
+        ids = {record['type']: set() for record in records}
+        for record in records:
+            ids[record['type']].add(record['id'])
+        self.assertEqual(ids['raw_material'], {self.raw_material.pk} | {lot.pk for lot in self.lots})
+        self.assertEqual(
+            ids['packaged_material'], {self.lot.package_material_id, self.other_restaurant_lot.package_material_id}
+        )
+        self.assertEqual(ids['restaurant_package_material'], {self.lot.pk, self.other_restaurant_lot.pk})
+        self.assertEqual(ids['open_order'], {self.preparing.pk, self.confirmed.pk})
+        self.assertEqual(ids['delivered_order'], {self.delivered.pk, self.other_restaurant_order.pk})
+
+    def test_orders_report_consumed_and_reserved_quantities(self):
+        orders = {
+            record['id']: record for record in iter_recall_impact(raw_material_ids=[self.raw_material.pk])
+            if record['type'].endswith('_order')
+        }
+
+        self.assertEqual(
+            {order_id: (order['status'], order['quantity_consumed'], order['quantity_reserved'])
+             for order_id, order in orders.items()},
+            {
+                self.delivered.pk: ('Delivered', 2, 0),
+                self.preparing.pk: ('Preparing', 4, 0),
+                self.confirmed.pk: ('Confirmed', 0, 6),
+                self.other_restaurant_order.pk: ('Delivered', 2, 0),
+            }
+        )
+        self.assertEqual(orders[self.delivered.pk]['order_item_ids'],
+                         list(self.delivered.order_items.values_list('pk', flat=True)))
+
+    def test_lots_of_other_suppliers_are_not_recalled(self):
+        records = list(iter_recall_impact(supplier_ids=[self.other_supplier.pk]))
+
+        self.assertIn(self.sugar_lot.pk, {record['id'] for record in records})
+        self.assertNotIn(self.lot.pk, {record['id'] for record in records})
+        self.assertEqual(list(iter_recall_impact(raw_material_ids=['RM-UNKNOWN'])), [])
+
+    def test_queries_do_not_depend_on_affected_records(self):
+        # One query per level of the chain, plus the lineage and reservation lookups
+        with self.assertNumQueries(8):
+            small = list(iter_recall_impact(raw_material_ids=[self.other_raw_material.pk]))
+        for _ in range(3):
+            self.deliver(self.raw_material, self.restaurant, 5)
+        self.create_order(self.other_restaurant, self.product, OrderStatus.CONFIRMED)
+
+        with self.assertNumQueries(8):
+            large = list(iter_recall_impact(supplier_ids=[self.supplier.pk, self.other_supplier.pk]))
+        self.assertGreater(len(large), len(small) * 2)
+
+    def test_command_writes_json_lines(self):
+        output = StringIO()
+        call_command('recall_impact', '--raw-material', self.raw_material.pk, stdout=output)
+
+        records = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual(records[0]['id'], self.raw_material.pk)
+        self.assertEqual(len(records), len(list(iter_recall_impact(raw_material_ids=[self.raw_material.pk]))))
+
+        with self.assertRaisesMessage(CommandError, 'Give at least one --supplier or --raw-material.'):
+            call_command('recall_impact')
+
+class SeedSupplyChainTests(TestCase):
+    options = {
+        'seed': 1, 'restaurants': 2, 'lots': 20, 'orders': 20, 'products': 5, 'suppliers': 3, 'customers': 5,
+        'batch_size': 50, 'processes': 1,
+    }
+
+    def get_restaurants_data(self, exclude=()) -> list:
+        """
+        Get what was seeded for each restaurant, without the ids and dates drawn from the clock.
+        """
+        data = []
+        for restaurant in Restaurant.objects.exclude(pk__in=exclude).order_by('name', 'pk'):
+            lots = sorted(RestaurantPackagedMaterial.objects.filter(restaurant=restaurant).values_list(
+                'material__material_name', 'initial_package_quantity', 'current_package_quantity', 'expiration_date',
+                'package_material__ready_material__workstation_prepared_material__workstation_raw_material_consumption'
+                '__raw_material__supplier__name'
+            ))
+            orders = sorted(
+                (order.status, order.total_amount, sorted(order.order_items.values_list('product__name', 'quantity')))
+                for order in Order.objects.filter(restaurant=restaurant)
+            )
+            data.append((restaurant.name, restaurant.location, lots, orders))
+        return data
+
+    def test_counts_match_written_rows(self):
+        counts = seed_supply_chain(self.options)
+
+        self.assertEqual(counts['restaurant.Restaurant'], 2)
+        self.assertEqual(counts['inventory.RawMaterial'], 40)
+        self.assertEqual(counts['restaurant.RestaurantPackagedMaterial'], 40)
+        self.assertEqual(counts['orders.Order'], 40)
+        for label, count in counts.items():
+            with self.subTest(label=label):
+                self.assertEqual(apps.get_model(label).objects.count(), count)
+        self.assertEqual(Product.objects.count(), 5)
+        self.assertEqual(Supplier.objects.count(), 3)
+
+    def test_same_seed_draws_same_data(self):
+        seed_supply_chain(self.options)
+        first_run = self.get_restaurants_data()
+        shared_counts = [model.objects.count() for model in (User, Supplier, Category, Material, Workstation)]
+
+        output = StringIO()
+        call_command(
+            'seed_supply_chain', '--seed', '1', '--restaurants', '2', '--lots', '20', '--orders', '20',
+            '--products', '5', '--suppliers', '3', '--customers', '5', '--batch-size', '50', stdout=output
+        )
+
+        self.assertIn('Seeded', output.getvalue())
+        # The catalog is reused, the restaurants are seeded again with the same data
+        self.assertEqual([model.objects.count() for model in (User, Supplier, Category, Material, Workstation)],
+                         shared_counts)
+        self.assertTrue(all(lots and orders for _, _, lots, orders in first_run))
+        seeded_ids = list(Restaurant.objects.order_by('created_at').values_list('pk', flat=True))
+        self.assertEqual(self.get_restaurants_data(exclude=seeded_ids[:2]), first_run)
+
+        seed_supply_chain({**self.options, 'seed': 2})
+        self.assertNotEqual(self.get_restaurants_data(exclude=seeded_ids), first_run)
+
+    def test_seeded_lots_open_their_ledger(self):
+        seed_supply_chain(self.options)
+        # Seeded lots expire already, their write-offs must add up with the opening of their ledger
+        self.assertTrue(sum(result.written_off for result in sweep_expired_lots()))
 
-# Create your tests here.
+        for lot_type in LotType.values:
+            self.assertEqual(backfill_ledger(lot_type), 0)
+            self.assertEqual(rebuild_quantities(lot_type, dry_run=True), [])
@@ -4,7 +4,7 @@ from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
 
 from orders.models import Order, OrderItem
-from orders.views import SupplyChainHierarchyAdminView
+from orders.views import SupplyChainHierarchyAdminView, OrderSupplyChainHierarchyAdminView
 
 
 class OrderItemInlineAdmin(admin.StackedInline):
@@ -44,5 +44,27 @@ class OrderItemAdmin(admin.ModelAdmin):
 class OrderAdmin(admin.ModelAdmin):
     list_display = ('customer', 'status', 'created_at', 'updated_at')
     list_filter = ('status', )
-    readonly_fields = ('created_at', 'updated_at')
+    readonly_fields = ('supply_chain_hierarchy', 'created_at', 'updated_at')
     inlines = [OrderItemInlineAdmin]
+
+    def get_urls(self):
+        return [
+            path(
+                "<str:id>/supply_chain_hierarchy/",
+                OrderSupplyChainHierarchyAdminView.as_view(model_admin=self),
+                name=f"order_supply_chain_hierarchy",
+            ),
+            * super().get_urls(),
+        ]
+
+    def supply_chain_hierarchy(self, obj):
+        if obj.pk is None:
+            return '-'
+        url = reverse("admin:order_supply_chain_hierarchy", args=[obj.id])
+        return format_html(
+            '<a href="{}">{}</a>',
+            url,
+            _("View Supply Chain Hierarchy")
+        )
+
+    supply_chain_hierarchy.short_description = _("Supply Chain Hierarchy")
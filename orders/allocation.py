@@ -0,0 +1,228 @@
+from array import array
+from datetime import date
+
+from inventory.enums import AllocationStrategy
+
+
+# Expiration ordinal of the lots that never expire, sorted after every dated lot
+NO_EXPIRATION = date.max.toordinal()
+
+DEFAULT_ALLOCATION_STRATEGY = AllocationStrategy.FEFO
+
+
+class LotSnapshot:
+    """
+    The candidate lots of one material, held in parallel arrays so that allocating thousands of requirements only
+    compares and decrements machine integers. Quantities are drawn in place as they are allocated, along with their
+    running total, and the orders of the strategies not depending on quantities are sorted once per snapshot.
+
+    Example:
+        snapshot = LotSnapshot()
+        snapshot.add(lot.pk, lot.current_package_quantity, lot.expiration_date, lot.created_at)
+        allocations, missing = allocate(snapshot, 12, AllocationStrategy.FEFO)
+    """
+
+    __slots__ = ('ids', 'quantities', 'expirations', 'arrivals', 'orders', 'total')
+
+    def __init__(self):
+        self.ids = []
+        self.quantities = array('q')
+        self.expirations = array('l')
+        self.arrivals = array('d')
+        # Sorted lot indexes and the position of the first one that may hold stock, per static strategy
+        self.orders = {}
+        # Sum of the quantities, kept in step by `add` and `allocate` so a shortage is found without a scan
+        self.total = 0
+
+    def __len__(self):
+        return len(self.ids)
+
+    def add(self, lot_id, quantity: int, expiration_date=None, created_at=None) -> int:
+        """
+        Append a lot and return its index in the arrays.
+        """
+        self.ids.append(lot_id)
+        self.quantities.append(quantity or 0)
+        self.total += quantity or 0
+        self.expirations.append(expiration_date.toordinal() if expiration_date else NO_EXPIRATION)
+        self.arrivals.append(created_at.timestamp() if created_at else 0.0)
+        return len(self.ids) - 1
+
+    def get_total(self) -> int:
+        return self.total
+
+    def iter_sorted(self, strategy: str, key, today: date):
+        """
+        Yield the indexes of the lots holding stock in the order of a static strategy, skipping for good the leading
+        lots drained by previous allocations.
+        """
+        if strategy not in self.orders:
+            self.orders[strategy] = [sorted(range(len(self.ids)), key=lambda index: key(self, index, today)), 0]
+        order = self.orders[strategy]
+
+        indexes, start = order
+        while start < len(indexes) and not self.quantities[indexes[start]]:
+            start += 1
+        order[1] = start
+
+        for index in indexes[start:]:
+            if self.quantities[index]:
+                yield index
+
+
+def get_fifo_key(snapshot, index, today):
+    return snapshot.arrivals[index], index
+
+
+def get_fefo_key(snapshot, index, today):
+    return snapshot.expirations[index], snapshot.arrivals[index], index
+
+
+def get_expiry_risk_key(snapshot, index, today):
+    """
+    Rank first the lots holding the most stock per day left before they expire, i.e. the likeliest to be wasted.
+    Lots that never expire carry no risk and come last.
+    """
+    expiration = snapshot.expirations[index]
+    risk = 0.0
+    if expiration != NO_EXPIRATION:
+        risk = snapshot.quantities[index] / (max(expiration - today.toordinal(), 0) + 1)
+    return -risk, expiration, snapshot.arrivals[index], index
+
+
+def iter_fifo(snapshot, quantity: int, today: date):
+    """
+    Drain the lots in the order they arrived.
+    """
+    return snapshot.iter_sorted(AllocationStrategy.FIFO, get_fifo_key, today)
+
+
+def iter_fefo(snapshot, quantity: int, today: date):
+    """
+    Drain the lots expiring first, then the ones that arrived first, lots without expiration date last.
+    """
+    return snapshot.iter_sorted(AllocationStrategy.FEFO, get_fefo_key, today)
+
+
+def iter_expiry_risk(snapshot, quantity: int, today: date):
+    """
+    Drain the lots in decreasing order of expiry risk, see `get_expiry_risk_key`. The risk of a lot falls as it is
+    drawn from, so the lots are ranked again for every quantity instead of once per snapshot.
+    """
+    return sorted(
+        (index for index, lot_quantity in enumerate(snapshot.quantities) if lot_quantity),
+        key=lambda index: get_expiry_risk_key(snapshot, index, today)
+    )
+
+
+def iter_fewest_lots(snapshot, quantity: int, today: date):
+    """
+    Take the whole quantity from a single lot when one holds enough, the smallest of them so that large lots stay
+    whole, otherwise drain the largest lots first. Keeps the number of lots touched, and of lots left partially
+    consumed, as low as possible.
+    """
+    quantities = snapshot.quantities
+    best_fit = None
+    for index, lot_quantity in enumerate(quantities):
+        if lot_quantity < quantity:
+            continue
+        if lot_quantity == quantity:
+            # An exact fit empties a lot without opening another, the one expiring first is taken
+            if best_fit is None or quantities[best_fit] != quantity or (
+                get_fefo_key(snapshot, index, today) < get_fefo_key(snapshot, best_fit, today)
+            ):
+                best_fit = index
+        elif best_fit is None or lot_quantity < quantities[best_fit]:
+            best_fit = index
+    if best_fit is not None:
+        return [best_fit]
+
+    return sorted(
+        (index for index, lot_quantity in enumerate(quantities) if lot_quantity),
+        key=lambda index: (-quantities[index],) + get_fefo_key(snapshot, index, today)
+    )
+
+
+# Functions yielding the indexes of the lots to draw a quantity from, in order. Can be extended with new strategies
+ALLOCATION_STRATEGIES = {
+    AllocationStrategy.FIFO: iter_fifo,
+    AllocationStrategy.FEFO: iter_fefo,
+    AllocationStrategy.FEWEST_LOTS: iter_fewest_lots,
+    AllocationStrategy.EXPIRY_RISK: iter_expiry_risk,
+}
+
+
+def get_allocation_strategy(restaurant_strategy=None, category_strategy=None) -> str:
+    """
+    Resolve the strategy consuming a material: the one of its category, else the one of the restaurant.
+    """
+    return category_strategy or restaurant_strategy or DEFAULT_ALLOCATION_STRATEGY
+
+
+def allocate(snapshot, quantity: int, strategy: str = DEFAULT_ALLOCATION_STRATEGY, today: date = None) -> tuple:
+    """
+    Draw a quantity from the lots of a snapshot in the order of a strategy.
+
+    The drawn quantities are taken out of the snapshot, so consecutive calls share its stock. Nothing is drawn when
+    the lots do not hold enough, so a shortage never leaves the snapshot half allocated.
+
+    Args:
+        - snapshot: The LotSnapshot of the material.
+        - quantity: The quantity to draw.
+        - strategy: One of the keys of ALLOCATION_STRATEGIES.
+        - today: The date expiry risks are computed from, today by default.
+
+    Returns:
+        - An (allocations, missing) tuple, allocations being a list of (lot index, quantity) tuples and missing the
+          quantity the lots lacked, 0 when the whole quantity was allocated.
+    """
+    if quantity <= 0:
+        return [], 0
+
+    quantities = snapshot.quantities
+    available = snapshot.total
+    if available < quantity:
+        return [], quantity - available
+
+    allocations = []
+    remaining = quantity
+    for index in ALLOCATION_STRATEGIES[strategy](snapshot, quantity, today or date.today()):
+        drawn = min(remaining, quantities[index])
+        quantities[index] -= drawn
+        allocations.append((index, drawn))
+        remaining -= drawn
+        if not remaining:
+            break
+    snapshot.total -= quantity
+    return allocations, 0
+
+
+def allocate_requirements(snapshots: dict, requirements, strategies: dict = None, today: date = None) -> tuple:
+    """
+    Allocate many requirements against the snapshots of their materials, in the given order.
+
+    Args:
+        - snapshots: Mapping of material_id to its LotSnapshot.
+        - requirements: Iterable of (key, material_id, quantity) tuples.
+        - strategies: Mapping of material_id to its strategy, DEFAULT_ALLOCATION_STRATEGY for the missing ones.
+        - today: The date expiry risks are computed from, today by default.
+
+    Returns:
+        - An (allocations, shortages) tuple. Allocations is a list of (key, material_id, lot index, quantity) tuples,
+          shortages a dictionary with material_id as key and the missing quantity as value.
+    """
+    strategies = strategies or {}
+    today = today or date.today()
+    empty = LotSnapshot()
+
+    allocations = []
+    shortages = {}
+    for key, material_id, quantity in requirements:
+        material_allocations, missing = allocate(
+            snapshots.get(material_id, empty), quantity,
+            strategies.get(material_id, DEFAULT_ALLOCATION_STRATEGY), today
+        )
+        allocations.extend((key, material_id, index, drawn) for index, drawn in material_allocations)
+        if missing:
+            shortages[material_id] = shortages.get(material_id, 0) + missing
+    return allocations, shortages
@@ -0,0 +1,153 @@
+from collections import defaultdict
+
+
+def get_products_recipes(product_ids) -> dict:
+    """
+    Get the recipes of many products through the recipe cache, only missing ones are loaded in a single query.
+    Returns a dictionary with product_id as key and a {material_id: quantity} mapping as value.
+    """
+    from restaurant.recipes import get_products_bom
+
+    return get_products_bom(product_ids)
+
+
+def get_required_materials(lines, recipes: dict) -> dict:
+    """
+    Explode order lines into the total quantity required per material.
+
+    Args:
+        - lines: Iterable of (key, product_id, quantity) tuples.
+        - recipes: Mapping returned by `get_products_recipes`.
+
+    Returns:
+        - A dictionary with key as key and a {material_id: required quantity} mapping as value.
+    """
+    required = {}
+    for key, product_id, quantity in lines:
+        line_required = required.setdefault(key, {})
+        for material_id, quantity_consumed in recipes.get(product_id, {}).items():
+            line_required[material_id] = line_required.get(material_id, 0) + quantity_consumed * quantity
+    return required
+
+
+def get_restaurant_stock(restaurant_id, material_ids, order_id=None) -> dict:
+    """
+    Read the available stock of many materials in a restaurant from its stock positions.
+    Quantities reserved by confirmed orders are not available, except to the order holding them.
+    Returns a dictionary with material_id as key and the available quantity as value.
+    """
+    from restaurant.models import RestaurantStockPosition
+
+    if not material_ids:
+        return {}
+
+    return RestaurantStockPosition.objects.get_available_quantities(restaurant_id, material_ids, order_id)
+
+
+def get_material_names(material_ids) -> dict:
+    """
+    Map material ids to their display names in a single query.
+    """
+    from inventory.models import Material
+
+    names = dict(
+        Material.objects.filter(id__in=set(material_ids)).values_list('id', 'material_name')
+    )
+    return {
+        material_id: names.get(material_id) or f"Material ID {material_id}"
+        for material_id in material_ids
+    }
+
+
+def get_shortages(required: dict, stock: dict) -> dict:
+    """
+    Compare the requirements of many lines, summed per material, with the available stock.
+
+    Args:
+        - required: Mapping returned by `get_required_materials`.
+        - stock: Mapping of material_id to the available quantity.
+
+    Returns:
+        - A dictionary with material_id as key and a (required, available) tuple as value, only for short materials.
+    """
+    total_required = defaultdict(int)
+    for line_required in required.values():
+        for material_id, quantity in line_required.items():
+            total_required[material_id] += quantity
+
+    return {
+        material_id: (quantity, stock.get(material_id, 0))
+        for material_id, quantity in total_required.items()
+        if stock.get(material_id, 0) < quantity
+    }
+
+
+def get_shortage_errors(required: dict, shortages: dict, names: dict) -> dict:
+    """
+    Build the error messages of every line using a short material.
+    Returns a dictionary with the line key as key and a list of error messages as value.
+    """
+    errors = {}
+    for key, line_required in required.items():
+        line_errors = [
+            f"{names[material_id]}: Required {shortages[material_id][0]}, Available {shortages[material_id][1]}"
+            for material_id in line_required
+            if material_id in shortages
+        ]
+        if line_errors:
+            errors[key] = line_errors
+    return errors
+
+
+def get_availability_errors(restaurant_id, lines, order_id=None) -> dict:
+    """
+    Check many order lines of one restaurant against its stock at once.
+
+    Requirements are summed per material across all lines before being compared with the stock, so lines
+    sharing a material cannot both count the same quantity. Every line using a short material gets an error
+    reporting the total required by all lines and the quantity available.
+
+    Args:
+        - restaurant_id: The restaurant whose stock is checked.
+        - lines: Iterable of (key, product_id, quantity) tuples.
+        - order_id: The order the lines belong to, its own reservations are counted as available.
+
+    Returns:
+        - A dictionary with key as key and a list of error messages as value, only for failing lines.
+    """
+    lines = list(lines)
+    recipes = get_products_recipes(product_id for _, product_id, _ in lines)
+    required = get_required_materials(lines, recipes)
+
+    material_ids = {material_id for line_required in required.values() for material_id in line_required}
+    stock = get_restaurant_stock(restaurant_id, material_ids, order_id)
+
+    shortages = get_shortages(required, stock)
+    if not shortages:
+        return {}
+
+    return get_shortage_errors(required, shortages, get_material_names(shortages.keys()))
+
+
+def get_order_availability_errors(order) -> list:
+    """
+    Validate every item of an order in a fixed number of queries, whatever the order size.
+    Returns a list of error messages prefixed with the product they belong to.
+    """
+    order_items = list(
+        order.order_items.order_by('created_at').values_list('id', 'product_id', 'product__name', 'quantity')
+    )
+    if not order_items or order.restaurant_id is None:
+        return []
+
+    errors = get_availability_errors(
+        order.restaurant_id,
+        ((item_id, product_id, quantity) for item_id, product_id, _, quantity in order_items),
+        order_id=order.pk
+    )
+
+    return [
+        f"Product '{product_name}' (Qty: {quantity}): {error}"
+        for item_id, _, product_name, quantity in order_items
+        for error in errors.get(item_id, [])
+    ]
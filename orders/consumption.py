@@ -0,0 +1,186 @@
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import Exists, F, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.translation import gettext_lazy as _
+from django.core.validators import ValidationError
+
+from inventory.enums import MovementKind
+from inventory.stock import get_movement, record_ledger_movements
+from orders.allocation import LotSnapshot, allocate_requirements, get_allocation_strategy
+from orders.availability import get_products_recipes, get_required_materials, get_material_names
+
+
+@transaction.atomic
+def consume_ingredients(restaurant_id, lines) -> list:
+    """
+    Consume the ingredients of many order items from the restaurant lots, in the order of the allocation strategy
+    of each material's category, else of the restaurant, see `orders.allocation`.
+
+    The candidate lots of all items are locked with a single query, the allocation is computed in memory,
+    then written back with one `bulk_update` of the lots and one `bulk_create` of the consumption records, whose
+    lineage and ledger movements are recorded right away, see `restaurant.lineage` and `inventory.ledger`.
+
+    Args:
+        - restaurant_id: The restaurant whose lots are consumed.
+        - lines: Iterable of (order_item_id, product_id, quantity) tuples, consumed in the given order.
+
+    Returns:
+        - The created consumption records.
+
+    Raises:
+        - ValidationError: If the lots do not hold enough quantity for all items, nothing is consumed then.
+    """
+    from restaurant.lineage import record_lineage
+    from restaurant.models import (RestaurantPackagedMaterial, RestaurantPackagedMaterialConsumption,
+                                   RestaurantStockPosition)
+
+    lines = list(lines)
+    recipes = get_products_recipes(product_id for _, product_id, _ in lines)
+    required = get_required_materials(lines, recipes)
+
+    material_ids = {material_id for line_required in required.values() for material_id in line_required}
+    if not material_ids:
+        return []
+
+    # Lock every candidate lot at once, along with the strategy consuming its material. Expired lots are skipped
+    # even before the expiry sweep writes them off, see `inventory.expiry`
+    snapshots = defaultdict(LotSnapshot)
+    available_lots = defaultdict(list)
+    strategies = {}
+    for lot in RestaurantPackagedMaterial.objects.select_for_update(of=('self',)).usable().filter(
+        restaurant_id=restaurant_id,
+        material_id__in=material_ids,
+        current_package_quantity__gt=0
+    ).annotate(
+        restaurant_strategy=F('restaurant__allocation_strategy'),
+        category_strategy=F('material__category__allocation_strategy')
+    ).order_by('pk'):
+        snapshots[lot.material_id].add(lot.pk, lot.current_package_quantity, lot.expiration_date, lot.created_at)
+        available_lots[lot.material_id].append(lot)
+        strategies[lot.material_id] = get_allocation_strategy(lot.restaurant_strategy, lot.category_strategy)
+
+    allocations, shortages = allocate_requirements(
+        snapshots,
+        (
+            (order_item_id, material_id, required_quantity)
+            for order_item_id, line_required in required.items()
+            for material_id, required_quantity in line_required.items()
+        ),
+        strategies,
+        timezone.localdate()
+    )
+
+    if shortages:
+        names = get_material_names(shortages.keys())
+        raise ValidationError({
+            'ingredients': _('Insufficient ingredients available: ') + '; '.join(
+                f"{names[material_id]}: Missing {missing}" for material_id, missing in shortages.items()
+            )
+        })
+
+    consumptions = []
+    touched_lots = {}
+    for order_item_id, material_id, index, consumed_quantity in allocations:
+        lot = available_lots[material_id][index]
+        lot.current_package_quantity = snapshots[material_id].quantities[index]
+        touched_lots[lot.pk] = lot
+        consumptions.append(
+            RestaurantPackagedMaterialConsumption(
+                order_item_id=order_item_id,
+                restaurant_package_material=lot,
+                material_id=material_id,
+                quantity_consumed=consumed_quantity,
+            )
+        )
+
+    now = timezone.now()
+    deltas = defaultdict(int)
+    for lot in touched_lots.values():
+        for stock_key, delta in lot.get_stock_deltas().items():
+            deltas[stock_key] += delta
+
+        if lot.current_package_quantity == 0:
+            lot.finished_date = now
+        lot.updated_at = now
+
+    RestaurantPackagedMaterial.objects.bulk_update(
+        touched_lots.values(),
+        ['current_package_quantity', 'finished_date', 'updated_at']
+    )
+    RestaurantStockPosition.objects.apply_deltas(deltas)
+
+    for lot in touched_lots.values():
+        lot.snapshot_tracked_fields()
+
+    consumptions = RestaurantPackagedMaterialConsumption.objects.bulk_create(consumptions)
+    record_lineage(consumptions)
+    record_ledger_movements([
+        get_movement(RestaurantPackagedMaterial, consumption.restaurant_package_material_id,
+                     -consumption.quantity_consumed, MovementKind.CONSUMPTION, consumption.pk)
+        for consumption in consumptions
+    ])
+    return consumptions
+
+
+@transaction.atomic
+def restore_consumptions(consumptions) -> None:
+    """
+    Give the quantities of many consumption records back to their lots, then delete the records.
+
+    All lots are restored by a single UPDATE adding a correlated sum of their consumptions, which also clears
+    their finished date, each record is recorded as a restoration in the ledger by a single INSERT, and the records
+    are removed by a single DELETE filtered with a subquery, so a mass cancellation costs the same number of
+    statements as a single one.
+
+    Lots that expired since, whether the sweep wrote them off or not, are not restored: their stock cannot be
+    consumed anymore, see `ExpiringLotQuerySet`. The records consuming them are deleted all the same.
+
+    Args:
+        - consumptions: Queryset of `RestaurantPackagedMaterialConsumption` to reverse.
+    """
+    from restaurant.models import RestaurantPackagedMaterial, RestaurantStockPosition
+
+    usable_lots = RestaurantPackagedMaterial.objects.usable()
+    rows = list(consumptions.annotate(
+        usable=Exists(usable_lots.filter(pk=OuterRef('restaurant_package_material')))
+    ).values_list(
+        'pk', 'restaurant_package_material_id', 'restaurant_package_material__restaurant_id',
+        'restaurant_package_material__material_id', 'quantity_consumed', 'usable'
+    ))
+    if not rows:
+        return
+
+    deltas = defaultdict(int)
+    movements = []
+    for consumption_id, lot_id, restaurant_id, material_id, quantity, usable in rows:
+        if not usable:
+            continue
+        deltas[restaurant_id, material_id] += quantity
+        movements.append(
+            get_movement(RestaurantPackagedMaterial, lot_id, quantity, MovementKind.RESTORATION, consumption_id)
+        )
+
+    if deltas:
+        restored_quantity = Subquery(
+            consumptions.filter(
+                restaurant_package_material=OuterRef('pk')
+            ).values('restaurant_package_material').annotate(
+                total=Sum('quantity_consumed')
+            ).values('total')
+        )
+
+        # Every restored lot holds a positive quantity again, so none of them is finished anymore
+        usable_lots.filter(
+            pk__in=consumptions.values('restaurant_package_material')
+        ).update(
+            current_package_quantity=Coalesce(F('current_package_quantity'), 0) + restored_quantity,
+            finished_date=None,
+            updated_at=timezone.now()
+        )
+        RestaurantStockPosition.objects.apply_deltas(deltas)
+        record_ledger_movements(movements)
+
+    consumptions.model.objects.filter(pk__in=consumptions.values('pk')).delete()
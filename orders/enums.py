@@ -26,6 +26,12 @@ ORDER_STATUS_AVAILABILITY_CHECK = [
     OrderStatus.PREPARING
 ]
 
+ORDER_STATUS_APPLY_RESERVATION = {
+    OrderStatus.PENDING: [
+        OrderStatus.CONFIRMED
+    ]
+}
+
 ORDER_STATUS_APPLY_CONSUMPTION = {
     OrderStatus.CONFIRMED: [
         OrderStatus.PREPARING,
@@ -0,0 +1,131 @@
+from django.apps import apps
+from django.forms.models import model_to_dict
+
+
+# Levels of the supply chain, from an order down to the supplier of each raw material.
+# Children are either found by a foreign key on the child pointing to the node (`parent_field`), which can fan out
+# and is paginated, or by a foreign key on the node pointing to its only child (`child_field`).
+SUPPLY_CHAIN_LEVELS = {
+    'order': {
+        'model': 'orders.Order',
+        'summary': ('status', 'total_amount', 'order_date'),
+        'children': 'order_item',
+        'parent_field': 'order_id',
+    },
+    'order_item': {
+        'model': 'orders.OrderItem',
+        'summary': ('product_id', 'quantity', 'total_price'),
+        'children': 'consumption',
+        'parent_field': 'order_item_id',
+    },
+    'consumption': {
+        'model': 'restaurant.RestaurantPackagedMaterialConsumption',
+        'summary': ('material_id', 'quantity_consumed', 'consumption_date'),
+        'children': 'restaurant_package_material',
+        'child_field': 'restaurant_package_material_id',
+    },
+    'restaurant_package_material': {
+        'model': 'restaurant.RestaurantPackagedMaterial',
+        'summary': ('restaurant_id', 'material_id', 'current_package_quantity', 'expiration_date'),
+        'children': 'package_material',
+        'child_field': 'package_material_id',
+    },
+    'package_material': {
+        'model': 'inventory.PackagedMaterial',
+        'summary': ('quantity', 'package_date', 'expiration_date'),
+        'children': 'ready_material',
+        'child_field': 'ready_material_id',
+    },
+    'ready_material': {
+        'model': 'inventory.ReadyMaterial',
+        'summary': ('current_quantity', 'delivery_date'),
+        'children': 'workstation_prepared_material',
+        'child_field': 'workstation_prepared_material_id',
+    },
+    'workstation_prepared_material': {
+        'model': 'workstation.WorkstationPreparedMaterial',
+        'summary': ('quantity', 'unit'),
+        'children': 'workstation_raw_material_consumption',
+        'child_field': 'workstation_raw_material_consumption_id',
+    },
+    'workstation_raw_material_consumption': {
+        'model': 'workstation.WorkstationRawMaterialConsumption',
+        'summary': ('workstation_id', 'quantity_consumed', 'unit'),
+        'children': 'raw_material',
+        'child_field': 'raw_material_id',
+    },
+    'raw_material': {
+        'model': 'inventory.RawMaterial',
+        'summary': ('material_id', 'current_quantity', 'expiration_date'),
+        'children': 'supplier',
+        'child_field': 'supplier_id',
+    },
+    'supplier': {
+        'model': 'inventory.Supplier',
+        'summary': ('name',),
+        'children': None,
+    },
+}
+
+
+def get_node_summary(node_type: str, obj) -> dict:
+    """
+    Describe a node of the supply chain by its own columns only, so summarizing many nodes never queries.
+    """
+    level = SUPPLY_CHAIN_LEVELS[node_type]
+    return {
+        'type': node_type,
+        'id': obj.pk,
+        'summary': {field: getattr(obj, field) for field in level['summary']},
+        'updated_at': obj.updated_at,
+        'expandable': level['children'] is not None,
+    }
+
+
+def get_lineage_level(node_type: str, node_id: str, cursor: str = None, limit: int = 50):
+    """
+    Get one level of the supply chain: a node with its details and a page of its children summaries.
+
+    Costs two queries whatever the node, one for the node and one for the page of children, which is keyed on the
+    primary key of the children so that wide fan-outs are paginated without offsets.
+
+    Args:
+        - node_type: One of the keys of SUPPLY_CHAIN_LEVELS.
+        - node_id: The primary key of the node.
+        - cursor: The primary key of the last child of the previous page, if any.
+        - limit: The maximum number of children per page.
+
+    Returns:
+        - A dictionary with `node`, `children` and `next_cursor`, or None if the node does not exist.
+    """
+    level = SUPPLY_CHAIN_LEVELS[node_type]
+    obj = apps.get_model(level['model']).objects.filter(pk=node_id).first()
+    if obj is None:
+        return None
+
+    node = get_node_summary(node_type, obj)
+    node['details'] = model_to_dict(obj)
+
+    children = []
+    next_cursor = None
+    child_type = level['children']
+    if child_type is not None:
+        child_model = apps.get_model(SUPPLY_CHAIN_LEVELS[child_type]['model'])
+
+        if 'parent_field' in level:
+            queryset = child_model.objects.filter(**{level['parent_field']: obj.pk}).order_by('pk')
+            if cursor:
+                queryset = queryset.filter(pk__gt=cursor)
+            children = list(queryset[:limit + 1])
+            if len(children) > limit:
+                children = children[:limit]
+                next_cursor = children[-1].pk
+        else:
+            child_id = getattr(obj, level['child_field'])
+            children = list(child_model.objects.filter(pk=child_id)) if child_id is not None else []
+
+    return {
+        'node': node,
+        'children': [get_node_summary(child_type, child) for child in children],
+        'next_cursor': next_cursor,
+    }
@@ -0,0 +1,260 @@
+from decimal import Decimal, InvalidOperation
+
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from accounts.models import CustomerUser
+from orders.availability import (get_products_recipes, get_required_materials, get_shortages, get_shortage_errors,
+                                 get_material_names)
+from orders.enums import OrderStatus
+from orders.models import Order, OrderItem
+
+
+# Largest values the order item columns can hold
+MAX_QUANTITY = 2 ** 31 - 1
+MAX_PRICE = Decimal('99999999.99')
+
+
+def parse_price(value):
+    """
+    Parse a submitted unit price.
+    Returns the price as a Decimal, or None when it is not a finite, non negative amount with at most two decimals.
+    """
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        return None
+    try:
+        price = Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        return None
+    if not price.is_finite() or price < 0 or price > MAX_PRICE or price != price.quantize(Decimal('0.01')):
+        return None
+    return price
+
+
+def parse_order(payload) -> tuple:
+    """
+    Validate the structure of one submitted order and merge its duplicate product lines.
+
+    Malformed values are reported as errors of the order, never raised, so that one bad order cannot fail the
+    others submitted along with it.
+
+    Args:
+        - payload: Dictionary with `restaurant`, `customer`, `items` and optionally `reference`,
+          `order_date` and `note`. Each item is a dictionary with `product`, `quantity` and optionally
+          `unit_price` and `note`.
+
+    Returns:
+        - A (order, errors) tuple, the order is a normalized dictionary and the lines are keyed by product id.
+    """
+    if not isinstance(payload, dict):
+        return None, ['Order must be an object.']
+
+    errors = []
+    order = {
+        'reference': payload.get('reference'),
+        'restaurant_id': payload.get('restaurant'),
+        'customer_id': payload.get('customer'),
+        'note': payload.get('note'),
+        'order_date': timezone.now(),
+        'lines': {},
+    }
+
+    if not order['restaurant_id'] or not isinstance(order['restaurant_id'], str):
+        errors.append('Restaurant is required and must be an id.')
+    if not order['customer_id'] or not isinstance(order['customer_id'], str):
+        errors.append('Customer is required and must be an id.')
+    if order['note'] is not None and not isinstance(order['note'], str):
+        errors.append('Note must be a string.')
+    if payload.get('order_date'):
+        try:
+            order['order_date'] = parse_datetime(str(payload['order_date']))
+        except ValueError:
+            order['order_date'] = None
+        if order['order_date'] is None:
+            errors.append(f"Invalid order date: {payload['order_date']}.")
+        elif timezone.is_naive(order['order_date']):
+            order['order_date'] = timezone.make_aware(order['order_date'])
+
+    items = payload.get('items')
+    if not isinstance(items, list) or not items:
+        errors.append('At least one item is required.')
+        items = []
+
+    for index, item in enumerate(items):
+        if not isinstance(item, dict) or not item.get('product') or not isinstance(item['product'], str):
+            errors.append(f'Item {index}: product is required and must be an id.')
+            continue
+
+        quantity = item.get('quantity')
+        if isinstance(quantity, bool) or not isinstance(quantity, int) or not 1 <= quantity <= MAX_QUANTITY:
+            errors.append(f'Item {index}: quantity must be a positive integer.')
+            continue
+
+        unit_price = item.get('unit_price')
+        if unit_price is not None:
+            unit_price = parse_price(unit_price)
+            if unit_price is None:
+                errors.append(f'Item {index}: unit price must be a non negative amount with at most two decimals.')
+                continue
+
+        note = item.get('note')
+        if note is not None and not isinstance(note, str):
+            errors.append(f'Item {index}: note must be a string.')
+            continue
+
+        # Merge duplicate product lines, an order can only hold a product once
+        line = order['lines'].setdefault(item['product'], {'quantity': 0, 'unit_price': unit_price, 'notes': []})
+        line['quantity'] += quantity
+        if line['quantity'] > MAX_QUANTITY:
+            errors.append(f'Item {index}: quantity must be a positive integer.')
+        if note:
+            line['notes'].append(note)
+
+    return order, errors
+
+
+def ingest_orders(payloads) -> list:
+    """
+    Validate and insert many orders at once, bypassing the per-object save pipeline.
+
+    References are resolved with one query per model, availability is checked for every order with one query
+    for all recipes and one for all stock positions, then the accepted orders and their items are written with
+    two `bulk_create`. Every order is checked on its own against the stock not reserved by confirmed orders, as
+    pending orders neither reserve nor consume ingredients.
+
+    Args:
+        - payloads: List of orders as accepted by `parse_order`.
+
+    Returns:
+        - A list with one result per submitted order, in the same order, holding `index`, `reference`,
+          `accepted`, `order_id` and `errors`.
+    """
+    from restaurant.models import Restaurant, Product, RestaurantStockPosition
+
+    parsed = [parse_order(payload) for payload in payloads]
+    results = [
+        {
+            'index': index,
+            'reference': order['reference'] if order else None,
+            'accepted': False,
+            'order_id': None,
+            'errors': errors,
+        }
+        for index, (order, errors) in enumerate(parsed)
+    ]
+    candidates = [(result, order) for result, (order, errors) in zip(results, parsed) if not errors]
+
+    restaurant_ids = set(
+        Restaurant.objects.filter(
+            id__in={order['restaurant_id'] for _, order in candidates}
+        ).values_list('id', flat=True)
+    )
+    customer_ids = set(
+        CustomerUser.objects.filter(
+            id__in={order['customer_id'] for _, order in candidates}
+        ).values_list('id', flat=True)
+    )
+    products = Product.objects.in_bulk({product_id for _, order in candidates for product_id in order['lines']})
+
+    for result, order in candidates:
+        if order['restaurant_id'] not in restaurant_ids:
+            result['errors'].append(f"Unknown restaurant: {order['restaurant_id']}.")
+        if order['customer_id'] not in customer_ids:
+            result['errors'].append(f"Unknown customer: {order['customer_id']}.")
+        result['errors'].extend(
+            f'Unknown product: {product_id}.' for product_id in order['lines'] if product_id not in products
+        )
+    candidates = [(result, order) for result, order in candidates if not result['errors']]
+
+    # Explode every order in one pass, then read the stock of all restaurants at once
+    recipes = get_products_recipes(products.keys())
+    requirements = [
+        get_required_materials(
+            ((product_id, product_id, line['quantity']) for product_id, line in order['lines'].items()),
+            recipes
+        )
+        for _, order in candidates
+    ]
+    stock_keys = {
+        (order['restaurant_id'], material_id)
+        for (_, order), required in zip(candidates, requirements)
+        for line_required in required.values()
+        for material_id in line_required
+    }
+    stock = {}
+    if stock_keys:
+        for restaurant_id, material_id, quantity in RestaurantStockPosition.objects.with_available().filter(
+            restaurant_id__in={restaurant_id for restaurant_id, _ in stock_keys},
+            material_id__in={material_id for _, material_id in stock_keys}
+        ).values_list('restaurant_id', 'material_id', 'available'):
+            stock.setdefault(restaurant_id, {})[material_id] = quantity
+
+    shortages = [
+        get_shortages(required, stock.get(order['restaurant_id'], {}))
+        for (_, order), required in zip(candidates, requirements)
+    ]
+    names = get_material_names({material_id for shortage in shortages for material_id in shortage})
+
+    accepted = []
+    for (result, order), required, shortage in zip(candidates, requirements, shortages):
+        if shortage:
+            result['errors'].extend(
+                f"Product '{products[product_id].name}' (Qty: {order['lines'][product_id]['quantity']}): {error}"
+                for product_id, line_errors in get_shortage_errors(required, shortage, names).items()
+                for error in line_errors
+            )
+            continue
+
+        for product_id, line in order['lines'].items():
+            if line['unit_price'] is None:
+                line['unit_price'] = products[product_id].selling_price
+            line['total_price'] = line['unit_price'] * line['quantity']
+        order['total_amount'] = sum((line['total_price'] for line in order['lines'].values()), Decimal('0'))
+        if order['total_amount'] > MAX_PRICE:
+            result['errors'].append(f'The order total exceeds {MAX_PRICE}.')
+        else:
+            accepted.append((result, order))
+
+    if not accepted:
+        return results
+
+    order_ids = Order._meta.pk.generate_ids(len(accepted))
+    item_ids = OrderItem._meta.pk.generate_ids(sum(len(order['lines']) for _, order in accepted))
+    item_ids.reverse()
+
+    orders = []
+    order_items = []
+    for order_id, (result, order) in zip(order_ids, accepted):
+        for product_id, line in order['lines'].items():
+            order_items.append(
+                OrderItem(
+                    id=item_ids.pop(),
+                    order_id=order_id,
+                    product_id=product_id,
+                    quantity=line['quantity'],
+                    unit_price=line['unit_price'],
+                    total_price=line['total_price'],
+                    note='\n'.join(line['notes']) or None,
+                )
+            )
+
+        orders.append(
+            Order(
+                id=order_id,
+                restaurant_id=order['restaurant_id'],
+                customer_id=order['customer_id'],
+                status=OrderStatus.PENDING,
+                total_amount=order['total_amount'],
+                order_date=order['order_date'],
+                note=order['note'],
+            )
+        )
+        result['accepted'] = True
+        result['order_id'] = order_id
+
+    with transaction.atomic():
+        Order.objects.bulk_create(orders)
+        OrderItem.objects.bulk_create(order_items)
+
+    return results
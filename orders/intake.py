@@ -0,0 +1,185 @@
+import asyncio
+import logging
+import uuid
+from collections import OrderedDict
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections, transaction
+
+from orders.ingestion import ingest_orders
+
+
+logger = logging.getLogger(__name__)
+
+
+def ingest_batch(payloads) -> list:
+    """
+    Ingest one micro-batch of orders in a single transaction.
+    """
+    close_old_connections()
+    try:
+        with transaction.atomic():
+            return ingest_orders(payloads)
+    finally:
+        close_old_connections()
+
+
+class OrderIntakeQueue:
+    """
+    Bounded in-memory queue of order submissions, drained by worker coroutines in micro-batches.
+
+    Each submission is a list of orders and gets a ticket. Workers wait for a first submission, then keep
+    collecting more until the batch holds `batch_size` orders or `batch_wait` seconds have passed, and write
+    the whole batch through `ingest_orders` in one transaction. The results of the latest `max_results`
+    tickets are kept for lookup.
+
+    The queue is bounded by the number of orders waiting or being ingested, `maxsize`, whatever the number of
+    submissions holding them, so it must be at least the largest submission accepted.
+
+    The queue and its workers live on the event loop of the process, so it must be served by the ASGI
+    application, see `core.asgi`. When the loop is replaced, e.g. by a server reload, the submissions still
+    waiting are moved to the queue of the new loop, and those the stopped workers were holding are failed.
+    """
+
+    def __init__(self, maxsize: int, workers: int, batch_size: int, batch_wait: float, max_results: int = 10000):
+        self.maxsize = maxsize
+        self.workers = workers
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.max_results = max_results
+        self.loop = None
+        self.queue = None
+        self.tasks = []
+        self.pending = {}
+        self.queued_orders = 0
+        self.results = OrderedDict()
+
+    def start(self) -> None:
+        """
+        Create the queue and its workers on the running event loop, once per loop.
+
+        The submissions waiting in the queue of a previous loop are moved to the new one. When the previous loop
+        is not running anymore, the submissions its workers had taken are lost, so their tickets are failed
+        rather than left queued forever.
+        """
+        loop = asyncio.get_running_loop()
+        if self.loop is loop:
+            return
+        previous_loop, previous_queue = self.loop, self.queue
+        self.loop = loop
+        self.queue = asyncio.Queue()
+        self.tasks = [loop.create_task(self.work(self.queue)) for _ in range(self.workers)]
+        if previous_queue is None:
+            return
+
+        waiting = set()
+        while not previous_queue.empty():
+            ticket, payloads = previous_queue.get_nowait()
+            self.queue.put_nowait((ticket, payloads))
+            waiting.add(ticket)
+
+        if previous_loop.is_closed() or not previous_loop.is_running():
+            lost = [(ticket, payloads) for ticket, payloads in self.pending.items() if ticket not in waiting]
+            if lost:
+                logger.error('Lost %d submissions of a replaced event loop', len(lost))
+            for ticket, payloads in lost:
+                self.store_results(ticket, self.get_error_results(payloads))
+                self.queued_orders -= len(payloads)
+
+    def submit(self, payloads: list):
+        """
+        Queue a submission without waiting.
+        Returns its ticket, or None when the queue is full and the caller should retry later.
+        """
+        self.start()
+        if self.queued_orders + len(payloads) > self.maxsize:
+            return None
+        ticket = uuid.uuid4().hex
+        self.queue.put_nowait((ticket, payloads))
+        self.queued_orders += len(payloads)
+        self.pending[ticket] = payloads
+        return ticket
+
+    def get_status(self, ticket: str):
+        """
+        Get the state of a ticket, `queued` or `done` with its results, None for unknown tickets.
+        """
+        if ticket in self.pending:
+            return {'ticket': ticket, 'status': 'queued'}
+        if ticket in self.results:
+            return {'ticket': ticket, 'status': 'done', 'results': self.results[ticket]}
+        return None
+
+    async def collect_batch(self, queue: asyncio.Queue) -> list:
+        batch = [await queue.get()]
+        size = len(batch[0][1])
+        deadline = self.loop.time() + self.batch_wait
+
+        while size < self.batch_size:
+            timeout = deadline - self.loop.time()
+            if timeout <= 0:
+                break
+            try:
+                submission = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                break
+            batch.append(submission)
+            size += len(submission[1])
+
+        return batch
+
+    async def ingest(self, batch: list) -> list:
+        """
+        Ingest a micro-batch in one transaction. When it fails, each of its submissions is ingested again in its
+        own transaction, so a bad submission only fails its own ticket and not the orders of other clients.
+        Returns the results of every submission, in order.
+        """
+        try:
+            results = await sync_to_async(ingest_batch)(
+                [payload for _, submission in batch for payload in submission]
+            )
+        except Exception:
+            if len(batch) == 1:
+                logger.exception('Failed to ingest a submission of %d orders', len(batch[0][1]))
+                return [self.get_error_results(batch[0][1])]
+            return [(await self.ingest([submission]))[0] for submission in batch]
+
+        offset = 0
+        submission_results = []
+        for _, submission in batch:
+            submission_results.append(results[offset:offset + len(submission)])
+            offset += len(submission)
+        return submission_results
+
+    @staticmethod
+    def get_error_results(payloads) -> list:
+        return [
+            {'accepted': False, 'order_id': None, 'errors': ['Internal error, please submit again.']}
+            for _ in payloads
+        ]
+
+    async def work(self, queue: asyncio.Queue) -> None:
+        while True:
+            batch = await self.collect_batch(queue)
+            for (ticket, submission), results in zip(batch, await self.ingest(batch)):
+                if ticket in self.pending:
+                    self.store_results(ticket, results)
+                    self.queued_orders -= len(submission)
+                queue.task_done()
+
+    def store_results(self, ticket: str, results: list) -> None:
+        for index, result in enumerate(results):
+            result['index'] = index
+        self.pending.pop(ticket, None)
+        self.results[ticket] = results
+        while len(self.results) > self.max_results:
+            self.results.popitem(last=False)
+
+
+intake_queue = OrderIntakeQueue(
+    maxsize=getattr(settings, 'ORDER_INTAKE_QUEUE_SIZE', 1000),
+    workers=getattr(settings, 'ORDER_INTAKE_WORKERS', 2),
+    batch_size=getattr(settings, 'ORDER_INTAKE_BATCH_SIZE', 100),
+    batch_wait=getattr(settings, 'ORDER_INTAKE_BATCH_WAIT', 0.05),
+)
@@ -0,0 +1,91 @@
+import random
+
+from django.db import transaction
+from django.core.management.base import BaseCommand
+
+from accounts.models import CustomerUser, TransporterUser
+from core.benchmarks import benchmark_database, measure
+from inventory.models import Category, Material
+from orders.ingestion import ingest_orders
+from orders.models import Order, OrderItem
+from restaurant.models import Restaurant, RestaurantPackagedMaterial, Product, RecipeIngredient
+
+
+class Command(BaseCommand):
+    help = ('Compare the throughput of the bulk order ingestion with the per-object save path, '
+            'on a throwaway database.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=200, help='Number of orders per run.')
+        parser.add_argument('--items', type=int, default=5, help='Number of items per order.')
+        parser.add_argument('--products', type=int, default=50, help='Number of products in the menu.')
+        parser.add_argument('--materials', type=int, default=30, help='Number of materials in stock.')
+        parser.add_argument('--seed', type=int, default=0, help='Seed of the random generator.')
+
+    def handle(self, *args, **options):
+        rng = random.Random(options['seed'])
+
+        with benchmark_database():
+            restaurant, customer, products = self.build_fixture(rng, options)
+            payloads = [
+                {
+                    'reference': f'benchmark-{index}',
+                    'restaurant': restaurant.id,
+                    'customer': customer.id,
+                    'items': [
+                        {'product': product.id, 'quantity': rng.randint(1, 3)}
+                        for product in rng.sample(products, min(options['items'], len(products)))
+                    ],
+                }
+                for index in range(options['orders'])
+            ]
+
+            per_object = measure(self.create_orders_one_by_one, payloads)
+            bulk = measure(ingest_orders, payloads)
+
+        rejected = sum(not result['accepted'] for result in bulk['result'])
+        if rejected:
+            self.stderr.write(self.style.WARNING(f'{rejected} orders were rejected by the bulk ingestion.'))
+
+        self.stdout.write(f"{'path':<12}{'seconds':>10}{'orders/s':>12}{'queries':>10}")
+        for name, run in (('per-object', per_object), ('bulk', bulk)):
+            self.stdout.write(
+                f"{name:<12}{run['seconds']:>10.3f}{options['orders'] / run['seconds']:>12.1f}{run['queries']:>10}"
+            )
+        self.stdout.write(self.style.SUCCESS(f"Speedup: {per_object['seconds'] / bulk['seconds']:.1f}x"))
+
+    @staticmethod
+    def build_fixture(rng, options):
+        category = Category.objects.create(name='Benchmark')
+        materials = Material.objects.bulk_create([
+            Material(category=category, material_name=f'Benchmark material {index}')
+            for index in range(options['materials'])
+        ])
+        restaurant = Restaurant.objects.create(name='Benchmark', location='Benchmark')
+        transporter = TransporterUser.objects.create(username='benchmark-transporter', email='t@example.com')
+        customer = CustomerUser.objects.create(username='benchmark-customer', email='c@example.com')
+
+        for material in materials:
+            RestaurantPackagedMaterial.objects.create(
+                restaurant=restaurant, material=material, initial_package_quantity=10 ** 9,
+                transporter=transporter
+            )
+
+        products = Product.objects.bulk_create([
+            Product(name=f'Benchmark product {index}', selling_price=rng.randint(5, 50))
+            for index in range(options['products'])
+        ])
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(product=product, material=material, quantity_consumed=rng.randint(1, 5))
+            for product in products
+            for material in rng.sample(materials, min(3, len(materials)))
+        ])
+        return restaurant, customer, products
+
+    @staticmethod
+    def create_orders_one_by_one(payloads):
+        for payload in payloads:
+            with transaction.atomic():
+                order = Order.objects.create(restaurant_id=payload['restaurant'], customer_id=payload['customer'])
+                for item in payload['items']:
+                    OrderItem.objects.create(order=order, product_id=item['product'], quantity=item['quantity'])
@@ -0,0 +1,25 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from orders.reservations import sweep_reservations
+
+
+class Command(BaseCommand):
+    help = 'Release the expired stock reservations and those of orders that are not confirmed anymore.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=None,
+            help='Keep sweeping every given number of seconds instead of sweeping once.'
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+
+        while True:
+            count = sweep_reservations()
+            self.stdout.write(self.style.SUCCESS(f'Released {count} stock reservations.'))
+            if interval is None:
+                break
+            time.sleep(interval)
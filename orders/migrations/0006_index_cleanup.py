@@ -0,0 +1,43 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:22
+
+import accounts.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0005_alter_orderitem_unique_together'),
+        ('restaurant', '0008_materiallineage'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='order',
+            name='ord_id_index',
+        ),
+        migrations.RemoveIndex(
+            model_name='orderitem',
+            name='ord_itm_id_index',
+        ),
+        migrations.AlterField(
+            model_name='order',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=54, primary_key=True, serialize=False, verbose_name='Order ID'),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=58, primary_key=True, serialize=False, verbose_name='Order Item ID'),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='order',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='order_items', to='orders.order', verbose_name='Order'),
+        ),
+        migrations.AddIndex(
+            model_name='orderitem',
+            index=models.Index(fields=['order', 'created_at'], name='ord_itm_order_created_index'),
+        ),
+    ]
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:25
+
+import accounts.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('orders', '0006_index_cleanup'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='order',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=56, primary_key=True, serialize=False, verbose_name='Order ID'),
+        ),
+        migrations.AlterField(
+            model_name='orderitem',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=60, primary_key=True, serialize=False, verbose_name='Order Item ID'),
+        ),
+    ]
@@ -1,17 +1,20 @@
-from django.db import models
-from django.db import transaction
+from django.db import models, transaction
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 from django.core.validators import ValidationError, MinValueValidator
 
 from accounts.fields import PrefixedIDField
+from accounts.mixins import FieldTrackerMixin
 from accounts.models import CustomerUser
+from orders.availability import get_availability_errors, get_order_availability_errors
+from orders.consumption import consume_ingredients, restore_consumptions
 from orders.enums import (OrderStatus, ORDER_STATUS_SEQUENCE, ORDER_STATUS_APPLY_CONSUMPTION,
                           ORDER_STATUS_AVAILABILITY_CHECK, ORDER_STATUS_APPLY_RESTORATION,
-                          ORDER_STATUS_DENY_ITEMS_MODIFICATION)
+                          ORDER_STATUS_DENY_ITEMS_MODIFICATION, ORDER_STATUS_APPLY_RESERVATION)
+from orders.reservations import reserve_stock, release_reservations
 
 
-class Order(models.Model):
+class Order(FieldTrackerMixin, models.Model):
     id = PrefixedIDField(prefix='ORD', verbose_name=_('Order ID'))
     restaurant = models.ForeignKey('restaurant.Restaurant', on_delete=models.CASCADE, null=True,
                                    related_name='orders', verbose_name=_('Restaurant'))
@@ -27,20 +30,17 @@ class Order(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Created At'))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Updated At'))
 
+    tracked_fields = ('status',)
+
     class Meta:
         verbose_name = _('Order')
         verbose_name_plural = _('Orders')
-        indexes = [
-            models.Index(fields=['id'], name='ord_id_index')
-        ]
 
     def clean(self):
         # Check if this is an existing instance to validate status transitions
-        try:
-            old_instance = Order.objects.get(pk=self.pk)
-            old_status = old_instance.status
-        except Order.DoesNotExist:  # New instance, no validation needed
+        if self._state.adding:  # New instance, no validation needed
             return
+        old_status = self.old_value('status')
 
          # Check if status transition is valid
         if not self.is_valid_status_transition(old_status, self.status):
@@ -62,85 +62,60 @@ class Order(models.Model):
 
     def save(self, *args, **kwargs):
         self.clean()
-        super().save(*args, **kwargs)
+        if not self._state.adding and kwargs.get('update_fields') is None and not kwargs.get('force_insert'):
+            # The total is recomputed in the database whenever an item changes, see `orders.totals`, the value
+            # loaded with the order may be stale and must not overwrite it
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name != 'total_amount'
+            ]
+        # Reservation, consumption and restoration run in post_save, they must commit along with the status
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def validate_ingredient_availability(self):
         """
         Validate that all ingredients required for the order are available in sufficient quantities.
         """
-        errors = []
-
-        for order_item in self.order_items.all():
-            ingredient_errors = order_item.validate_ingredient_availability()
-            if ingredient_errors:
-                errors.extend([
-                    f"Product '{order_item.product.name}' (Qty: {order_item.quantity}): {error}"
-                    for error in ingredient_errors
-                ])
+        errors = get_order_availability_errors(self)
 
         if errors:
             raise ValidationError({
                 'ingredients': _('Insufficient ingredients available: ') + '; '.join(errors)
             })
 
-    @transaction.atomic
+    def reserve_order_ingredients(self):
+        """
+        Reserve ingredients for all items in an order, so other orders cannot use them
+        """
+        reserve_stock(self)
+
+    def release_order_reservations(self):
+        """
+        Release the ingredients reserved for an order
+        """
+        release_reservations(self.stock_reservations.all())
+
     def consume_order_ingredients(self):
         """
-        Consume ingredients for all items in an order
+        Consume ingredients for all items in an order, the consumed quantities are not reserved anymore
         """
-        for order_item in self.order_items.all():
-            order_item.consume_ingredients()
+        consume_ingredients(
+            self.restaurant_id,
+            self.order_items.order_by('created_at').values_list('id', 'product_id', 'quantity')
+        )
+        self.release_order_reservations()
 
-    @transaction.atomic
     def restore_order_ingredients(self):
         """
-        Restore ingredients by reversing consumption records for an order
+        Restore ingredients by reversing consumption records and reservations for an order
         """
         from restaurant.models import RestaurantPackagedMaterialConsumption
 
-        # Get all consumption records for this order
-        consumption_records = RestaurantPackagedMaterialConsumption.objects.filter(
-            order_item__order=self
-        ).select_related('restaurant_package_material')
-
-        # Group by restaurant package material to batch updates
-        material_updates = {}
-
-        for consumption in consumption_records:
-            rpm = consumption.restaurant_package_material
-            if rpm.id not in material_updates:
-                material_updates[rpm.id] = {
-                    'material': rpm,
-                    'total_to_restore': 0,
-                    'consumption_ids': []
-                }
-
-            material_updates[rpm.id]['total_to_restore'] += consumption.quantity_consumed
-            material_updates[rpm.id]['consumption_ids'].append(consumption.id)
-
-        # Update material quantities and delete consumption records
-        for update_data in material_updates.values():
-            rpm = update_data['material']
-            restore_qty = update_data['total_to_restore']
-
-            # Restore the quantity
-            current_qty = rpm.current_package_quantity or 0
-            rpm.current_package_quantity = current_qty + restore_qty
-
-            # If material was marked as finished, unmark it
-            if rpm.finished_date and rpm.current_package_quantity > 0:
-                rpm.finished_date = None
-
-            rpm.save()
-
-        # Delete all consumption records for this order
-        RestaurantPackagedMaterialConsumption.objects.filter(
-            id__in=[
-                consumption_id
-                for update_data in material_updates.values()
-                for consumption_id in update_data['consumption_ids']
-            ]
-        ).delete()
+        restore_consumptions(
+            RestaurantPackagedMaterialConsumption.objects.filter(order_item__order=self)
+        )
+        self.release_order_reservations()
 
     @staticmethod
     def is_valid_status_transition(from_status: ORDER_STATUS_SEQUENCE, to_status: OrderStatus) -> bool:
@@ -162,6 +137,13 @@ class Order(models.Model):
         """
         return status in ORDER_STATUS_AVAILABILITY_CHECK
 
+    @staticmethod
+    def is_valid_status_reservation(from_status: ORDER_STATUS_SEQUENCE, to_status: OrderStatus) -> bool:
+        """
+        Check if a status change reserves ingredients according to ORDER_STATUS_APPLY_RESERVATION.
+        """
+        return to_status in ORDER_STATUS_APPLY_RESERVATION.get(from_status, [])
+
     @staticmethod
     def is_valid_status_consumption(from_status: ORDER_STATUS_SEQUENCE, to_status: OrderStatus) -> bool:
         return to_status in ORDER_STATUS_APPLY_CONSUMPTION.get(from_status, [])
@@ -176,7 +158,8 @@ class Order(models.Model):
 
 class OrderItem(models.Model):
     id = PrefixedIDField(prefix='ORD-ITM', verbose_name=_('Order Item ID'))
-    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='order_items', verbose_name=_('Order'))
+    order = models.ForeignKey(Order, on_delete=models.CASCADE, related_name='order_items', db_index=False,
+                              verbose_name=_('Order'))
     product = models.ForeignKey('restaurant.Product', on_delete=models.CASCADE, related_name='order_items',
                                 verbose_name=_('product'))
     quantity = models.IntegerField(validators=[MinValueValidator(1)], verbose_name=_('Quantity'))
@@ -193,7 +176,7 @@ class OrderItem(models.Model):
         verbose_name_plural = _('Order Items')
         unique_together = ('order', 'product')
         indexes = [
-            models.Index(fields=['id'], name='ord_itm_id_index')
+            models.Index(fields=['order', 'created_at'], name='ord_itm_order_created_index')
         ]
 
     def clean(self):
@@ -224,113 +207,44 @@ class OrderItem(models.Model):
         Calculate the total quantity of each ingredient required for this order item.
         Returns a dictionary with material_id as key and required quantity as value.
         """
-        from restaurant.models import RecipeIngredient
-
-        required_ingredients = {}
-
-        # Get all recipe ingredients for this product
-        recipe_ingredients = RecipeIngredient.objects.filter(product=self.product)
-
-        for ingredient in recipe_ingredients:
-            material_id = ingredient.material_id
-            required_quantity = ingredient.quantity_consumed * self.quantity
+        from restaurant.recipes import get_product_bom
 
-            if material_id in required_ingredients:
-                required_ingredients[material_id] += required_quantity
-            else:
-                required_ingredients[material_id] = required_quantity
-
-        return required_ingredients
+        return {
+            material_id: quantity_consumed * self.quantity
+            for material_id, quantity_consumed in get_product_bom(self.product_id).items()
+        }
 
     def get_available_material_quantity(self, material_id):
         """
         Get the total available quantity for a specific material in the restaurant.
-        This includes all non-expired materials minus any reserved quantities.
+        This is read from the restaurant stock position, which is kept in sync with its lots, less the quantity
+        reserved by other orders.
         """
-        from restaurant.models import RestaurantPackagedMaterial
-
-        # Get all restaurant packaged materials for this material that are not expired
-        restaurant_materials = RestaurantPackagedMaterial.objects.filter(
-            restaurant__id=self.order.restaurant.id,
-            material__id=material_id,
-            current_package_quantity__gt=0
-        )
+        from restaurant.models import RestaurantStockPosition
 
-        # Calculate total available quantity
-        total_available = sum(
-            rpm.current_package_quantity
-            for rpm in restaurant_materials
+        quantities = RestaurantStockPosition.objects.get_available_quantities(
+            self.order.restaurant_id, [material_id], self.order_id
         )
-
-        return total_available
+        return quantities.get(material_id, 0)
 
     def validate_ingredient_availability(self):
         """
         Validate that all ingredients for this order item are available in sufficient quantities.
         Returns a list of error messages if validation fails.
         """
-        from inventory.models import Material
-
-        errors = []
-        required_ingredients = self.get_required_ingredients()
-
-        if not required_ingredients:
-            return errors  # No ingredients required
-
-        for material_id, required_quantity in required_ingredients.items():
-            available_quantity = self.get_available_material_quantity(material_id)
-
-            if available_quantity < required_quantity:
-                try:
-                    material = Material.objects.get(id=material_id)
-                    material_name = material.material_name
-                except Material.DoesNotExist:
-                    material_name = f"Material ID {material_id}"
-
-                errors.append(
-                    f"{material_name}: Required {required_quantity}, Available {available_quantity}"
-                )
-
-        return errors
+        errors = get_availability_errors(
+            self.order.restaurant_id,
+            [(self.pk, self.product_id, self.quantity)],
+            order_id=self.order_id
+        )
+        return errors.get(self.pk, [])
 
-    @transaction.atomic
     def consume_ingredients(self):
         """
         Consume the ingredients required for this order item.
         This should be called when the order is being prepared.
         """
-        from restaurant.models import RestaurantPackagedMaterial, RestaurantPackagedMaterialConsumption
-
-        required_ingredients = self.get_required_ingredients()
-
-        for material_id, required_quantity in required_ingredients.items():
-            remaining_to_consume = required_quantity
-
-            # Get available materials sorted by expiration date (FIFO)
-            available_materials = RestaurantPackagedMaterial.objects.filter(
-                restaurant__id=self.order.restaurant.id,
-                material__id=material_id,
-                current_package_quantity__gt=0
-            ).order_by('expiration_date', 'created_at')
-
-            for material in available_materials:
-                if remaining_to_consume <= 0:
-                    break
-
-                consumed_quantity = remaining_to_consume
-                try:
-                    material.reduce_current_package_quantity(quantity=consumed_quantity)
-                except ValidationError:
-                    consumed_quantity = material.current_package_quantity
-                    material.reduce_current_package_quantity(quantity=consumed_quantity)
-                finally:
-                    remaining_to_consume -= consumed_quantity
-                    RestaurantPackagedMaterialConsumption.objects.create(
-                        order_item=self,
-                        restaurant_package_material=material,
-                        material=material.material,
-                        quantity_consumed=consumed_quantity,
-                    )
+        consume_ingredients(self.order.restaurant_id, [(self.pk, self.product_id, self.quantity)])
 
     @staticmethod
     def is_valid_items_modification(order_status: OrderStatus) -> bool:
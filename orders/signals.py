@@ -1,23 +1,8 @@
 from django.dispatch import receiver
-from django.db import transaction
-from django.db.models.signals import pre_save, post_save
+from django.db.models.signals import post_save, post_delete, pre_delete
 
 from orders.models import Order, OrderItem
-
-
-@receiver(pre_save, sender=Order)
-def store_old_order_status(sender, instance, **kwargs):
-    """
-    Store the old status before saving.
-    """
-    if instance.pk:
-        try:
-            old_instance = Order.objects.get(pk=instance.pk)
-            instance._old_status = old_instance.status
-        except Order.DoesNotExist:
-            instance._old_status = None
-    else:
-        instance._old_status = None
+from orders.totals import schedule_order_total_update
 
 
 @receiver(post_save, sender=Order)
@@ -25,8 +10,12 @@ def handle_ingredient_consumption(sender, instance, created, **kwargs):
     """
     Handle ingredient consumption/restoration after successful save.
     """
-    if not created and hasattr(instance, '_old_status') and instance._old_status is not None:
-        old_status = instance._old_status
+    if not created:
+        old_status = instance.old_value('status')
+
+        # Check if ingredients should be reserved based on status change
+        if instance.is_valid_status_reservation(old_status, instance.status):
+            instance.reserve_order_ingredients()
 
         # Check if ingredients should be consumed based on status change
         if instance.is_valid_status_consumption(old_status, instance.status):
@@ -36,18 +25,20 @@ def handle_ingredient_consumption(sender, instance, created, **kwargs):
         if instance.is_valid_status_restoration(old_status, instance.status):
             instance.restore_order_ingredients()
 
-    # Clean up the temporary attribute
-    if hasattr(instance, '_old_status'):
-        delattr(instance, '_old_status')
+
+@receiver(pre_delete, sender=Order)
+def release_order_reservations(sender, instance, **kwargs):
+    """
+    Release the ingredients reserved for an order before it is deleted along with its reservations.
+    """
+    instance.release_order_reservations()
 
 
 @receiver(post_save, sender=OrderItem)
+@receiver(post_delete, sender=OrderItem)
 def update_order_total_amount(sender, instance, **kwargs):
     """
-    Update the total amount of the order when an OrderItem is saved.
+    Update the total amount of the order when an OrderItem is saved or deleted.
+    The recomputation is deferred to the end of the transaction and runs once per order.
     """
-    with transaction.atomic():
-        order = instance.order
-        order_items = order.order_items.all()
-        order.total_amount = sum(item.total_price for item in order_items)
-        order.save()
+    schedule_order_total_update(instance.order_id, using=kwargs.get('using'))
@@ -1,3 +1,1131 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import tracemalloc
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.db.models import F
+from django.test import Client, SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from accounts.models import User, CustomerUser, TransporterUser, InventoryCoordinatorUser, WorkerUser
+from core.benchmarks import measure, load_baseline, write_baseline, get_budget_errors
+from core.indexes import get_live_indexes
+from inventory.enums import AllocationStrategy, LotType, MovementKind
+from inventory.expiry import sweep_expired_lots
+from inventory.ledger import take_snapshots
+from inventory.models import (Supplier, Category, Material, RawMaterial, ReadyMaterial, PackagedMaterial, StockMovement,
+                              StockSnapshot)
+from inventory.stock import add_stock_delta, stock_unit_of_work
+from orders.allocation import LotSnapshot, allocate, allocate_requirements, get_allocation_strategy
+from orders.enums import OrderStatus
+from orders.consumption import consume_ingredients, restore_consumptions
+from orders.hierarchy import get_lineage_level
+from orders.ingestion import ingest_orders
+from orders.reservations import reserve_stock, release_reservations
+from orders.intake import OrderIntakeQueue, intake_queue
+from orders.models import Order, OrderItem
+from orders.availability import get_availability_errors, get_order_availability_errors
+from orders.totals import update_order_totals
+from restaurant.models import (Restaurant, RestaurantPackagedMaterial, RestaurantPackagedMaterialConsumption,
+                               RestaurantStockPosition, StockReservation, Product, RecipeIngredient)
+from restaurant.recipes import recipe_cache
+from workstation.models import Workstation, WorkstationRawMaterialConsumption, WorkstationPreparedMaterial
+
+
+LIFECYCLE_BASELINE = Path(__file__).with_name('lifecycle_baseline.json')
+
+# Time and allocations depend on the machine, they may exceed the baseline by these factors
+LIFECYCLE_TOLERANCE = {
+    'seconds': 5.0,
+    'min_seconds': 0.25,
+    'allocated_kib': 2.0,
+}
+
+
+def explain(sql: str) -> str:
+    """
+    Get the plan the database picks for a statement, `EXPLAIN QUERY PLAN` on SQLite and `EXPLAIN` on PostgreSQL.
+
+    On PostgreSQL sequential scans are disabled while planning, the small tables of a test database would make
+    them cheaper than any index, and the point is to check that an index can serve the statement at all.
+    """
+    with connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return '\n'.join(row[-1] for row in cursor.fetchall())
+
+        cursor.execute('SET LOCAL enable_seqscan = off')
+        try:
+            cursor.execute(f'EXPLAIN {sql}')
+            return '\n'.join(row[0] for row in cursor.fetchall())
+        finally:
+            cursor.execute('RESET enable_seqscan')
+
+
+def get_index_names(model, fields) -> set:
+    """
+    Get the names of the live indexes of a model leading with the columns of the given fields.
+    """
+    columns = [model._meta.get_field(field).column for field in fields]
+    names = set()
+    for index in get_live_indexes(model):
+        if index['columns'][:len(columns)] != columns:
+            continue
+        if index['primary_key'] and connection.vendor == 'sqlite':
+            # SQLite backs a non integer primary key with an automatic index, which introspection does not name
+            with connection.cursor() as cursor:
+                cursor.execute(f'PRAGMA index_list({connection.ops.quote_name(model._meta.db_table)})')
+                names.update(row[1] for row in cursor.fetchall() if row[3] == 'pk')
+        else:
+            names.add(index['name'])
+    return names
+
+
+class OrderStockTestCase(TestCase):
+    """
+    A restaurant selling one product made of two materials, without any lot.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.transporter = TransporterUser.objects.create(username='transporter', email='transporter@example.com')
+        cls.customer = CustomerUser.objects.create(username='customer', email='customer@example.com')
+        cls.category = Category.objects.create(name='Category')
+        cls.restaurant = Restaurant.objects.create(name='Restaurant', location='Location')
+        cls.material_list = [
+            Material.objects.create(category=cls.category, material_name=f'Material {index}') for index in range(2)
+        ]
+        cls.product = Product.objects.create(name='Product', selling_price=Decimal('3'))
+        for index, material in enumerate(cls.material_list):
+            RecipeIngredient.objects.create(product=cls.product, material=material, quantity_consumed=2 - index)
+
+    def setUp(self):
+        cache.clear()
+        recipe_cache.clear()
+
+    def create_lot(self, material, quantity, days_left=None, **kwargs):
+        """
+        Deliver a lot to the restaurant, expiring in `days_left` days, never when None.
+        """
+        return RestaurantPackagedMaterial.objects.create(
+            restaurant=self.restaurant, material=material, initial_package_quantity=quantity,
+            transporter=self.transporter,
+            expiration_date=date.today() + timedelta(days=days_left) if days_left is not None else None,
+            **kwargs
+        )
+
+    def create_order(self, quantity=1):
+        order = Order.objects.create(restaurant=self.restaurant, customer=self.customer)
+        OrderItem.objects.create(order=order, product=self.product, quantity=quantity)
+        return order
+
+    def get_lines(self, order) -> list:
+        return list(order.order_items.values_list('id', 'product_id', 'quantity'))
+
+    def get_quantities(self, lots) -> list:
+        return [RestaurantPackagedMaterial.objects.get(pk=lot.pk).current_package_quantity for lot in lots]
+
+    def get_position(self, material):
+        return RestaurantStockPosition.objects.get(restaurant=self.restaurant, material=material)
+
+
+class ConsumptionTests(OrderStockTestCase):
+
+    def test_consumes_across_lots_in_expiration_order(self):
+        material, other_material = self.material_list
+        lots = [self.create_lot(material, 3, days_left=5), self.create_lot(material, 4, days_left=1),
+                self.create_lot(material, 10, days_left=9)]
+        self.create_lot(other_material, 10)
+        order = self.create_order(quantity=3)
+
+        consumptions = consume_ingredients(self.restaurant.pk, self.get_lines(order))
+
+        self.assertEqual(
+            [(consumption.restaurant_package_material_id, consumption.quantity_consumed)
+             for consumption in consumptions if consumption.material_id == material.pk],
+            [(lots[1].pk, 4), (lots[0].pk, 2)]
+        )
+        self.assertEqual(self.get_quantities(lots), [1, 0, 10])
+        self.assertIsNotNone(RestaurantPackagedMaterial.objects.get(pk=lots[1].pk).finished_date)
+        self.assertEqual(self.get_position(material).quantity, 11)
+        self.assertEqual(self.get_position(other_material).quantity, 7)
+
+    def test_category_strategy_overrides_restaurant_strategy(self):
+        material, other_material = self.material_list
+        lots = [self.create_lot(material, 3, days_left=1), self.create_lot(material, 2, days_left=5)]
+        self.create_lot(other_material, 10)
+        Restaurant.objects.filter(pk=self.restaurant.pk).update(allocation_strategy=AllocationStrategy.FIFO)
+        Category.objects.filter(pk=self.category.pk).update(allocation_strategy=AllocationStrategy.FEWEST_LOTS)
+        order = self.create_order(quantity=1)
+
+        consume_ingredients(self.restaurant.pk, self.get_lines(order))
+
+        self.assertEqual(self.get_quantities(lots), [3, 0])
+
+    def test_shortage_consumes_nothing(self):
+        material, other_material = self.material_list
+        lots = [self.create_lot(material, 4), self.create_lot(other_material, 1)]
+        order = self.create_order(quantity=1)
+        [(item_id, product_id, _)] = self.get_lines(order)
+
+        with self.assertRaises(ValidationError):
+            consume_ingredients(self.restaurant.pk, [(item_id, product_id, 2)])
+
+        self.assertEqual(self.get_quantities(lots), [4, 1])
+        self.assertFalse(RestaurantPackagedMaterialConsumption.objects.exists())
+        self.assertEqual(self.get_position(material).quantity, 4)
+
+
+class AllocationTests(SimpleTestCase):
+
+    today = date(2026, 1, 10)
+
+    def build_snapshot(self, lots) -> LotSnapshot:
+        """
+        Build a snapshot of (quantity, days left, hours since arrival) lots, None days left for lots never expiring.
+        """
+        received_at = datetime(2026, 1, 10, tzinfo=dt_timezone.utc)
+        snapshot = LotSnapshot()
+        for index, (quantity, days_left, age) in enumerate(lots):
+            snapshot.add(
+                f'lot-{index}', quantity,
+                self.today + timedelta(days=days_left) if days_left is not None else None,
+                received_at - timedelta(hours=age)
+            )
+        return snapshot
+
+    def allocate(self, snapshot, quantity, strategy):
+        allocations, missing = allocate(snapshot, quantity, strategy, self.today)
+        return [(snapshot.ids[index], drawn) for index, drawn in allocations], missing
+
+    def test_fefo_drains_lots_expiring_first_and_undated_lots_last(self):
+        snapshot = self.build_snapshot([(5, None, 30), (5, 4, 10), (5, 2, 1), (5, 4, 20)])
+
+        self.assertEqual(
+            self.allocate(snapshot, 12, AllocationStrategy.FEFO),
+            ([('lot-2', 5), ('lot-3', 5), ('lot-1', 2)], 0)
+        )
+        self.assertEqual(self.allocate(snapshot, 5, AllocationStrategy.FEFO), ([('lot-1', 3), ('lot-0', 2)], 0))
+
+    def test_fifo_drains_lots_in_arrival_order(self):
+        snapshot = self.build_snapshot([(5, 1, 10), (5, 9, 30), (5, None, 20)])
+
+        self.assertEqual(
+            self.allocate(snapshot, 8, AllocationStrategy.FIFO), ([('lot-1', 5), ('lot-2', 3)], 0)
+        )
+
+    def test_fewest_lots_prefers_a_single_fitting_lot(self):
+        snapshot = self.build_snapshot([(10, 5, 1), (4, 5, 2), (6, 5, 3), (4, 1, 4)])
+
+        # An exact fit, the one expiring first, then the smallest lot holding enough
+        self.assertEqual(self.allocate(snapshot, 4, AllocationStrategy.FEWEST_LOTS), ([('lot-3', 4)], 0))
+        self.assertEqual(self.allocate(snapshot, 5, AllocationStrategy.FEWEST_LOTS), ([('lot-2', 5)], 0))
+        # No lot holds enough anymore, the largest ones are drained first
+        self.assertEqual(
+            self.allocate(snapshot, 13, AllocationStrategy.FEWEST_LOTS), ([('lot-0', 10), ('lot-1', 3)], 0)
+        )
+
+    def test_expiry_risk_drains_most_stock_per_day_left_first(self):
+        snapshot = self.build_snapshot([(10, 9, 1), (3, 0, 2), (20, 3, 3), (50, None, 4)])
+
+        self.assertEqual(
+            self.allocate(snapshot, 24, AllocationStrategy.EXPIRY_RISK),
+            ([('lot-2', 20), ('lot-1', 3), ('lot-0', 1)], 0)
+        )
+
+    def test_expiry_risk_ranks_lots_again_after_each_draw(self):
+        snapshot = self.build_snapshot([(10, 10, 1), (5, 4, 2)])
+
+        self.assertEqual(self.allocate(snapshot, 2, AllocationStrategy.EXPIRY_RISK), ([('lot-1', 2)], 0))
+        # 3 units left over 5 days weigh less than 10 units over 11 days
+        self.assertEqual(self.allocate(snapshot, 2, AllocationStrategy.EXPIRY_RISK), ([('lot-0', 2)], 0))
+
+    def test_shortage_draws_nothing(self):
+        snapshot = self.build_snapshot([(5, 1, 1), (3, 2, 2)])
+        self.assertEqual(self.allocate(snapshot, 6, AllocationStrategy.FEFO), ([('lot-0', 5), ('lot-1', 1)], 0))
+
+        self.assertEqual(self.allocate(snapshot, 3, AllocationStrategy.FEFO), ([], 1))
+        self.assertEqual(list(snapshot.quantities), [0, 2])
+        self.assertEqual(snapshot.get_total(), 2)
+
+    def test_requirements_share_the_stock_of_their_material(self):
+        snapshots = {'flour': self.build_snapshot([(5, 1, 1), (5, 2, 2)]), 'salt': self.build_snapshot([(1, 1, 1)])}
+
+        allocations, shortages = allocate_requirements(
+            snapshots,
+            [('item-0', 'flour', 6), ('item-1', 'flour', 3), ('item-1', 'salt', 2), ('item-2', 'flour', 2),
+             ('item-2', 'sugar', 1)],
+            {'flour': AllocationStrategy.FEFO},
+            self.today
+        )
+
+        self.assertEqual(allocations, [('item-0', 'flour', 0, 5), ('item-0', 'flour', 1, 1), ('item-1', 'flour', 1, 3)])
+        self.assertEqual(shortages, {'salt': 1, 'flour': 1, 'sugar': 1})
+        self.assertEqual(snapshots['flour'].get_total(), 1)
+
+    def test_category_strategy_overrides_restaurant_strategy(self):
+        self.assertEqual(
+            get_allocation_strategy(AllocationStrategy.FIFO, AllocationStrategy.FEWEST_LOTS),
+            AllocationStrategy.FEWEST_LOTS
+        )
+        self.assertEqual(get_allocation_strategy(AllocationStrategy.FIFO, None), AllocationStrategy.FIFO)
+        self.assertEqual(get_allocation_strategy(), AllocationStrategy.FEFO)
+
+
+class AvailabilityTests(OrderStockTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for material in self.material_list:
+            self.create_lot(material, 20)
+        self.product_list = [self.product] + [
+            Product.objects.create(name=f'Product {index}', selling_price=Decimal('3')) for index in range(7)
+        ]
+        for index, product in enumerate(self.product_list[1:]):
+            RecipeIngredient.objects.create(product=product, material=self.material_list[index % 2],
+                                            quantity_consumed=1)
+
+    def create_order_of(self, products, quantity=1):
+        order = Order.objects.create(restaurant=self.restaurant, customer=self.customer)
+        for product in products:
+            OrderItem.objects.create(order=order, product=product, quantity=quantity)
+        return order
+
+    def count_queries(self, order) -> tuple:
+        """
+        Validate an order with cold caches and get its errors along with the number of queries it took.
+        """
+        cache.clear()
+        recipe_cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            errors = get_order_availability_errors(order)
+        return errors, len(queries)
+
+    def test_queries_do_not_depend_on_the_number_of_items(self):
+        small_errors, small_queries = self.count_queries(self.create_order_of(self.product_list[:1]))
+        large_errors, large_queries = self.count_queries(self.create_order_of(self.product_list[:4]))
+
+        self.assertEqual((small_errors, large_errors), ([], []))
+        self.assertEqual(small_queries, large_queries)
+        # The items, the recipes of their products with their components, and the stock positions
+        order = self.create_order_of(self.product_list)
+        cache.clear()
+        recipe_cache.clear()
+        with self.assertNumQueries(4):
+            get_order_availability_errors(order)
+
+    def test_queries_do_not_depend_on_the_number_of_short_items(self):
+        small_order = self.create_order_of(self.product_list[:1])
+        large_order = self.create_order_of(self.product_list)
+        OrderItem.objects.filter(order__in=[small_order, large_order]).update(quantity=20)
+
+        small_errors, small_queries = self.count_queries(small_order)
+        large_errors, large_queries = self.count_queries(large_order)
+
+        self.assertEqual((len(small_errors), len(large_errors)), (1, 9))
+        # The names of the short materials are read once for all items
+        self.assertEqual(small_queries, large_queries)
+
+
+class RestorationTests(OrderStockTestCase):
+
+    def test_restores_consumed_quantities(self):
+        material, other_material = self.material_list
+        lots = [self.create_lot(material, 4, days_left=1), self.create_lot(material, 10, days_left=5),
+                self.create_lot(other_material, 10)]
+        order = self.create_order(quantity=3)
+        consume_ingredients(self.restaurant.pk, self.get_lines(order))
+
+        restore_consumptions(RestaurantPackagedMaterialConsumption.objects.filter(order_item__order=order))
+
+        self.assertEqual(self.get_quantities(lots), [4, 10, 10])
+        self.assertIsNone(RestaurantPackagedMaterial.objects.get(pk=lots[0].pk).finished_date)
+        self.assertEqual(self.get_position(material).quantity, 14)
+        self.assertEqual(self.get_position(other_material).quantity, 10)
+        self.assertFalse(RestaurantPackagedMaterialConsumption.objects.exists())
+
+    def test_restores_many_orders_at_once(self):
+        material, other_material = self.material_list
+        lots = [self.create_lot(material, 10), self.create_lot(other_material, 10)]
+        orders = [self.create_order(quantity=1), self.create_order(quantity=2)]
+        for order in orders:
+            consume_ingredients(self.restaurant.pk, self.get_lines(order))
+        kept_order = self.create_order(quantity=1)
+        consume_ingredients(self.restaurant.pk, self.get_lines(kept_order))
+
+        restore_consumptions(RestaurantPackagedMaterialConsumption.objects.filter(order_item__order__in=orders))
+
+        self.assertEqual(self.get_quantities(lots), [8, 9])
+        self.assertEqual(self.get_position(material).quantity, 8)
+        self.assertEqual(
+            set(RestaurantPackagedMaterialConsumption.objects.values_list('order_item__order', flat=True)),
+            {kept_order.pk}
+        )
+
+
+class ReservationTests(OrderStockTestCase):
+
+    def get_reserved(self) -> list:
+        return [self.get_position(material).reserved_quantity for material in self.material_list]
+
+    def test_reserves_and_releases_order_ingredients(self):
+        for material in self.material_list:
+            self.create_lot(material, 10)
+        order = self.create_order(quantity=3)
+
+        reservations = reserve_stock(order)
+        self.assertEqual(
+            {(reservation.material_id, reservation.quantity) for reservation in reservations},
+            {(self.material_list[0].pk, 6), (self.material_list[1].pk, 3)}
+        )
+        self.assertEqual(self.get_reserved(), [6, 3])
+
+        # Reserving again replaces the previous reservations
+        reserve_stock(order)
+        self.assertEqual(self.get_reserved(), [6, 3])
+
+        release_reservations(StockReservation.objects.filter(order=order))
+        self.assertEqual(self.get_reserved(), [0, 0])
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_stock_reserved_by_other_orders_is_not_available(self):
+        for material in self.material_list:
+            self.create_lot(material, 10)
+        reserve_stock(self.create_order(quantity=4))
+
+        with self.assertRaisesMessage(ValidationError, 'Required 4, Available 2'):
+            reserve_stock(self.create_order(quantity=2))
+
+        self.assertEqual(self.get_reserved(), [8, 4])
+
+    def simulate_concurrent_reservation(self, conflicts: int):
+        """
+        Patch the position updates so that another order reserves stock between the read and the update of the
+        first `conflicts` compare-and-swap attempts.
+        """
+        manager = RestaurantStockPosition.objects
+        filter_positions = manager.filter
+        attempts = []
+
+        def filter_after_concurrent_update(*args, **kwargs):
+            if 'version' in kwargs and len(attempts) < conflicts:
+                attempts.append(kwargs['pk'])
+                filter_positions(pk=kwargs['pk']).update(reserved_quantity=F('reserved_quantity') + 1,
+                                                         version=F('version') + 1)
+            return filter_positions(*args, **kwargs)
+
+        return mock.patch.object(manager, 'filter', side_effect=filter_after_concurrent_update), attempts
+
+    def test_version_conflict_is_retried(self):
+        material = self.material_list[0]
+        self.create_lot(material, 10)
+        version = self.get_position(material).version
+
+        patch, attempts = self.simulate_concurrent_reservation(conflicts=1)
+        with patch:
+            shortages = RestaurantStockPosition.objects.reserve(self.restaurant.pk, {material.pk: 4}, max_retries=2)
+
+        self.assertEqual(shortages, {})
+        self.assertEqual(len(attempts), 1)
+        position = self.get_position(material)
+        self.assertEqual(position.reserved_quantity, 5)
+        self.assertEqual(position.version, version + 2)
+
+    def test_retried_reservation_sees_concurrent_reservations(self):
+        material = self.material_list[0]
+        self.create_lot(material, 4)
+
+        patch, _ = self.simulate_concurrent_reservation(conflicts=1)
+        with patch:
+            shortages = RestaurantStockPosition.objects.reserve(self.restaurant.pk, {material.pk: 4}, max_retries=2)
+
+        self.assertEqual(shortages, {material.pk: (4, 3)})
+        self.assertEqual(self.get_position(material).reserved_quantity, 1)
+
+    def test_gives_up_after_max_retries(self):
+        material = self.material_list[0]
+        self.create_lot(material, 10)
+
+        patch, attempts = self.simulate_concurrent_reservation(conflicts=2)
+        with patch, self.assertRaisesMessage(ValidationError, 'being updated by other orders'):
+            RestaurantStockPosition.objects.reserve(self.restaurant.pk, {material.pk: 4}, max_retries=2)
+
+        self.assertEqual(len(attempts), 2)
+        self.assertEqual(self.get_position(material).reserved_quantity, 2)
+
+
+class ExpiryTests(OrderStockTestCase):
+
+    def test_expired_lots_are_not_available_before_the_sweep(self):
+        material, other_material = self.material_list
+        expired_lot = self.create_lot(material, 10, days_left=3)
+        fresh_lot = self.create_lot(material, 1, days_left=3)
+        self.create_lot(other_material, 10)
+        order = self.create_order(quantity=1)
+        RestaurantPackagedMaterial.objects.filter(pk=expired_lot.pk).update(
+            expiration_date=date.today() - timedelta(days=1)
+        )
+
+        with self.assertRaisesMessage(ValidationError, 'Required 2, Available 1'):
+            self.create_order(quantity=1)
+        self.assertEqual(
+            RestaurantStockPosition.objects.get_available_quantities(self.restaurant.pk, [material.pk]),
+            {material.pk: 1}
+        )
+        self.assertTrue(get_availability_errors(self.restaurant.pk, self.get_lines(order)))
+        with self.assertRaisesMessage(ValidationError, 'Required 2, Available 1'):
+            reserve_stock(order)
+        with self.assertRaises(ValidationError):
+            consume_ingredients(self.restaurant.pk, self.get_lines(order))
+        [result] = ingest_orders([{'restaurant': self.restaurant.pk, 'customer': self.customer.pk,
+                                   'items': [{'product': self.product.pk, 'quantity': 1}]}])
+        self.assertFalse(result['accepted'])
+
+        self.assertEqual(self.get_quantities([fresh_lot]), [1])
+        self.assertEqual(self.get_position(material).reserved_quantity, 0)
+
+    def test_sweep_releases_reservations_of_written_off_stock(self):
+        material, other_material = self.material_list
+        expiring_lot = self.create_lot(material, 4, days_left=0)
+        self.create_lot(material, 2)
+        self.create_lot(other_material, 10)
+        orders = [self.create_order(quantity=1) for _ in range(3)]
+        for order in orders:
+            reserve_stock(order)
+        self.assertEqual((self.get_position(material).quantity, self.get_position(material).reserved_quantity), (6, 6))
+
+        results = sweep_expired_lots(date.today() + timedelta(days=1))
+
+        self.assertEqual([result.released for result in results], [0, 0, 2])
+        self.assertEqual(self.get_quantities([expiring_lot]), [0])
+        position = self.get_position(material)
+        self.assertEqual((position.quantity, position.reserved_quantity), (2, 2))
+        # The latest reservations of the written off material are released, the others are kept
+        self.assertEqual(
+            sorted(StockReservation.objects.values_list('order_id', 'material_id')),
+            sorted([(orders[0].pk, material.pk)] + [(order.pk, other_material.pk) for order in orders])
+        )
+
+    def test_restoration_skips_expired_lots(self):
+        material, other_material = self.material_list
+        expiring_lot = self.create_lot(material, 4, days_left=0)
+        lots = [expiring_lot, self.create_lot(other_material, 10)]
+        order = self.create_order(quantity=1)
+        consume_ingredients(self.restaurant.pk, self.get_lines(order))
+        RestaurantPackagedMaterial.objects.filter(pk=expiring_lot.pk).update(
+            expiration_date=date.today() - timedelta(days=1)
+        )
+
+        restore_consumptions(RestaurantPackagedMaterialConsumption.objects.filter(order_item__order=order))
+
+        self.assertEqual(self.get_quantities(lots), [2, 10])
+        self.assertEqual(self.get_position(material).quantity, 2)
+        self.assertEqual(self.get_position(other_material).quantity, 10)
+        self.assertFalse(RestaurantPackagedMaterialConsumption.objects.exists())
+        self.assertEqual(
+            list(StockMovement.objects.filter(kind=MovementKind.RESTORATION).values_list('lot_id', flat=True)),
+            [lots[1].pk]
+        )
+
+
+class OrderTotalTests(OrderStockTestCase):
+
+    def test_status_change_keeps_recomputed_total(self):
+        for material in self.material_list:
+            self.create_lot(material, 10)
+        order = Order.objects.create(restaurant=self.restaurant, customer=self.customer)
+        with self.captureOnCommitCallbacks(execute=True):
+            OrderItem.objects.create(order=order, product=self.product, quantity=2)
+
+        # The order loaded before the item was added still holds no total
+        order.status = OrderStatus.CONFIRMED
+        order.save()
+
+        order.refresh_from_db()
+        self.assertEqual(order.status, OrderStatus.CONFIRMED)
+        self.assertEqual(order.total_amount, Decimal('6.00'))
+
+
+class IngestionTests(OrderStockTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for material in self.material_list:
+            self.create_lot(material, 10)
+
+    def get_payload(self, **kwargs) -> dict:
+        item = {'product': self.product.pk, 'quantity': 2}
+        item.update(kwargs.pop('item', {}))
+        payload = {'restaurant': self.restaurant.pk, 'customer': self.customer.pk, 'items': [item]}
+        payload.update(kwargs)
+        return payload
+
+    def test_accepts_valid_orders(self):
+        payload = self.get_payload(reference='valid', item={'unit_price': '2.50'})
+        payload['items'].append({'product': self.product.pk, 'quantity': 1})
+
+        [result] = ingest_orders([payload])
+
+        self.assertTrue(result['accepted'], result['errors'])
+        order = Order.objects.get(pk=result['order_id'])
+        self.assertEqual(order.total_amount, Decimal('7.50'))
+        self.assertEqual(list(order.order_items.values_list('quantity', flat=True)), [3])
+
+    def test_rejects_malformed_orders_on_their_own(self):
+        malformed = [
+            self.get_payload(restaurant={'id': self.restaurant.pk}),
+            self.get_payload(customer=[self.customer.pk]),
+            self.get_payload(item={'product': [self.product.pk]}),
+            self.get_payload(order_date='2024-13-45T00:00:00'),
+            self.get_payload(note={'text': 'note'}),
+            self.get_payload(item={'note': ['note']}),
+            self.get_payload(item={'quantity': 2 ** 40}),
+        ] + [
+            self.get_payload(item={'unit_price': unit_price})
+            for unit_price in ('NaN', 'Infinity', '-1', -1, '1.001', '1e12', True, {'amount': 1})
+        ]
+
+        results = ingest_orders(malformed + [self.get_payload()])
+
+        for payload, result in zip(malformed, results):
+            self.assertFalse(result['accepted'], payload)
+            self.assertTrue(result['errors'], payload)
+        self.assertTrue(results[-1]['accepted'], results[-1]['errors'])
+        self.assertEqual(Order.objects.count(), 1)
+
+    def test_rejects_orders_short_of_ingredients(self):
+        [result] = ingest_orders([self.get_payload(item={'quantity': 6})])
+
+        self.assertFalse(result['accepted'])
+        self.assertIn('Required 12, Available 10', ' '.join(result['errors']))
+
+
+@override_settings(ORDER_API_KEYS=['pos-key'])
+class OrderApiAuthTests(OrderStockTestCase):
+    """
+    The order endpoints are posted to by machine clients with an API key, or by staff with a session and a CSRF
+    token, never by a bare session.
+    """
+
+    csrf_token = 'a' * 32
+
+    def setUp(self):
+        super().setUp()
+        for material in self.material_list:
+            self.create_lot(material, 10)
+        self.client = Client(enforce_csrf_checks=True)
+        self.body = json.dumps({'orders': [
+            {'restaurant': self.restaurant.pk, 'customer': self.customer.pk,
+             'items': [{'product': self.product.pk, 'quantity': 1}]}
+        ]})
+
+    def post(self, url_name, **headers):
+        return self.client.post(reverse(url_name), self.body, content_type='application/json', headers=headers)
+
+    def login(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        self.client.cookies['csrftoken'] = self.csrf_token
+
+    def test_ingestion_accepts_api_key(self):
+        response = self.post('orders:ingest', authorization='Bearer pos-key')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['accepted'], 1)
+
+    def test_ingestion_rejects_unknown_api_key(self):
+        response = self.post('orders:ingest', authorization='Bearer other-key')
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(Order.objects.exists())
+
+    def test_ingestion_requires_csrf_token_of_sessions(self):
+        self.assertEqual(self.post('orders:ingest').status_code, 403)
+
+        self.login()
+        self.assertEqual(self.post('orders:ingest').status_code, 403)
+        self.assertEqual(self.post('orders:ingest', x_csrftoken=self.csrf_token).status_code, 200)
+
+    @mock.patch.object(intake_queue, 'submit', return_value='ticket')
+    def test_intake_accepts_api_key(self, submit):
+        response = self.post('orders:intake', authorization='Bearer pos-key')
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['ticket'], 'ticket')
+
+        self.assertEqual(self.post('orders:intake', authorization='Bearer other-key').status_code, 401)
+        self.assertEqual(submit.call_count, 1)
+
+    @mock.patch.object(intake_queue, 'submit', return_value='ticket')
+    def test_intake_requires_csrf_token_of_sessions(self, submit):
+        self.assertEqual(self.post('orders:intake').status_code, 403)
+
+        self.login()
+        self.assertEqual(self.post('orders:intake').status_code, 403)
+        self.assertEqual(self.post('orders:intake', x_csrftoken=self.csrf_token).status_code, 202)
+
+
+class LineageViewTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        coordinator = InventoryCoordinatorUser.objects.create(username='coordinator', email='c@example.com')
+        supplier = Supplier.objects.create(name='Supplier')
+        material = Material.objects.create(category=Category.objects.create(name='Category'), material_name='Flour')
+        material.suppliers.add(supplier)
+        cls.raw_material = RawMaterial.objects.create(
+            supplier=supplier, material=material, inventory_coordinator=coordinator,
+            initial_quantity=10, storage_location='Storage'
+        )
+        cls.user = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+
+    def setUp(self):
+        self.client.force_login(self.user)
+        self.url = reverse('orders:supply_chain_lineage', args=['raw_material', self.raw_material.pk])
+
+    def test_unchanged_level_is_not_modified(self):
+        etag = self.client.get(self.url)['ETag']
+
+        response = self.client.get(self.url, headers={'if-none-match': etag})
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_quantity_increment_changes_etag(self):
+        response = self.client.get(self.url)
+        updated_at = RawMaterial.objects.get(pk=self.raw_material.pk).updated_at
+
+        add_stock_delta(RawMaterial, self.raw_material.pk, -3)
+
+        self.assertGreater(RawMaterial.objects.get(pk=self.raw_material.pk).updated_at, updated_at)
+        response = self.client.get(self.url, headers={'if-none-match': response['ETag']})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['node']['summary']['current_quantity'], 7)
+
+    def test_etag_follows_values_written_without_timestamp(self):
+        etag = self.client.get(self.url)['ETag']
+
+        RawMaterial.objects.filter(pk=self.raw_material.pk).update(current_quantity=4)
+
+        response = self.client.get(self.url, headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+
+def ingest_unless_bad(payloads) -> list:
+    """
+    Stand in for `ingest_batch`, failing the whole batch when it holds a `bad` order.
+    """
+    if 'bad' in payloads:
+        raise ValueError('Bad order.')
+    return [{'accepted': True, 'order_id': payload, 'errors': []} for payload in payloads]
+
+
+@mock.patch('orders.intake.ingest_batch', ingest_unless_bad)
+class IntakeQueueTests(SimpleTestCase):
+
+    def run_queue(self, queue, submissions) -> list:
+        """
+        Submit many lists of orders at once, wait for the workers to ingest them, and get the ticket of each,
+        None for the refused ones.
+        """
+        async def run():
+            tickets = [queue.submit(payloads) for payloads in submissions]
+            await queue.queue.join()
+            for task in queue.tasks:
+                task.cancel()
+            return tickets
+
+        return async_to_sync(run)()
+
+    def test_bad_submission_only_fails_its_own_ticket(self):
+        queue = OrderIntakeQueue(maxsize=100, workers=1, batch_size=100, batch_wait=0.01)
+        with self.assertLogs('orders.intake', 'ERROR'):
+            good, bad, other = self.run_queue(queue, [['a', 'b'], ['bad', 'c'], ['d']])
+
+        self.assertEqual([result['order_id'] for result in queue.get_status(good)['results']], ['a', 'b'])
+        self.assertEqual([result['accepted'] for result in queue.get_status(bad)['results']], [False, False])
+        self.assertEqual([result['order_id'] for result in queue.get_status(other)['results']], ['d'])
+
+    def test_queue_is_bounded_by_orders(self):
+        queue = OrderIntakeQueue(maxsize=3, workers=1, batch_size=100, batch_wait=0.01)
+        first, large, small = self.run_queue(queue, [['a', 'b'], ['c', 'd'], ['e']])
+
+        self.assertIsNotNone(first)
+        self.assertIsNone(large)
+        self.assertIsNotNone(small)
+        self.assertEqual(queue.queued_orders, 0)
+
+    def test_waiting_submissions_move_to_a_new_loop(self):
+        # The first loop has no worker, so its submission is still waiting when it ends
+        queue = OrderIntakeQueue(maxsize=100, workers=0, batch_size=100, batch_wait=0.01)
+
+        async def submit_and_stop():
+            return queue.submit(['a', 'b'])
+
+        waiting = async_to_sync(submit_and_stop)()
+        self.assertEqual(queue.get_status(waiting)['status'], 'queued')
+
+        queue.workers = 1
+        [other] = self.run_queue(queue, [['c']])
+
+        self.assertEqual([result['order_id'] for result in queue.get_status(waiting)['results']], ['a', 'b'])
+        self.assertEqual([result['order_id'] for result in queue.get_status(other)['results']], ['c'])
+        self.assertEqual(queue.queued_orders, 0)
+
+    def test_submissions_held_by_a_stopped_loop_fail(self):
+        queue = OrderIntakeQueue(maxsize=100, workers=1, batch_size=100, batch_wait=60)
+
+        async def submit_and_stop():
+            # The loop ends while its worker waits for more submissions to fill the batch
+            ticket = queue.submit(['a', 'b'])
+            while not queue.queue.empty():
+                await asyncio.sleep(0)
+            return ticket
+
+        held = async_to_sync(submit_and_stop)()
+        self.assertEqual(queue.get_status(held)['status'], 'queued')
+
+        queue.batch_wait = 0.01
+        with self.assertLogs('orders.intake', 'ERROR'):
+            [other] = self.run_queue(queue, [['c']])
+
+        self.assertEqual([result['accepted'] for result in queue.get_status(held)['results']], [False, False])
+        self.assertEqual([result['order_id'] for result in queue.get_status(other)['results']], ['c'])
+        self.assertEqual(queue.queued_orders, 0)
+
+
+class QueryPlanTestCase(TestCase):
+    """
+    Run the hot paths on a dataset shaped like a busy restaurant group and check the plans of their statements.
+    """
+
+    restaurants = 3
+    materials = 40
+    lots_per_material = 20
+    products = 20
+    orders_per_restaurant = 100
+
+    @classmethod
+    def setUpTestData(cls):
+        transporter = TransporterUser.objects.create(username='transporter', email='transporter@example.com')
+        customer = CustomerUser.objects.create(username='customer', email='customer@example.com')
+        category = Category.objects.create(name='Category')
+
+        cls.restaurant_list = Restaurant.objects.bulk_create([
+            Restaurant(name=f'Restaurant {index}', location='Location') for index in range(cls.restaurants)
+        ])
+        cls.material_list = Material.objects.bulk_create([
+            Material(category=category, material_name=f'Material {index}') for index in range(cls.materials)
+        ])
+
+        # Lots of every material in every restaurant, a quarter of them finished
+        RestaurantPackagedMaterial.objects.bulk_create([
+            RestaurantPackagedMaterial(
+                restaurant=restaurant,
+                material=material,
+                initial_package_quantity=100,
+                current_package_quantity=0 if index % 4 == 0 else 100,
+                transporter=transporter,
+                expiration_date=date.today() + timedelta(days=index)
+            )
+            for restaurant in cls.restaurant_list
+            for material in cls.material_list
+            for index in range(cls.lots_per_material)
+        ], batch_size=500)
+        RestaurantStockPosition.objects.rebuild()
+
+        cls.product_list = Product.objects.bulk_create([
+            Product(name=f'Product {index}', selling_price=Decimal('10')) for index in range(cls.products)
+        ])
+        RecipeIngredient.objects.bulk_create([
+            RecipeIngredient(
+                product=product,
+                material=cls.material_list[(index * 3 + offset) % cls.materials],
+                quantity_consumed=offset + 1
+            )
+            for index, product in enumerate(cls.product_list)
+            for offset in range(3)
+        ])
+
+        orders = Order.objects.bulk_create([
+            Order(restaurant=restaurant, customer=customer)
+            for restaurant in cls.restaurant_list
+            for _ in range(cls.orders_per_restaurant)
+        ], batch_size=500)
+        OrderItem.objects.bulk_create([
+            OrderItem(
+                order=order,
+                product=cls.product_list[(index + offset) % cls.products],
+                quantity=1,
+                unit_price=Decimal('10'),
+                total_price=Decimal('10')
+            )
+            for index, order in enumerate(orders)
+            for offset in range(3)
+        ], batch_size=500)
+
+        cls.order = orders[0]
+        cls.lines = list(cls.order.order_items.order_by('created_at').values_list('id', 'product_id', 'quantity'))
+
+    def setUp(self):
+        cache.clear()
+        recipe_cache.clear()
+
+    def capture(self, func) -> list:
+        """
+        Run a function and get the statements it ran.
+        """
+        with CaptureQueriesContext(connection) as context:
+            func()
+        return context.captured_queries
+
+    def get_plans(self, queries: list, model, statement: str = 'SELECT') -> list:
+        """
+        Get the plans of the captured statements of the given kind that ran on the table of a model.
+        """
+        plans = [
+            explain(query['sql'])
+            for query in queries
+            if query['sql'].startswith(statement) and f'"{model._meta.db_table}"' in query['sql']
+        ]
+        self.assertTrue(plans, f'No {statement} statement ran on {model._meta.db_table}.')
+        return plans
+
+    def assertUsesIndex(self, plan: str, model, fields):
+        names = get_index_names(model, fields)
+        self.assertTrue(names, f"No index of {model._meta.db_table} leads with {', '.join(fields)}.")
+        self.assertTrue(
+            any(name in plan for name in names),
+            f"None of {', '.join(sorted(names))} is used by:\n{plan}"
+        )
+
+
+class HotPathQueryPlanTests(QueryPlanTestCase):
+
+    def test_availability_uses_stock_position_and_reservation_indexes(self):
+        queries = self.capture(
+            lambda: get_availability_errors(self.order.restaurant_id, self.lines, order_id=self.order.pk)
+        )
+        [plan] = self.get_plans(queries, RestaurantStockPosition)
+        self.assertUsesIndex(plan, RestaurantStockPosition, ['restaurant', 'material'])
+        self.assertUsesIndex(plan, StockReservation, ['order', 'material'])
+
+    def test_fifo_lot_selection_uses_lot_scan_index(self):
+        queries = self.capture(lambda: consume_ingredients(self.order.restaurant_id, self.lines))
+        # The lots are locked first, then their lineage is read
+        [plan, *_] = self.get_plans(queries, RestaurantPackagedMaterial)
+        self.assertUsesIndex(
+            plan, RestaurantPackagedMaterial, ['restaurant', 'material', 'current_package_quantity']
+        )
+
+    def test_restoration_uses_consumption_indexes(self):
+        consume_ingredients(self.order.restaurant_id, self.lines)
+        consumptions = RestaurantPackagedMaterialConsumption.objects.filter(order_item__order=self.order)
+
+        queries = self.capture(lambda: restore_consumptions(consumptions))
+
+        # The consumed quantities are summed first, then the records are collected for deletion
+        [select_plan, *_] = self.get_plans(queries, RestaurantPackagedMaterialConsumption)
+        self.assertUsesIndex(select_plan, RestaurantPackagedMaterialConsumption, ['order_item'])
+
+        [update_plan] = self.get_plans(queries, RestaurantPackagedMaterial, statement='UPDATE')
+        self.assertUsesIndex(update_plan, RestaurantPackagedMaterial, ['id'])
+        self.assertUsesIndex(update_plan, RestaurantPackagedMaterialConsumption, ['restaurant_package_material'])
+
+    def test_total_recompute_uses_order_item_index(self):
+        queries = self.capture(lambda: update_order_totals([self.order.pk]))
+        [plan] = self.get_plans(queries, Order, statement='UPDATE')
+        self.assertUsesIndex(plan, Order, ['id'])
+        self.assertUsesIndex(plan, OrderItem, ['order'])
+
+    def test_lineage_walk_uses_foreign_key_indexes(self):
+        [plan] = self.get_plans(self.capture(lambda: get_lineage_level('order', self.order.pk)), OrderItem)
+        self.assertUsesIndex(plan, OrderItem, ['order'])
+
+        consume_ingredients(self.order.restaurant_id, self.lines)
+        order_item_id = self.lines[0][0]
+        queries = self.capture(lambda: get_lineage_level('order_item', order_item_id))
+        [plan] = self.get_plans(queries, RestaurantPackagedMaterialConsumption)
+        self.assertUsesIndex(plan, RestaurantPackagedMaterialConsumption, ['order_item'])
+
+    def test_snapshot_watermark_uses_type_date_indexes(self):
+        take_snapshots(LotType.RESTAURANT_PACKAGE_MATERIAL)
+        consume_ingredients(self.order.restaurant_id, self.lines)
+
+        queries = self.capture(lambda: take_snapshots(LotType.RESTAURANT_PACKAGE_MATERIAL))
+        [watermark_plan, *_] = self.get_plans(queries, StockSnapshot)
+        self.assertUsesIndex(watermark_plan, StockSnapshot, ['lot_type', 'taken_at'])
+        [moved_lots_plan, *_] = self.get_plans(queries, StockMovement)
+        self.assertUsesIndex(moved_lots_plan, StockMovement, ['lot_type', 'occurred_at'])
+
+
+class OrderLifecycleBenchmarkTests(TransactionTestCase):
+    """
+    Drive the supply chain and the order lifecycle through the real models and signals, measure the queries, wall
+    time and allocations of every step and compare them with the committed baseline.
+
+    Set the BENCHMARK_UPDATE_BASELINE environment variable to record the measurements as the new baseline.
+    The steps run outside of a test transaction, so the work deferred to commit, like order totals, is measured.
+    """
+
+    materials = 3
+    lots_per_material = 2
+    lot_quantity = 50
+
+    def setUp(self):
+        cache.clear()
+        recipe_cache.clear()
+
+        self.coordinator = InventoryCoordinatorUser.objects.create(username='coordinator', email='c@example.com')
+        self.worker = WorkerUser.objects.create(username='worker', email='w@example.com')
+        self.transporter = TransporterUser.objects.create(username='transporter', email='t@example.com')
+        self.customer = CustomerUser.objects.create(username='customer', email='cu@example.com')
+
+        supplier = Supplier.objects.create(name='Supplier')
+        category = Category.objects.create(name='Category')
+        self.workstation = Workstation.objects.create(name='Workstation', location='Location')
+        self.restaurant = Restaurant.objects.create(name='Restaurant', location='Location')
+
+        self.material_list = [
+            Material.objects.create(category=category, material_name=f'Material {index}')
+            for index in range(self.materials)
+        ]
+        for material in self.material_list:
+            material.suppliers.add(supplier)
+        self.raw_materials = [
+            RawMaterial.objects.create(
+                supplier=supplier, material=material, inventory_coordinator=self.coordinator,
+                initial_quantity=self.lot_quantity * self.lots_per_material * 2, storage_location='Storage'
+            )
+            for material in self.material_list
+        ]
+
+        self.product_list = [Product.objects.create(name=f'Product {index}', selling_price=Decimal('10'))
+                             for index in range(self.materials)]
+        for index, product in enumerate(self.product_list):
+            for offset in range(2):
+                RecipeIngredient.objects.create(
+                    product=product, material=self.material_list[(index + offset) % self.materials],
+                    quantity_consumed=offset + 1
+                )
+
+    def consume_raw_materials(self):
+        return [
+            WorkstationRawMaterialConsumption.objects.create(
+                workstation=self.workstation, raw_material=raw_material, worker=self.worker,
+                quantity_consumed=self.lot_quantity * self.lots_per_material, transporter=self.transporter
+            )
+            for raw_material in self.raw_materials
+        ]
+
+    def consume_raw_materials_batched(self):
+        with stock_unit_of_work():
+            return self.consume_raw_materials()
+
+    def prepare_materials(self, consumptions):
+        return [
+            ReadyMaterial.objects.create(
+                workstation_prepared_material=WorkstationPreparedMaterial.objects.create(
+                    workstation_raw_material_consumption=consumption, quantity=consumption.quantity_consumed
+                ),
+                inventory_coordinator=self.coordinator, initial_quantity=consumption.quantity_consumed,
+                transporter=self.transporter
+            )
+            for consumption in consumptions
+        ]
+
+    def package_materials(self, ready_materials):
+        return [
+            PackagedMaterial.objects.create(ready_material=ready_material, worker=self.worker,
+                                            quantity=self.lot_quantity)
+            for ready_material in ready_materials
+            for _ in range(self.lots_per_material)
+        ]
+
+    def package_materials_batched(self, ready_materials):
+        with stock_unit_of_work():
+            return self.package_materials(ready_materials)
+
+    def deliver_to_restaurant(self, packaged_materials):
+        return [
+            RestaurantPackagedMaterial.objects.create(
+                restaurant=self.restaurant, material=raw_material.material, package_material=packaged_material,
+                initial_package_quantity=packaged_material.quantity, transporter=self.transporter,
+                expiration_date=date.today() + timedelta(days=7)
+            )
+            for raw_material, packaged_material in zip(
+                [raw_material for raw_material in self.raw_materials for _ in range(self.lots_per_material)],
+                packaged_materials
+            )
+        ]
+
+    def create_order(self):
+        return Order.objects.create(restaurant=self.restaurant, customer=self.customer)
+
+    def add_items(self, order):
+        return [
+            OrderItem.objects.create(order=order, product=product, quantity=2, unit_price=product.selling_price)
+            for product in self.product_list
+        ]
+
+    def set_status(self, order, status):
+        order.status = status
+        order.save()
+
+    def run_lifecycle(self) -> dict:
+        """
+        Run every step once and get their measurements, keyed by step name.
+        """
+        measurements = {}
+
+        def step(name, func, *args):
+            measurements[name] = measure(func, *args)
+            return measurements[name]['result']
+
+        consumptions = step('workstation_consumption', self.consume_raw_materials)
+        ready_materials = step('material_preparation', self.prepare_materials, consumptions)
+        packaged_materials = step('packaging', self.package_materials, ready_materials)
+        step('restaurant_delivery', self.deliver_to_restaurant, packaged_materials)
+
+        # The same steps with their stock deltas coalesced by a unit of work, on the other half of the raw materials
+        batched_consumptions = step('workstation_consumption_batched', self.consume_raw_materials_batched)
+        step('packaging_batched', self.package_materials_batched, self.prepare_materials(batched_consumptions))
+
+        order = step('create_order', self.create_order)
+        step('add_items', self.add_items, order)
+        step('confirm', self.set_status, order, OrderStatus.CONFIRMED)
+        step('prepare', self.set_status, order, OrderStatus.PREPARING)
+        step('ready', self.set_status, order, OrderStatus.READY)
+        step('deliver', self.set_status, order, OrderStatus.DELIVERED)
+
+        cancelled_order = self.create_order()
+        self.add_items(cancelled_order)
+        self.set_status(cancelled_order, OrderStatus.CONFIRMED)
+        step('cancel', self.set_status, cancelled_order, OrderStatus.CANCELLED)
+
+        return measurements
+
+    def test_lifecycle_within_budgets(self):
+        tracemalloc.start()
+        try:
+            measurements = self.run_lifecycle()
+        finally:
+            tracemalloc.stop()
+
+        if os.environ.get('BENCHMARK_UPDATE_BASELINE'):
+            write_baseline(LIFECYCLE_BASELINE, measurements, LIFECYCLE_TOLERANCE)
+            self.skipTest(f'Recorded the baseline in {LIFECYCLE_BASELINE}.')
+
+        baseline = load_baseline(LIFECYCLE_BASELINE)
+        if baseline['vendor'] != connection.vendor:
+            # Query counts differ between databases, e.g. savepoints and locks
+            self.skipTest(f"The baseline was recorded on {baseline['vendor']}.")
+
+        errors = get_budget_errors(measurements, baseline)
+        if errors:
+            self.fail('\n'.join(errors))
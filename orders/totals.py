@@ -0,0 +1,64 @@
+from decimal import Decimal
+
+from django.db import models, transaction
+from django.db.models import OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def update_order_totals(order_ids) -> int:
+    """
+    Recompute the total amount of many orders with a single UPDATE over an aggregate subquery.
+    This skips `Order.save`, so neither the status validation nor the ingredient checks are run again.
+    Returns the number of updated orders.
+    """
+    from orders.models import Order, OrderItem
+
+    items_total = Subquery(
+        OrderItem.objects.filter(
+            order=OuterRef('pk')
+        ).values('order').annotate(
+            total=Sum('total_price')
+        ).values('total')
+    )
+
+    return Order.objects.filter(pk__in=order_ids).update(
+        total_amount=Coalesce(items_total, Value(Decimal('0')), output_field=models.DecimalField()),
+        updated_at=timezone.now()
+    )
+
+
+class OrderTotalsBatch:
+    """
+    Orders whose total must be recomputed when the current transaction commits.
+    """
+
+    def __init__(self):
+        self.order_ids = set()
+
+    def __call__(self):
+        update_order_totals(self.order_ids)
+
+    def is_pending(self, connection) -> bool:
+        return any(func is self for _, func, *_ in connection.run_on_commit)
+
+
+def schedule_order_total_update(order_id, using=None) -> None:
+    """
+    Queue the total recomputation of an order once per transaction, however many of its items are saved.
+    Outside of a transaction the total is recomputed straight away.
+    """
+    connection = transaction.get_connection(using)
+
+    if not connection.in_atomic_block:
+        update_order_totals([order_id])
+        return
+
+    # A batch registered in a committed or rolled back transaction is not pending anymore
+    batch = getattr(connection, 'order_totals_batch', None)
+    if batch is None or not batch.is_pending(connection):
+        batch = OrderTotalsBatch()
+        connection.order_totals_batch = batch
+        transaction.on_commit(batch, using=using)
+
+    batch.order_ids.add(order_id)
@@ -0,0 +1,13 @@
+from django.urls import path
+
+from orders.views import OrderIngestionView, OrderIntakeView, SupplyChainLineageView
+
+
+app_name = 'orders'
+
+urlpatterns = [
+    path('ingest/', OrderIngestionView.as_view(), name='ingest'),
+    path('intake/', OrderIntakeView.as_view(), name='intake'),
+    path('intake/<str:ticket>/', OrderIntakeView.as_view(), name='intake_status'),
+    path('lineage/<str:node_type>/<str:node_id>/', SupplyChainLineageView.as_view(), name='supply_chain_lineage'),
+]
@@ -1,16 +1,37 @@
-from orders.models import OrderItem
-from django.views.generic import DetailView
+import hashlib
+import hmac
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import JsonResponse
+from django.urls import reverse
+from django.views.generic import DetailView, View
+from django.contrib.auth.mixins import PermissionRequiredMixin
+
+from orders.hierarchy import SUPPLY_CHAIN_LEVELS, get_lineage_level
+from orders.ingestion import ingest_orders
+from orders.intake import intake_queue
+from orders.models import Order, OrderItem
 from django.forms.models import model_to_dict
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
 from django.utils.decorators import method_decorator
 from django.contrib.admin.options import ModelAdmin
 from django.contrib.admin.views.decorators import staff_member_required
+from django.middleware.csrf import CsrfViewMiddleware
+from django.views.decorators.csrf import csrf_exempt
 
 
 class SupplyChainHierarchyAdminView(DetailView):
+    """
+    Render the supply chain page of an order item, its levels are fetched on demand from `SupplyChainLineageView`.
+    """
     model_admin: ModelAdmin = None
     model = OrderItem
     pk_url_kwarg = 'id'
     template_name = 'admin/supply_chain_hierarchy.html'
+    node_type = 'order_item'
 
     def __init__(
             self,
@@ -24,22 +45,21 @@ class SupplyChainHierarchyAdminView(DetailView):
         context = super().get_context_data(**kwargs)
 
         order_item = self.object
-        order_item_id = order_item.id
         context.update({
             'title': 'Supply Chain Hierarchy',
-            'order_item_id': order_item_id,
-            'hierarchy_data': None,
+            'order_item_id': order_item.id,
+            'order_item': order_item,
+            'hierarchy_data': {
+                'order_item': {
+                    'id': order_item.id,
+                    'name': str(order_item),
+                    'details': self.get_model_details(order_item)
+                }
+            },
+            'lineage_url': self.get_lineage_url(),
             'error': None
         })
 
-        if order_item_id:
-            try:
-                hierarchy_data = self.get_supply_chain_hierarchy(order_item)
-                context['hierarchy_data'] = hierarchy_data
-                context['order_item'] = order_item
-            except Exception as e:
-                context['error'] = str(e)
-
         request = kwargs['request']
         context.update(
            self.get_admin_context(request=request)
@@ -49,91 +69,219 @@ class SupplyChainHierarchyAdminView(DetailView):
     def get_admin_context(self, request):
         return  self.model_admin.admin_site.each_context(request=request)
 
+    def get_lineage_url(self):
+        return reverse('orders:supply_chain_lineage', args=[self.node_type, self.object.pk])
+
     @method_decorator(staff_member_required)
     def get(self, request, *args, **kwargs):
         self.object = self.get_object()
         context = self.get_context_data(request=request, object=self.object)
         return self.render_to_response(context)
 
-    def get_supply_chain_hierarchy(self, order_item):
-        hierarchy = {
-            'order_item': {
-                'id': order_item.id,
-                'name': str(order_item),
-                'details': self.get_model_details(order_item)
-            },
-            'material_chains': []
-        }
+    def get_model_details(self, obj):
+        return model_to_dict(obj)
 
-        # Get all material consumptions for this order item
-        material_consumptions = order_item.material_consumptions.all()
 
-        for consumption in material_consumptions:
-            chain = self.build_material_chain(consumption)
-            hierarchy['material_chains'].append(chain)
+class OrderSupplyChainHierarchyAdminView(SupplyChainHierarchyAdminView):
+    """
+    Render the supply chain page of a whole order, its levels are fetched on demand from `SupplyChainLineageView`.
+    """
+    model = Order
+    template_name = 'admin/order_supply_chain_hierarchy.html'
+    node_type = 'order'
 
-        return hierarchy
+    def get_context_data(self, **kwargs):
+        context = super(SupplyChainHierarchyAdminView, self).get_context_data(**kwargs)
 
-    def build_material_chain(self, consumption):
-        """Build the complete chain from consumption to supplier"""
-        chain = {
-            'consumption': {
-                'id': consumption.id,
-                'details': self.get_model_details(consumption)
-            }
-        }
+        context.update({
+            'title': 'Order Supply Chain Hierarchy',
+            'order': self.object,
+            'lineage_url': self.get_lineage_url(),
+            'error': None
+        })
+
+        request = kwargs['request']
+        context.update(
+           self.get_admin_context(request=request)
+        )
+        return context
+
+
+@method_decorator(staff_member_required, name='dispatch')
+class SupplyChainLineageView(View):
+    """
+    Return one level of the supply chain as JSON: a node with its details and a page of its children summaries.
+
+    Children are paginated with the `cursor` and `limit` query parameters. Responses carry an ETag hashing the
+    returned level and a Last-Modified header derived from the `updated_at` of its records, so browsers can
+    revalidate levels they already loaded and get a `304` while nothing changed.
+    """
+    http_method_names = ['get']
+    default_limit = 50
+    max_limit = 200
+
+    def get(self, request, node_type, node_id, *args, **kwargs):
+        if node_type not in SUPPLY_CHAIN_LEVELS:
+            return JsonResponse({'error': f'Unknown node type: {node_type}.'}, status=404)
 
         try:
-            # Restaurant Package Material
-            restaurant_package_material = consumption.restaurant_package_material
-            chain['restaurant_package_material'] = {
-                'id': restaurant_package_material.id,
-                'details': self.get_model_details(restaurant_package_material)
-            }
-
-            # Package Material
-            package_material = restaurant_package_material.package_material
-            chain['package_material'] = {
-                'id': package_material.id,
-                'details': self.get_model_details(package_material)
-            }
-
-            # Ready Material
-            ready_material = package_material.ready_material
-            chain['ready_material'] = {
-                'id': ready_material.id,
-                'details': self.get_model_details(ready_material)
-            }
-
-            # Workstation Prepared Material
-            workstation_prepared_material = ready_material.workstation_prepared_material
-            chain['workstation_prepared_material'] = {
-                'id': workstation_prepared_material.id,
-                'details': self.get_model_details(workstation_prepared_material)
-            }
-
-            # Workstation Raw Material Consumption
-            workstation_raw_material_consumption = workstation_prepared_material.workstation_raw_material_consumption
-            chain['workstation_raw_material_consumption'] = {
-                'id': workstation_raw_material_consumption.id,
-                'details': self.get_model_details(workstation_raw_material_consumption)
-            }
-
-            # Raw Material
-            raw_material = workstation_raw_material_consumption.raw_material
-            chain['raw_material'] = {
-                'details': self.get_model_details(raw_material)
-            }
-
-            # Supplier
-            supplier = raw_material.supplier
-            chain['supplier'] = {
-                'id': supplier.id,
-                'details': self.get_model_details(supplier)
-            }
-        except AttributeError as e:
-            chain['error'] = f"Chain broken at: {str(e)}"
-        return chain
+            limit = min(max(int(request.GET.get('limit', self.default_limit)), 1), self.max_limit)
+        except ValueError:
+            return JsonResponse({'error': 'Invalid limit.'}, status=400)
+        cursor = request.GET.get('cursor') or None
 
-    def get_model_details(self, obj):
-        return model_to_dict(obj)
+        level = get_lineage_level(node_type, node_id, cursor=cursor, limit=limit)
+        if level is None:
+            return JsonResponse({'error': f'Unknown {node_type}: {node_id}.'}, status=404)
+
+        # The ETag hashes the serialized level, so it changes with any returned value, even one written by a
+        # statement that did not touch `updated_at`
+        content = JsonResponse(level)
+        last_modified = max(record['updated_at'] for record in [level['node'], *level['children']])
+        etag = quote_etag(hashlib.md5(content.content).hexdigest())
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=int(last_modified.timestamp())
+        )
+        if response is None:
+            response = content
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+
+class ApiKeyAuthMixin:
+    """
+    Authenticate machine clients, like point of sale systems, with one of the keys of the ORDER_API_KEYS setting
+    sent as `Authorization: Bearer <key>`. They need neither a session nor a CSRF token, and a valid key grants
+    the permission of the view.
+
+    Requests without the header are authenticated by their session and must pass the CSRF check like any form,
+    the view being exempted from the middleware so that keyed requests are not.
+    """
+
+    def get_authentication_error(self, request):
+        """
+        Check the API key of a request, or the CSRF token of a session request, and flag keyed requests with
+        `api_key_authenticated`.
+        Returns an error response, None when the request may go on.
+        """
+        request.api_key_authenticated = False
+        scheme, _, key = request.headers.get('Authorization', '').partition(' ')
+        if scheme.lower() != 'bearer':
+            return CsrfViewMiddleware(lambda request: None).process_view(request, None, (), {})
+
+        key = key.strip().encode()
+        if not key or not any(
+            hmac.compare_digest(key, valid_key.encode()) for valid_key in getattr(settings, 'ORDER_API_KEYS', [])
+        ):
+            return JsonResponse({'error': 'Invalid API key.'}, status=401, headers={'WWW-Authenticate': 'Bearer'})
+        request.api_key_authenticated = True
+        return None
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class OrderIngestionView(ApiKeyAuthMixin, PermissionRequiredMixin, View):
+    """
+    Accept a batch of orders as JSON, `{"orders": [...]}`, and report whether each one was accepted.
+    Clients authenticate with an API key or a session, see `ApiKeyAuthMixin`.
+    """
+    permission_required = 'orders.add_order'
+    raise_exception = True
+    http_method_names = ['post']
+    max_orders = 1000
+
+    def dispatch(self, request, *args, **kwargs):
+        error = self.get_authentication_error(request)
+        if error is not None:
+            return error
+        return super().dispatch(request, *args, **kwargs)
+
+    def has_permission(self):
+        return self.request.api_key_authenticated or super().has_permission()
+
+    def post(self, request, *args, **kwargs):
+        try:
+            payload = json.loads(request.body)
+        except (TypeError, ValueError):
+            return JsonResponse({'error': 'Invalid JSON body.'}, status=400)
+
+        orders = payload.get('orders') if isinstance(payload, dict) else None
+        if not isinstance(orders, list):
+            return JsonResponse({'error': 'Expected an "orders" list.'}, status=400)
+        if len(orders) > self.max_orders:
+            return JsonResponse({'error': f'At most {self.max_orders} orders can be sent at once.'}, status=400)
+
+        results = ingest_orders(orders)
+        return JsonResponse({
+            'accepted': sum(result['accepted'] for result in results),
+            'rejected': sum(not result['accepted'] for result in results),
+            'results': results,
+        })
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class OrderIntakeView(ApiKeyAuthMixin, View):
+    """
+    Queue orders for asynchronous ingestion and answer right away with a ticket.
+
+    `POST` accepts `{"orders": [...]}` and returns `202` with the ticket, or `503` with a `Retry-After` header
+    when the intake queue is full. `GET` with a ticket returns its status and, once done, its results.
+    Clients authenticate with an API key or a session, see `ApiKeyAuthMixin`.
+    """
+    permission_required = 'orders.add_order'
+    http_method_names = ['get', 'post']
+    max_orders = 1000
+
+    async def has_permission(self, request) -> bool:
+        if request.api_key_authenticated:
+            return True
+        user = await request.auser()
+        return await sync_to_async(user.has_perm)(self.permission_required)
+
+    async def authorize(self, request):
+        """
+        Authenticate a request and check its permission.
+        Returns an error response, None when the request may go on.
+        """
+        error = self.get_authentication_error(request)
+        if error is None and not await self.has_permission(request):
+            error = JsonResponse({'error': 'Permission denied.'}, status=403)
+        return error
+
+    async def get(self, request, ticket=None, *args, **kwargs):
+        error = await self.authorize(request)
+        if error is not None:
+            return error
+
+        status = intake_queue.get_status(ticket) if ticket else None
+        if status is None:
+            return JsonResponse({'error': 'Unknown ticket.'}, status=404)
+        return JsonResponse(status)
+
+    async def post(self, request, *args, **kwargs):
+        error = await self.authorize(request)
+        if error is not None:
+            return error
+
+        try:
+            payload = json.loads(request.body)
+        except (TypeError, ValueError):
+            return JsonResponse({'error': 'Invalid JSON body.'}, status=400)
+
+        orders = payload.get('orders') if isinstance(payload, dict) else None
+        if not isinstance(orders, list) or not orders:
+            return JsonResponse({'error': 'Expected a non empty "orders" list.'}, status=400)
+        if len(orders) > self.max_orders:
+            return JsonResponse({'error': f'At most {self.max_orders} orders can be sent at once.'}, status=400)
+
+        ticket = intake_queue.submit(orders)
+        if ticket is None:
+            retry_after = getattr(settings, 'ORDER_INTAKE_RETRY_AFTER', 1)
+            return JsonResponse(
+                {'error': 'Intake queue is full, please retry later.'},
+                status=503,
+                headers={'Retry-After': str(retry_after)}
+            )
+        return JsonResponse({'ticket': ticket, 'status': 'queued'}, status=202)
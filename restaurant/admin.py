@@ -1,12 +1,13 @@
 from django.contrib import admin
 from django.utils.translation import gettext_lazy as _
 
-from restaurant.models import Restaurant, RestaurantPackagedMaterial, ProductCategory, Product, RecipeIngredient
+from restaurant.models import (Restaurant, RestaurantPackagedMaterial, RestaurantStockPosition, ProductCategory, Product,
+                               RecipeIngredient, RecipeComponent, StockReservation, MaterialLineage)
 
 
 @admin.register(Restaurant)
 class RestaurantAdmin(admin.ModelAdmin):
-    list_display = ('name', 'created_at', 'updated_at')
+    list_display = ('name', 'allocation_strategy', 'created_at', 'updated_at')
     readonly_fields = ('created_at', 'updated_at')
 
 
@@ -14,12 +15,13 @@ class RestaurantAdmin(admin.ModelAdmin):
 class RestaurantPackagedMaterialAdmin(admin.ModelAdmin):
     list_display = ('restaurant', 'current_package_quantity', 'unit', 'created_at', 'updated_at')
     list_filter = ('unit',)
-    readonly_fields = ('current_package_quantity', 'finished_date', 'created_at', 'updated_at')
+    readonly_fields = ('current_package_quantity', 'finished_date', 'expired_at', 'created_at', 'updated_at')
     fieldsets = (
         (
             _("General info"),
             {"fields": ("restaurant", "material", "package_material", "initial_package_quantity",
-                        "current_package_quantity", "unit", "production_date", "expiration_date")},
+                        "current_package_quantity", "unit", "production_date", "expiration_date",
+                        "expired_at")},
         ),
         (
             _("Storage info"),
@@ -36,6 +38,50 @@ class RestaurantPackagedMaterialAdmin(admin.ModelAdmin):
     )
 
 
+@admin.register(RestaurantStockPosition)
+class RestaurantStockPositionAdmin(admin.ModelAdmin):
+    list_display = ('restaurant', 'material', 'quantity', 'reserved_quantity', 'updated_at')
+    list_filter = ('restaurant',)
+    list_select_related = ('restaurant', 'material')
+    readonly_fields = ('restaurant', 'material', 'quantity', 'reserved_quantity', 'version', 'created_at',
+                       'updated_at')
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(StockReservation)
+class StockReservationAdmin(admin.ModelAdmin):
+    list_display = ('order', 'restaurant', 'material', 'quantity', 'expires_at', 'created_at')
+    list_filter = ('restaurant',)
+    list_select_related = ('order', 'restaurant', 'material')
+    readonly_fields = ('order', 'restaurant', 'material', 'quantity', 'expires_at', 'created_at', 'updated_at')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(MaterialLineage)
+class MaterialLineageAdmin(admin.ModelAdmin):
+    list_display = ('consumption', 'order_item', 'restaurant', 'material', 'raw_material', 'supplier',
+                    'quantity_consumed', 'created_at')
+    list_filter = ('restaurant', 'supplier')
+    list_select_related = ('restaurant', 'material', 'raw_material__material', 'supplier')
+    search_fields = ('order_item__id', 'raw_material__id', 'ready_material__id', 'package_material__id')
+    readonly_fields = ('consumption', 'order_item', 'restaurant', 'material', 'restaurant_package_material',
+                       'package_material', 'ready_material', 'raw_material', 'supplier', 'quantity_consumed',
+                       'created_at')
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(ProductCategory)
 class ProductCategoryAdmin(admin.ModelAdmin):
     list_display = ('name', 'created_at', 'updated_at')
@@ -48,9 +94,18 @@ class RecipeIngredientInlineAdmin(admin.StackedInline):
     readonly_fields = ('created_at', 'updated_at')
 
 
+class RecipeComponentInlineAdmin(admin.StackedInline):
+    model = RecipeComponent
+    fk_name = 'product'
+    extra = 0
+    autocomplete_fields = ('component', )
+    readonly_fields = ('created_at', 'updated_at')
+
+
 @admin.register(Product)
 class ProductAdmin(admin.ModelAdmin):
     list_display = ('name', 'category', 'is_available', 'created_at', 'updated_at')
     list_filter = ('is_available', )
     readonly_fields = ('created_at', 'updated_at')
-    inlines = [RecipeIngredientInlineAdmin]
+    search_fields = ('name', )
+    inlines = [RecipeIngredientInlineAdmin, RecipeComponentInlineAdmin]
@@ -0,0 +1,79 @@
+# Path from a restaurant lot to each upstream lot of its lineage
+LINEAGE_LOOKUPS = {
+    'restaurant_id': 'restaurant_id',
+    'package_material_id': 'package_material_id',
+    'ready_material_id': 'package_material__ready_material_id',
+    'raw_material_id': (
+        'package_material__ready_material__workstation_prepared_material__'
+        'workstation_raw_material_consumption__raw_material_id'
+    ),
+    'supplier_id': (
+        'package_material__ready_material__workstation_prepared_material__'
+        'workstation_raw_material_consumption__raw_material__supplier_id'
+    ),
+}
+
+
+def get_lots_lineage(lot_ids) -> dict:
+    """
+    Resolve the upstream lots of many restaurant lots with one joined query.
+    Returns a dictionary with the restaurant lot id as key and a {field: id} mapping as value.
+    """
+    from restaurant.models import RestaurantPackagedMaterial
+
+    fields = list(LINEAGE_LOOKUPS)
+    return {
+        lot_id: dict(zip(fields, values))
+        for lot_id, *values in RestaurantPackagedMaterial.objects.filter(
+            pk__in=set(lot_ids)
+        ).values_list('pk', *LINEAGE_LOOKUPS.values())
+    }
+
+
+def record_lineage(consumptions) -> list:
+    """
+    Write the lineage rows of many saved consumption records, with one query for their lots and one insert.
+
+    Args:
+        - consumptions: Iterable of saved `RestaurantPackagedMaterialConsumption`.
+
+    Returns:
+        - The created lineage records.
+    """
+    from restaurant.models import MaterialLineage
+
+    consumptions = list(consumptions)
+    if not consumptions:
+        return []
+
+    lineages = get_lots_lineage(consumption.restaurant_package_material_id for consumption in consumptions)
+    return MaterialLineage.objects.bulk_create([
+        MaterialLineage(
+            consumption_id=consumption.pk,
+            order_item_id=consumption.order_item_id,
+            material_id=consumption.material_id,
+            restaurant_package_material_id=consumption.restaurant_package_material_id,
+            quantity_consumed=consumption.quantity_consumed,
+            **lineages[consumption.restaurant_package_material_id]
+        )
+        for consumption in consumptions
+    ])
+
+
+def backfill_lineage(batch_size: int = 1000) -> int:
+    """
+    Write the lineage rows of the consumption records that have none, `batch_size` records at a time.
+    Returns the number of lineage rows written.
+    """
+    from restaurant.models import RestaurantPackagedMaterialConsumption
+
+    count = 0
+    while True:
+        consumptions = list(
+            RestaurantPackagedMaterialConsumption.objects.filter(lineage__isnull=True).only(
+                'pk', 'order_item_id', 'material_id', 'restaurant_package_material_id', 'quantity_consumed'
+            )[:batch_size]
+        )
+        if not consumptions:
+            return count
+        count += len(record_lineage(consumptions))
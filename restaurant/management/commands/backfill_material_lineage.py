@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from restaurant.lineage import backfill_lineage
+
+
+class Command(BaseCommand):
+    help = 'Write the missing material lineage rows of the restaurant packaged material consumptions.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Number of consumptions handled per batch.'
+        )
+
+    def handle(self, *args, **options):
+        count = backfill_lineage(batch_size=options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f'Wrote {count} material lineage rows.'))
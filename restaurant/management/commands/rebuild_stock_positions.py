@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from restaurant.models import RestaurantStockPosition
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the restaurant stock positions from the restaurant packaged material lots.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--restaurant', action='append', dest='restaurants',
+            help='Only rebuild the positions of this restaurant id, can be repeated.'
+        )
+
+    def handle(self, *args, **options):
+        count = RestaurantStockPosition.objects.rebuild(restaurant_ids=options['restaurants'])
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} stock positions.'))
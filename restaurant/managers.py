@@ -0,0 +1,252 @@
+from django.core.exceptions import ValidationError
+from django.db import models, transaction
+from django.db.models import Case, F, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+
+def get_deltas_case(deltas: dict) -> tuple:
+    """
+    Build the filter matching many (restaurant_id, material_id) keys and the expression picking the delta of each.
+    """
+    key_filter = Q()
+    whens = []
+    for (restaurant_id, material_id), delta in deltas.items():
+        key = Q(restaurant_id=restaurant_id, material_id=material_id)
+        key_filter |= key
+        whens.append(When(key, then=Value(delta)))
+    return key_filter, Case(*whens, default=Value(0), output_field=models.IntegerField())
+
+
+class RestaurantStockPositionManager(models.Manager):
+
+    def apply_deltas(self, deltas: dict) -> None:
+        """
+        Add quantity deltas to the stock positions in two statements, whatever the number of positions.
+
+        Missing positions are only created for positive deltas, so removing stock from a restaurant or a
+        material that is being deleted never inserts a row pointing to it.
+
+        Args:
+            - deltas: Mapping of (restaurant_id, material_id) to the quantity to add, can be negative.
+        """
+        deltas = {
+            (restaurant_id, material_id): delta
+            for (restaurant_id, material_id), delta in deltas.items()
+            if restaurant_id is not None and delta
+        }
+        if not deltas:
+            return
+
+        self.bulk_create(
+            [
+                self.model(restaurant_id=restaurant_id, material_id=material_id)
+                for (restaurant_id, material_id), delta in deltas.items()
+                if delta > 0
+            ],
+            ignore_conflicts=True
+        )
+
+        key_filter, delta = get_deltas_case(deltas)
+        self.filter(key_filter).update(
+            quantity=F('quantity') + delta,
+            version=F('version') + 1,
+            updated_at=timezone.now()
+        )
+
+    def get_quantities(self, restaurant_id, material_ids) -> dict:
+        """
+        Read the stock of many materials of a restaurant with one indexed lookup.
+        Returns a dictionary with material_id as key and the quantity as value.
+        """
+        return dict(
+            self.filter(
+                restaurant_id=restaurant_id,
+                material_id__in=set(material_ids)
+            ).values_list('material_id', 'quantity')
+        )
+
+    def get_available(self, today=None):
+        """
+        Build the expression of the quantity of a position that is neither reserved nor held by expired lots.
+        Lots expired but not written off by the sweep yet are subtracted by a correlated sum served by the lot scan
+        index, so availability follows the same expiry rule as consumption, see `ExpiringLotQuerySet`.
+        """
+        from restaurant.models import RestaurantPackagedMaterial
+
+        expired_quantity = Subquery(
+            RestaurantPackagedMaterial.objects.expired(today).filter(
+                restaurant_id=OuterRef('restaurant_id'),
+                material_id=OuterRef('material_id')
+            ).values('restaurant_id', 'material_id').annotate(
+                total=Sum('current_package_quantity')
+            ).values('total')
+        )
+        return F('quantity') - F('reserved_quantity') - Coalesce(expired_quantity, 0)
+
+    def with_available(self, today=None):
+        """
+        Annotate the positions with their `available` quantity, see `get_available`.
+        """
+        return self.annotate(available=self.get_available(today))
+
+    def get_available_quantities(self, restaurant_id, material_ids, order_id=None) -> dict:
+        """
+        Read the quantity of many materials of a restaurant that is neither reserved nor expired, with one indexed
+        lookup. The reservations held by `order_id`, if given, are counted as available to it.
+        Returns a dictionary with material_id as key and the available quantity as value.
+        """
+        from restaurant.models import StockReservation
+
+        available = self.get_available()
+        if order_id is not None:
+            available = available + Coalesce(
+                Subquery(
+                    StockReservation.objects.filter(
+                        order_id=order_id,
+                        restaurant_id=OuterRef('restaurant_id'),
+                        material_id=OuterRef('material_id')
+                    ).values('quantity')[:1]
+                ),
+                0
+            )
+
+        return dict(
+            self.filter(
+                restaurant_id=restaurant_id,
+                material_id__in=set(material_ids)
+            ).annotate(available=available).values_list('material_id', 'available')
+        )
+
+    def reserve(self, restaurant_id, quantities: dict, max_retries: int) -> dict:
+        """
+        Reserve quantities of many materials of a restaurant without locking their positions.
+
+        Each position is read along with its version, then updated only if the version did not change in between,
+        so two orders racing for the same stock cannot both reserve it. Positions whose update lost the race are
+        read again and retried, up to `max_retries` rounds. Must run in a transaction, so a shortage found after
+        some positions were reserved can be rolled back by the caller.
+
+        Args:
+            - restaurant_id: The restaurant whose stock is reserved.
+            - quantities: Mapping of material_id to the quantity to reserve.
+            - max_retries: Number of read and update rounds before giving up.
+
+        Returns:
+            - A dictionary with material_id as key and a (required, available) tuple as value for short materials,
+              empty when everything was reserved.
+
+        Raises:
+            - ValidationError: If the positions kept changing for `max_retries` rounds.
+        """
+        pending = {material_id: quantity for material_id, quantity in quantities.items() if quantity > 0}
+
+        for _ in range(max_retries):
+            if not pending:
+                return {}
+
+            positions = {
+                material_id: (pk, available, version)
+                for material_id, pk, available, version in self.with_available().filter(
+                    restaurant_id=restaurant_id,
+                    material_id__in=pending.keys()
+                ).values_list('material_id', 'pk', 'available', 'version')
+            }
+
+            shortages = {
+                material_id: (quantity, positions[material_id][1] if material_id in positions else 0)
+                for material_id, quantity in pending.items()
+                if material_id not in positions or positions[material_id][1] < quantity
+            }
+            if shortages:
+                return shortages
+
+            now = timezone.now()
+            for material_id, quantity in list(pending.items()):
+                pk, _, version = positions[material_id]
+                swapped = self.filter(pk=pk, version=version).update(
+                    reserved_quantity=F('reserved_quantity') + quantity,
+                    version=F('version') + 1,
+                    updated_at=now
+                )
+                if swapped:
+                    del pending[material_id]
+
+        if pending:
+            raise ValidationError({
+                'ingredients': 'The stock is being updated by other orders, please try again.'
+            })
+        return {}
+
+    def release(self, deltas: dict) -> None:
+        """
+        Give reserved quantities back to the stock positions in one statement.
+
+        Args:
+            - deltas: Mapping of (restaurant_id, material_id) to the reserved quantity to release.
+        """
+        deltas = {key: delta for key, delta in deltas.items() if delta}
+        if not deltas:
+            return
+
+        key_filter, delta = get_deltas_case(deltas)
+        self.filter(key_filter).update(
+            reserved_quantity=F('reserved_quantity') - delta,
+            version=F('version') + 1,
+            updated_at=timezone.now()
+        )
+
+    @transaction.atomic
+    def rebuild(self, restaurant_ids=None) -> int:
+        """
+        Recompute the stock positions from the restaurant packaged material lots and the stock reservations.
+
+        Existing positions are locked and updated in place with their version bumped, so a reservation that read a
+        position before the rebuild fails its optimistic check and reads it again. Positions without any lot or
+        reservation left are zeroed rather than deleted, like the incremental updates do.
+        Returns the number of positions written.
+        """
+        from restaurant.models import RestaurantPackagedMaterial, StockReservation
+
+        positions = self.select_for_update()
+        lots = RestaurantPackagedMaterial.objects.filter(restaurant__isnull=False)
+        reservations = StockReservation.objects.all()
+        if restaurant_ids is not None:
+            positions = positions.filter(restaurant_id__in=restaurant_ids)
+            lots = lots.filter(restaurant_id__in=restaurant_ids)
+            reservations = reservations.filter(restaurant_id__in=restaurant_ids)
+
+        totals = {
+            (restaurant_id, material_id): [total, 0]
+            for restaurant_id, material_id, total in lots.values('restaurant_id', 'material_id').annotate(
+                total=Sum('current_package_quantity', default=0)
+            ).values_list('restaurant_id', 'material_id', 'total')
+        }
+        for restaurant_id, material_id, reserved in reservations.values('restaurant_id', 'material_id').annotate(
+            reserved=Sum('quantity')
+        ).values_list('restaurant_id', 'material_id', 'reserved'):
+            totals.setdefault((restaurant_id, material_id), [0, 0])[1] = reserved
+
+        now = timezone.now()
+        existing = list(positions.only('pk', 'restaurant_id', 'material_id'))
+        for position in existing:
+            position.quantity, position.reserved_quantity = totals.pop(
+                (position.restaurant_id, position.material_id), (0, 0)
+            )
+            position.version = F('version') + 1
+            position.updated_at = now
+        self.bulk_update(existing, ['quantity', 'reserved_quantity', 'version', 'updated_at'], batch_size=1000)
+
+        created = self.bulk_create(
+            [
+                self.model(
+                    restaurant_id=restaurant_id,
+                    material_id=material_id,
+                    quantity=quantity,
+                    reserved_quantity=reserved_quantity
+                )
+                for (restaurant_id, material_id), (quantity, reserved_quantity) in totals.items()
+            ],
+            batch_size=1000
+        )
+        return len(existing) + len(created)
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.18 on 2026-10-17 23:59
+
+import accounts.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def build_stock_positions(apps, schema_editor):
+    RestaurantPackagedMaterial = apps.get_model('restaurant', 'RestaurantPackagedMaterial')
+    RestaurantStockPosition = apps.get_model('restaurant', 'RestaurantStockPosition')
+    id_field = accounts.fields.PrefixedIDField(prefix='RS-POS')
+
+    totals = RestaurantPackagedMaterial.objects.filter(restaurant__isnull=False).values(
+        'restaurant_id', 'material_id'
+    ).annotate(total=models.Sum('current_package_quantity', default=0))
+
+    RestaurantStockPosition.objects.bulk_create(
+        [
+            RestaurantStockPosition(
+                id=id_field.generate_id(),
+                restaurant_id=row['restaurant_id'],
+                material_id=row['material_id'],
+                quantity=row['total']
+            )
+            for row in totals
+        ],
+        batch_size=1000
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0012_material_created_at_material_updated_at'),
+        ('restaurant', '0004_alter_restaurantpackagedmaterial_finished_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RestaurantStockPosition',
+            fields=[
+                ('id', accounts.fields.PrefixedIDField(editable=False, max_length=57, primary_key=True, serialize=False, unique=True, verbose_name='Stock Position ID')),
+                ('quantity', models.IntegerField(default=0, verbose_name='Quantity')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_positions', to='inventory.material', verbose_name='Material')),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_positions', to='restaurant.restaurant', verbose_name='Restaurant')),
+            ],
+            options={
+                'verbose_name': 'Restaurant Stock Position',
+                'verbose_name_plural': 'Restaurant Stock Positions',
+                'unique_together': {('restaurant', 'material')},
+            },
+        ),
+        migrations.RunPython(build_stock_positions, migrations.RunPython.noop),
+    ]
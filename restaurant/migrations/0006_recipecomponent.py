@@ -0,0 +1,35 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:07
+
+import accounts.fields
+import accounts.mixins
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0005_restaurantstockposition'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeComponent',
+            fields=[
+                ('id', accounts.fields.PrefixedIDField(editable=False, max_length=58, primary_key=True, serialize=False, unique=True, verbose_name='Recipe Component ID')),
+                ('quantity_consumed', models.PositiveIntegerField(help_text='Number of component units used for one unit of the product', validators=[django.core.validators.MinValueValidator(1)], verbose_name='Quantity Consumed')),
+                ('notes', models.TextField(blank=True, verbose_name='Notes')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+                ('component', models.ForeignKey(help_text='A product prepared in-house, such as a sauce or a dough, used by this recipe', on_delete=django.db.models.deletion.CASCADE, related_name='used_in_components', to='restaurant.product', verbose_name='Component')),
+                ('product', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recipe_components', to='restaurant.product', verbose_name='Product')),
+            ],
+            options={
+                'verbose_name': 'Recipe Component',
+                'verbose_name_plural': 'Recipe Components',
+                'unique_together': {('product', 'component')},
+            },
+            bases=(accounts.mixins.FieldTrackerMixin, models.Model),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:10
+
+import accounts.fields
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0012_material_created_at_material_updated_at'),
+        ('orders', '0005_alter_orderitem_unique_together'),
+        ('restaurant', '0006_recipecomponent'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurantstockposition',
+            name='reserved_quantity',
+            field=models.IntegerField(default=0, help_text='Quantity held by confirmed orders, not consumed yet', verbose_name='Reserved Quantity'),
+        ),
+        migrations.AddField(
+            model_name='restaurantstockposition',
+            name='version',
+            field=models.PositiveIntegerField(default=0, help_text='Incremented on every change, guards reservations', verbose_name='Version'),
+        ),
+        migrations.CreateModel(
+            name='StockReservation',
+            fields=[
+                ('id', accounts.fields.PrefixedIDField(editable=False, max_length=57, primary_key=True, serialize=False, unique=True, verbose_name='Stock Reservation ID')),
+                ('quantity', models.PositiveIntegerField(validators=[django.core.validators.MinValueValidator(1)], verbose_name='Quantity')),
+                ('expires_at', models.DateTimeField(blank=True, help_text='The reservation is released by the sweeper after this date', null=True, verbose_name='Expires At')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Updated At')),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_reservations', to='inventory.material', verbose_name='Material')),
+                ('order', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_reservations', to='orders.order', verbose_name='Order')),
+                ('restaurant', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stock_reservations', to='restaurant.restaurant', verbose_name='Restaurant')),
+            ],
+            options={
+                'verbose_name': 'Stock Reservation',
+                'verbose_name_plural': 'Stock Reservations',
+                'indexes': [models.Index(fields=['expires_at'], name='rs_res_expires_at_index')],
+                'unique_together': {('order', 'material')},
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:13
+
+import accounts.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0012_material_created_at_material_updated_at'),
+        ('orders', '0005_alter_orderitem_unique_together'),
+        ('restaurant', '0007_stock_reservations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MaterialLineage',
+            fields=[
+                ('id', accounts.fields.PrefixedIDField(editable=False, max_length=54, primary_key=True, serialize=False, unique=True, verbose_name='Lineage ID')),
+                ('quantity_consumed', models.PositiveIntegerField(verbose_name='Quantity Consumed')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Created At')),
+                ('consumption', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='lineage', to='restaurant.restaurantpackagedmaterialconsumption', verbose_name='Consumption')),
+                ('material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lineages', to='inventory.material', verbose_name='Material')),
+                ('order_item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='material_lineages', to='orders.orderitem', verbose_name='Order Item')),
+                ('package_material', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='lineages', to='inventory.packagedmaterial', verbose_name='Package Material')),
+                ('raw_material', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='lineages', to='inventory.rawmaterial', verbose_name='Raw Material')),
+                ('ready_material', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='lineages', to='inventory.readymaterial', verbose_name='Ready Material')),
+                ('restaurant', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='material_lineages', to='restaurant.restaurant', verbose_name='Restaurant')),
+                ('restaurant_package_material', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lineages', to='restaurant.restaurantpackagedmaterial', verbose_name='Restaurant Package Material')),
+                ('supplier', models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='lineages', to='inventory.supplier', verbose_name='Supplier')),
+            ],
+            options={
+                'verbose_name': 'Material Lineage',
+                'verbose_name_plural': 'Material Lineages',
+            },
+        ),
+    ]
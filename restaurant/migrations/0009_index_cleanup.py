@@ -0,0 +1,116 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:22
+
+import accounts.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_index_cleanup'),
+        ('inventory', '0013_index_cleanup'),
+        ('orders', '0006_index_cleanup'),
+        ('restaurant', '0008_materiallineage'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='product',
+            name='prod_id_index',
+        ),
+        migrations.RemoveIndex(
+            model_name='productcategory',
+            name='pcat_id_index',
+        ),
+        migrations.RemoveIndex(
+            model_name='recipeingredient',
+            name='ing_id_index',
+        ),
+        migrations.RemoveIndex(
+            model_name='restaurant',
+            name='rs_id_index',
+        ),
+        migrations.RemoveIndex(
+            model_name='restaurantpackagedmaterial',
+            name='rpm_id_index',
+        ),
+        migrations.RemoveIndex(
+            model_name='restaurantpackagedmaterialconsumption',
+            name='cons_id_index',
+        ),
+        migrations.AlterField(
+            model_name='materiallineage',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=54, primary_key=True, serialize=False, verbose_name='Lineage ID'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=55, primary_key=True, serialize=False, verbose_name='Product ID'),
+        ),
+        migrations.AlterField(
+            model_name='productcategory',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=56, primary_key=True, serialize=False, verbose_name='Product ID'),
+        ),
+        migrations.AlterField(
+            model_name='recipecomponent',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=58, primary_key=True, serialize=False, verbose_name='Recipe Component ID'),
+        ),
+        migrations.AlterField(
+            model_name='recipecomponent',
+            name='product',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='recipe_components', to='restaurant.product', verbose_name='Product'),
+        ),
+        migrations.AlterField(
+            model_name='recipeingredient',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=54, primary_key=True, serialize=False, verbose_name='Product ID'),
+        ),
+        migrations.AlterField(
+            model_name='restaurant',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=53, primary_key=True, serialize=False, verbose_name='Restaurant ID'),
+        ),
+        migrations.AlterField(
+            model_name='restaurantpackagedmaterial',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=54, primary_key=True, serialize=False, verbose_name='Restaurant Package Material ID'),
+        ),
+        migrations.AlterField(
+            model_name='restaurantpackagedmaterial',
+            name='restaurant',
+            field=models.ForeignKey(db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='restaurant_package_materials', to='restaurant.restaurant', verbose_name='Restaurant'),
+        ),
+        migrations.AlterField(
+            model_name='restaurantpackagedmaterialconsumption',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=55, primary_key=True, serialize=False, verbose_name='Consumption ID'),
+        ),
+        migrations.AlterField(
+            model_name='restaurantstockposition',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=57, primary_key=True, serialize=False, verbose_name='Stock Position ID'),
+        ),
+        migrations.AlterField(
+            model_name='restaurantstockposition',
+            name='restaurant',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='stock_positions', to='restaurant.restaurant', verbose_name='Restaurant'),
+        ),
+        migrations.AlterField(
+            model_name='stockreservation',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=57, primary_key=True, serialize=False, verbose_name='Stock Reservation ID'),
+        ),
+        migrations.AlterField(
+            model_name='stockreservation',
+            name='order',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='stock_reservations', to='orders.order', verbose_name='Order'),
+        ),
+        migrations.AddIndex(
+            model_name='restaurantpackagedmaterial',
+            index=models.Index(fields=['restaurant', 'material', 'current_package_quantity', 'expiration_date', 'created_at'], name='rpm_lot_scan_index'),
+        ),
+    ]
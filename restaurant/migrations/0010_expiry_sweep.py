@@ -0,0 +1,24 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0004_index_cleanup'),
+        ('inventory', '0015_expiry_sweep'),
+        ('restaurant', '0009_index_cleanup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurantpackagedmaterial',
+            name='expired_at',
+            field=models.DateTimeField(blank=True, help_text='When the expiry sweep wrote the lot off', null=True, verbose_name='Expired At'),
+        ),
+        migrations.AddIndex(
+            model_name='restaurantpackagedmaterial',
+            index=models.Index(condition=models.Q(('expired_at__isnull', True)), fields=['expiration_date'], name='rpm_expiry_index'),
+        ),
+    ]
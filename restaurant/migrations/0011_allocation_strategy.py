@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:44
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0010_expiry_sweep'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='restaurant',
+            name='allocation_strategy',
+            field=models.CharField(choices=[('fifo', 'First in, first out'), ('fefo', 'First expired, first out'), ('fewest_lots', 'Fewest lots'), ('expiry_risk', 'Expiry risk weighted')], default='fefo', help_text='Order in which the lots of the restaurant are consumed', max_length=20, verbose_name='Allocation Strategy'),
+        ),
+    ]
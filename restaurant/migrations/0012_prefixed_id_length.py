@@ -0,0 +1,64 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:25
+
+import accounts.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('restaurant', '0011_allocation_strategy'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='materiallineage',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=56, primary_key=True, serialize=False, verbose_name='Lineage ID'),
+        ),
+        migrations.AlterField(
+            model_name='product',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=57, primary_key=True, serialize=False, verbose_name='Product ID'),
+        ),
+        migrations.AlterField(
+            model_name='productcategory',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=58, primary_key=True, serialize=False, verbose_name='Product ID'),
+        ),
+        migrations.AlterField(
+            model_name='recipecomponent',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=60, primary_key=True, serialize=False, verbose_name='Recipe Component ID'),
+        ),
+        migrations.AlterField(
+            model_name='recipeingredient',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=56, primary_key=True, serialize=False, verbose_name='Product ID'),
+        ),
+        migrations.AlterField(
+            model_name='restaurant',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=55, primary_key=True, serialize=False, verbose_name='Restaurant ID'),
+        ),
+        migrations.AlterField(
+            model_name='restaurantpackagedmaterial',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=56, primary_key=True, serialize=False, verbose_name='Restaurant Package Material ID'),
+        ),
+        migrations.AlterField(
+            model_name='restaurantpackagedmaterialconsumption',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=57, primary_key=True, serialize=False, verbose_name='Consumption ID'),
+        ),
+        migrations.AlterField(
+            model_name='restaurantstockposition',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=59, primary_key=True, serialize=False, verbose_name='Stock Position ID'),
+        ),
+        migrations.AlterField(
+            model_name='stockreservation',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=59, primary_key=True, serialize=False, verbose_name='Stock Reservation ID'),
+        ),
+    ]
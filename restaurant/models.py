@@ -1,11 +1,15 @@
-from django.db import models
+from django.db import models, transaction
 from django.core.validators import ValidationError, MinValueValidator
 from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from accounts.fields import PrefixedIDField
+from accounts.mixins import FieldTrackerMixin
 from accounts.models import TransporterUser
-from inventory.enums import Unit
+from inventory.enums import Unit, MovementKind, AllocationStrategy
+from inventory.expiry import ExpiringLotQuerySet
+from inventory.stock import get_movement, record_ledger_movements
+from restaurant.managers import RestaurantStockPositionManager
 
 
 class Restaurant(models.Model):
@@ -13,24 +17,26 @@ class Restaurant(models.Model):
     name = models.CharField(max_length=255, verbose_name=_('Name'))
     description = models.TextField(null=True, blank=True, verbose_name=_('Description'))
     location = models.CharField(max_length=255, verbose_name=_('Location'))
+    allocation_strategy = models.CharField(
+        max_length=20, choices=AllocationStrategy.choices, default=AllocationStrategy.FEFO,
+        verbose_name=_('Allocation Strategy'),
+        help_text=_('Order in which the lots of the restaurant are consumed')
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Created At'))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Updated At'))
 
     class Meta:
         verbose_name = _('Restaurant')
         verbose_name_plural = _('Restaurant')
-        indexes = [
-            models.Index(fields=['id'], name='rs_id_index')
-        ]
 
     def __str__(self):
         return self.name
 
 
-class RestaurantPackagedMaterial(models.Model):
+class RestaurantPackagedMaterial(FieldTrackerMixin, models.Model):
     id = PrefixedIDField(prefix='RPM', verbose_name=_('Restaurant Package Material ID'))
 
-    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, null=True,
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, null=True, db_index=False,
                                    related_name='restaurant_package_materials', verbose_name=_('Restaurant'))
     material = models.ForeignKey('inventory.Material', on_delete=models.CASCADE, verbose_name=_('Material'))
     package_material = models.OneToOneField('inventory.PackagedMaterial', on_delete=models.CASCADE, null=True,
@@ -54,15 +60,28 @@ class RestaurantPackagedMaterial(models.Model):
     storage_temperature = models.PositiveIntegerField(null=True, blank=True, verbose_name=_('Stored Temperature'))
 
     finished_date = models.DateTimeField(null=True, blank=True, verbose_name=_('Delivery Date'))
+    expired_at = models.DateTimeField(null=True, blank=True, verbose_name=_('Expired At'),
+                                      help_text=_('When the expiry sweep wrote the lot off'))
 
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Created At'))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Updated At'))
 
+    objects = ExpiringLotQuerySet.as_manager()
+
+    tracked_fields = ('restaurant', 'material', 'current_package_quantity')
+
     class Meta:
         verbose_name = _('Restaurant Packaged Material')
         verbose_name_plural = _('Restaurant Packaged Materials')
         indexes = [
-            models.Index(fields=['id'], name='rpm_id_index')
+            # Serves the candidate lots scan of `consume_ingredients`, and every lookup by restaurant
+            models.Index(
+                fields=['restaurant', 'material', 'current_package_quantity', 'expiration_date', 'created_at'],
+                name='rpm_lot_scan_index'
+            ),
+            # Serves the expiry sweep, only the lots it did not write off yet are indexed
+            models.Index(fields=['expiration_date'], condition=models.Q(expired_at__isnull=True),
+                         name='rpm_expiry_index')
         ]
 
     def clean(self):
@@ -78,7 +97,40 @@ class RestaurantPackagedMaterial(models.Model):
         if not self.pk and self.current_package_quantity is None:
             self.current_package_quantity = self.initial_package_quantity
         self.clean()
-        super().save(*args, **kwargs)
+        stock_deltas = self.get_stock_deltas()
+        movement = self.get_movement()
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            RestaurantStockPosition.objects.apply_deltas(stock_deltas)
+            if movement is not None:
+                movement.lot_id = self.pk
+                record_ledger_movements([movement])
+
+    def get_stock_key(self) -> tuple:
+        return self.restaurant_id, self.material_id
+
+    def get_stock_deltas(self) -> dict:
+        """
+        Get the changes this lot brings to the restaurant stock positions since it was loaded.
+        """
+        deltas = {self.get_stock_key(): self.current_package_quantity or 0}
+        if not self._state.adding:
+            old_key = self.old_value('restaurant'), self.old_value('material')
+            deltas[old_key] = deltas.get(old_key, 0) - (self.old_value('current_package_quantity') or 0)
+        return deltas
+
+    def get_movement(self):
+        """
+        Get the ledger movement of the quantity change this lot brings since it was loaded, a transfer from its
+        packaged material when it is new, None when its quantity did not change.
+        """
+        if self._state.adding:
+            return get_movement(RestaurantPackagedMaterial, self.pk, self.current_package_quantity or 0,
+                                MovementKind.TRANSFER, self.package_material_id)
+
+        old_quantity = self.old_value('current_package_quantity', default=self.current_package_quantity)
+        delta = (self.current_package_quantity or 0) - (old_quantity or 0)
+        return get_movement(RestaurantPackagedMaterial, self.pk, delta, MovementKind.ADJUSTMENT) if delta else None
 
     def reduce_current_package_quantity(self, quantity: int) -> None:
         if quantity > self.current_package_quantity:
@@ -91,6 +143,65 @@ class RestaurantPackagedMaterial(models.Model):
         self.save()
 
 
+class RestaurantStockPosition(models.Model):
+    id = PrefixedIDField(prefix='RS-POS', verbose_name=_('Stock Position ID'))
+
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='stock_positions',
+                                   db_index=False, verbose_name=_('Restaurant'))
+    material = models.ForeignKey('inventory.Material', on_delete=models.CASCADE, related_name='stock_positions',
+                                 verbose_name=_('Material'))
+    quantity = models.IntegerField(default=0, verbose_name=_('Quantity'))
+    reserved_quantity = models.IntegerField(default=0, verbose_name=_('Reserved Quantity'),
+                                            help_text=_('Quantity held by confirmed orders, not consumed yet'))
+    version = models.PositiveIntegerField(default=0, verbose_name=_('Version'),
+                                          help_text=_('Incremented on every change, guards reservations'))
+
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Created At'))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Updated At'))
+
+    objects = RestaurantStockPositionManager()
+
+    class Meta:
+        verbose_name = _('Restaurant Stock Position')
+        verbose_name_plural = _('Restaurant Stock Positions')
+        unique_together = ('restaurant', 'material')
+
+    def __str__(self):
+        return f'{self.restaurant_id} / {self.material_id}: {self.quantity}'
+
+    @property
+    def available_quantity(self):
+        return self.quantity - self.reserved_quantity
+
+
+class StockReservation(models.Model):
+    id = PrefixedIDField(prefix='RS-RES', verbose_name=_('Stock Reservation ID'))
+
+    order = models.ForeignKey('orders.Order', on_delete=models.CASCADE, related_name='stock_reservations',
+                              db_index=False, verbose_name=_('Order'))
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, related_name='stock_reservations',
+                                   verbose_name=_('Restaurant'))
+    material = models.ForeignKey('inventory.Material', on_delete=models.CASCADE, related_name='stock_reservations',
+                                 verbose_name=_('Material'))
+    quantity = models.PositiveIntegerField(validators=[MinValueValidator(1)], verbose_name=_('Quantity'))
+    expires_at = models.DateTimeField(null=True, blank=True, verbose_name=_('Expires At'),
+                                      help_text=_('The reservation is released by the sweeper after this date'))
+
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Created At'))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Updated At'))
+
+    class Meta:
+        verbose_name = _('Stock Reservation')
+        verbose_name_plural = _('Stock Reservations')
+        unique_together = ('order', 'material')
+        indexes = [
+            models.Index(fields=['expires_at'], name='rs_res_expires_at_index')
+        ]
+
+    def __str__(self):
+        return f'{self.order_id} / {self.material_id}: {self.quantity}'
+
+
 class RestaurantPackagedMaterialConsumption(models.Model):
     id = PrefixedIDField(prefix='CONS', verbose_name=_('Consumption ID'))
 
@@ -114,9 +225,37 @@ class RestaurantPackagedMaterialConsumption(models.Model):
     class Meta:
         verbose_name = _('Material Consumption')
         verbose_name_plural = _('Material Consumptions')
-        indexes = [
-            models.Index(fields=['id'], name='cons_id_index')
-        ]
+
+
+class MaterialLineage(models.Model):
+    id = PrefixedIDField(prefix='LIN', verbose_name=_('Lineage ID'))
+
+    consumption = models.OneToOneField(RestaurantPackagedMaterialConsumption, on_delete=models.CASCADE,
+                                       related_name='lineage', verbose_name=_('Consumption'))
+    order_item = models.ForeignKey('orders.OrderItem', on_delete=models.CASCADE, related_name='material_lineages',
+                                   verbose_name=_('Order Item'))
+    restaurant = models.ForeignKey(Restaurant, on_delete=models.CASCADE, null=True, related_name='material_lineages',
+                                   verbose_name=_('Restaurant'))
+    material = models.ForeignKey('inventory.Material', on_delete=models.CASCADE, related_name='lineages',
+                                 verbose_name=_('Material'))
+    restaurant_package_material = models.ForeignKey(RestaurantPackagedMaterial, on_delete=models.CASCADE,
+                                                    related_name='lineages',
+                                                    verbose_name=_('Restaurant Package Material'))
+    package_material = models.ForeignKey('inventory.PackagedMaterial', on_delete=models.CASCADE, null=True,
+                                         related_name='lineages', verbose_name=_('Package Material'))
+    ready_material = models.ForeignKey('inventory.ReadyMaterial', on_delete=models.CASCADE, null=True,
+                                       related_name='lineages', verbose_name=_('Ready Material'))
+    raw_material = models.ForeignKey('inventory.RawMaterial', on_delete=models.CASCADE, null=True,
+                                     related_name='lineages', verbose_name=_('Raw Material'))
+    supplier = models.ForeignKey('inventory.Supplier', on_delete=models.CASCADE, null=True, related_name='lineages',
+                                 verbose_name=_('Supplier'))
+    quantity_consumed = models.PositiveIntegerField(verbose_name=_('Quantity Consumed'))
+
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Created At'))
+
+    class Meta:
+        verbose_name = _('Material Lineage')
+        verbose_name_plural = _('Material Lineages')
 
 
 class ProductCategory(models.Model):
@@ -129,9 +268,6 @@ class ProductCategory(models.Model):
     class Meta:
         verbose_name = _('Product Category')
         verbose_name_plural = _('Product Categories')
-        indexes = [
-            models.Index(fields=['id'], name='pcat_id_index')
-        ]
 
     def __str__(self):
         return self.name
@@ -150,15 +286,12 @@ class Product(models.Model):
     class Meta:
         verbose_name = _('Product')
         verbose_name_plural = _('Products')
-        indexes = [
-            models.Index(fields=['id'], name='prod_id_index')
-        ]
 
     def __str__(self):
         return self.name
 
 
-class RecipeIngredient(models.Model):
+class RecipeIngredient(FieldTrackerMixin, models.Model):
     id = PrefixedIDField(prefix='ING', verbose_name=_('Product ID'))
     product = models.ForeignKey(
         Product,
@@ -175,9 +308,55 @@ class RecipeIngredient(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Created At'))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Updated At'))
 
+    tracked_fields = ('product',)
+
     class Meta:
         verbose_name = _('Recipe Ingredient')
         verbose_name_plural = _('Recipe Ingredients')
-        indexes = [
-            models.Index(fields=['id'], name='ing_id_index')
-        ]
+
+
+class RecipeComponent(FieldTrackerMixin, models.Model):
+    id = PrefixedIDField(prefix='ING-SUB', verbose_name=_('Recipe Component ID'))
+    product = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='recipe_components',
+        db_index=False,
+        verbose_name=_('Product')
+    )
+    component = models.ForeignKey(
+        Product,
+        on_delete=models.CASCADE,
+        related_name='used_in_components',
+        verbose_name=_('Component'),
+        help_text=_('A product prepared in-house, such as a sauce or a dough, used by this recipe')
+    )
+    quantity_consumed = models.PositiveIntegerField(
+        validators=[MinValueValidator(1)],
+        verbose_name=_('Quantity Consumed'),
+        help_text=_('Number of component units used for one unit of the product')
+    )
+    notes = models.TextField(blank=True, verbose_name=_('Notes'))
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Created At'))
+    updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Updated At'))
+
+    tracked_fields = ('product',)
+
+    class Meta:
+        verbose_name = _('Recipe Component')
+        verbose_name_plural = _('Recipe Components')
+        unique_together = ('product', 'component')
+
+    def clean(self):
+        from restaurant.recipes import get_sub_products
+
+        # Validate the recipe graph stays acyclic
+        if self.product_id and self.component_id:
+            if self.product_id == self.component_id or self.product_id in get_sub_products([self.component_id]):
+                raise ValidationError(
+                    {'component': _('A product cannot be a component of itself, even indirectly.')}
+                )
+
+    def save(self, *args, **kwargs):
+        self.clean()
+        super().save(*args, **kwargs)
@@ -0,0 +1,290 @@
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+
+
+class RecipeCache:
+    """
+    Two-level cache of product bills of materials, i.e. {material_id: quantity} mappings.
+
+    Lookups go through a process-local LRU first, then through Django's cache framework, and only the products
+    missing from both are loaded from the database, all of them in one query. Local entries expire after
+    `local_ttl` seconds so that invalidations made by other processes are picked up.
+
+    Shared entries are keyed by a version token of their product, which invalidation replaces, so they are never
+    deleted but become unreachable and expire after `timeout` seconds. A bill of materials is only written if the
+    version of its product did not change while it was loaded, so a load racing with an invalidation cannot store
+    a stale entry over the newer state.
+
+    Products may consume other products through `RecipeComponent`, the cached bill of materials is always the
+    flattened one, so that reading it costs the same whatever the depth of the recipe. Changing a recipe must
+    therefore invalidate the products using it as well, see `get_parent_products`.
+    """
+
+    key_prefix = 'restaurant:recipe:bom'
+    version_key_prefix = 'restaurant:recipe:version'
+
+    def __init__(self, maxsize: int, local_ttl: float, timeout=None):
+        self.maxsize = maxsize
+        self.local_ttl = local_ttl
+        self.timeout = timeout
+        self.local = OrderedDict()
+        self.lock = threading.Lock()
+        self.stats = Counter()
+
+    def get_key(self, product_id, version: str) -> str:
+        return f'{self.key_prefix}:{product_id}:{version}'
+
+    def get_version_key(self, product_id) -> str:
+        return f'{self.version_key_prefix}:{product_id}'
+
+    def get_versions(self, product_ids) -> dict:
+        """
+        Get the current version token of many products, missing ones are created.
+        Returns a dictionary with product_id as key and the token as value.
+        """
+        keys = {self.get_version_key(product_id): product_id for product_id in product_ids}
+        versions = cache.get_many(keys)
+
+        missing = keys.keys() - versions.keys()
+        if missing:
+            for key in missing:
+                cache.add(key, uuid.uuid4().hex, None)
+            versions.update(cache.get_many(missing))
+        return {keys[key]: version for key, version in versions.items()}
+
+    def get_many(self, product_ids) -> dict:
+        """
+        Get the bill of materials of many products.
+        Returns a dictionary with product_id as key and a {material_id: quantity} mapping as value.
+        """
+        product_ids = set(product_ids)
+        versions = {}
+        boms = self.get_cached(product_ids, versions)
+
+        missing = product_ids - boms.keys()
+        if missing:
+            self.stats['misses'] += len(missing)
+            loaded = self.load(missing, versions)
+            self.store(loaded, versions)
+            boms.update((product_id, loaded[product_id]) for product_id in missing)
+
+        return boms
+
+    def get_cached(self, product_ids, versions: dict = None) -> dict:
+        """
+        Get the bill of materials of the products found in either cache level, without touching the database.
+        The versions of the products missing from the local level are added to `versions`, if given.
+        """
+        boms = {}
+
+        now = time.monotonic()
+        with self.lock:
+            for product_id in product_ids:
+                entry = self.local.get(product_id)
+                if entry is not None and entry[0] > now:
+                    self.local.move_to_end(product_id)
+                    boms[product_id] = entry[1]
+            self.stats['local_hits'] += len(boms)
+
+        missing = set(product_ids) - boms.keys()
+        if missing:
+            missing_versions = self.get_versions(missing)
+            if versions is not None:
+                versions.update(missing_versions)
+
+            keys = {
+                self.get_key(product_id, version): product_id for product_id, version in missing_versions.items()
+            }
+            shared = cache.get_many(keys)
+            for key, bom in shared.items():
+                boms[keys[key]] = bom
+            self.stats['shared_hits'] += len(shared)
+            self.store_local({keys[key]: bom for key, bom in shared.items()})
+
+        return boms
+
+    def store(self, boms: dict, versions: dict) -> None:
+        """
+        Write loaded bills of materials to both cache levels, except those of the products invalidated since their
+        version was read, before they were loaded.
+        """
+        current_versions = self.get_versions(boms.keys())
+        fresh = {
+            product_id: bom
+            for product_id, bom in boms.items()
+            if product_id in versions and current_versions.get(product_id) == versions[product_id]
+        }
+        cache.set_many(
+            {self.get_key(product_id, versions[product_id]): bom for product_id, bom in fresh.items()},
+            self.timeout
+        )
+        self.store_local(fresh)
+
+    def load(self, product_ids, versions: dict = None) -> dict:
+        """
+        Load the bill of materials of many products from the database and explode their sub-recipes.
+
+        The recipe graph is walked one level at a time, with one query for the ingredients and one for the
+        components of the whole level. Components whose bill of materials is already cached are not walked any
+        further, the versions of the others are added to `versions`, if given, before they are read. The
+        returned dictionary holds the flattened bill of materials of every walked product, not only the
+        requested ones, so that each of them gets memoized.
+
+        Raises:
+            - ValidationError: If the recipes form a cycle.
+        """
+        from restaurant.models import RecipeIngredient, RecipeComponent
+
+        materials = {}
+        components = {}
+        known = {}
+
+        level = set(product_ids)
+        while level:
+            for product_id in level:
+                materials[product_id] = {}
+                components[product_id] = {}
+
+            for product_id, material_id, quantity_consumed in RecipeIngredient.objects.filter(
+                product_id__in=level
+            ).values_list('product_id', 'material_id', 'quantity_consumed'):
+                bom = materials[product_id]
+                bom[material_id] = bom.get(material_id, 0) + quantity_consumed
+
+            for product_id, component_id, quantity_consumed in RecipeComponent.objects.filter(
+                product_id__in=level
+            ).values_list('product_id', 'component_id', 'quantity_consumed'):
+                components[product_id][component_id] = quantity_consumed
+
+            children = {
+                component_id for product_id in level for component_id in components[product_id]
+            } - materials.keys() - known.keys()
+            known.update(self.get_cached(children, versions))
+            level = children - known.keys()
+
+        boms = {}
+        for product_id in materials:
+            self.explode(product_id, materials, components, known, boms, ())
+        return boms
+
+    def explode(self, product_id, materials: dict, components: dict, known: dict, boms: dict, path: tuple) -> dict:
+        """
+        Flatten the bill of materials of a product from its direct ingredients and components, depth first.
+        The flattened bill of materials of every visited product is kept in `boms`.
+        """
+        if product_id in boms:
+            return boms[product_id]
+        if product_id in known:
+            return known[product_id]
+        if product_id in path:
+            cycle = ' -> '.join(str(item) for item in path[path.index(product_id):] + (product_id,))
+            raise ValidationError({'recipe': f'Recipe cycle detected: {cycle}.'})
+
+        bom = dict(materials[product_id])
+        for component_id, quantity in components[product_id].items():
+            component_bom = self.explode(component_id, materials, components, known, boms, path + (product_id,))
+            for material_id, quantity_consumed in component_bom.items():
+                bom[material_id] = bom.get(material_id, 0) + quantity_consumed * quantity
+
+        boms[product_id] = bom
+        return bom
+
+    def store_local(self, boms: dict) -> None:
+        expires_at = time.monotonic() + self.local_ttl
+        with self.lock:
+            for product_id, bom in boms.items():
+                self.local[product_id] = (expires_at, bom)
+                self.local.move_to_end(product_id)
+            while len(self.local) > self.maxsize:
+                self.local.popitem(last=False)
+
+    def invalidate(self, product_ids) -> None:
+        """
+        Drop the bill of materials of many products from both cache levels, by replacing their version.
+        """
+        product_ids = {product_id for product_id in product_ids if product_id is not None}
+        with self.lock:
+            for product_id in product_ids:
+                self.local.pop(product_id, None)
+        cache.set_many({self.get_version_key(product_id): uuid.uuid4().hex for product_id in product_ids}, None)
+        self.stats['invalidations'] += len(product_ids)
+
+    def clear(self) -> None:
+        with self.lock:
+            self.local.clear()
+            self.stats.clear()
+
+    def get_stats(self) -> dict:
+        """
+        Get the hit, miss and invalidation counters along with the current local size.
+        """
+        with self.lock:
+            return {
+                'local_hits': self.stats['local_hits'],
+                'shared_hits': self.stats['shared_hits'],
+                'misses': self.stats['misses'],
+                'invalidations': self.stats['invalidations'],
+                'local_size': len(self.local),
+            }
+
+
+recipe_cache = RecipeCache(
+    maxsize=getattr(settings, 'RECIPE_CACHE_SIZE', 1024),
+    local_ttl=getattr(settings, 'RECIPE_CACHE_LOCAL_TTL', 60),
+    timeout=getattr(settings, 'RECIPE_CACHE_TIMEOUT', 24 * 60 * 60),
+)
+
+
+def get_products_bom(product_ids) -> dict:
+    """
+    Get the bill of materials of many products through the recipe cache.
+    Returns a dictionary with product_id as key and a {material_id: quantity} mapping as value.
+    """
+    return recipe_cache.get_many(product_ids)
+
+
+def get_product_bom(product_id) -> dict:
+    """
+    Get the bill of materials of one product through the recipe cache.
+    """
+    return recipe_cache.get_many([product_id])[product_id]
+
+
+def get_parent_products(product_ids) -> set:
+    """
+    Get the products using any of the given products as a component, directly or not.
+    Runs one query per level of the recipe graph.
+    """
+    from restaurant.models import RecipeComponent
+
+    parents = set()
+    level = set(product_ids)
+    while level:
+        level = set(
+            RecipeComponent.objects.filter(component_id__in=level).values_list('product_id', flat=True)
+        ) - parents
+        parents |= level
+    return parents
+
+
+def get_sub_products(product_ids) -> set:
+    """
+    Get the products used as a component by any of the given products, directly or not.
+    Runs one query per level of the recipe graph.
+    """
+    from restaurant.models import RecipeComponent
+
+    children = set()
+    level = set(product_ids)
+    while level:
+        level = set(
+            RecipeComponent.objects.filter(product_id__in=level).values_list('component_id', flat=True)
+        ) - children
+        children |= level
+    return children
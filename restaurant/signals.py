@@ -0,0 +1,69 @@
+from django.dispatch import receiver
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+
+from restaurant.lineage import record_lineage
+from restaurant.models import (RestaurantPackagedMaterial, RestaurantPackagedMaterialConsumption,
+                               RestaurantStockPosition, MaterialLineage, Product, RecipeIngredient, RecipeComponent)
+from restaurant.recipes import recipe_cache, get_parent_products
+
+
+@receiver(post_delete, sender=RestaurantPackagedMaterial)
+def update_stock_position_on_package_delete(sender, instance, **kwargs):
+    """
+    Remove the remaining quantity of a deleted lot from the restaurant stock position
+    """
+    RestaurantStockPosition.objects.apply_deltas({
+        instance.get_stock_key(): -(instance.current_package_quantity or 0)
+    })
+
+
+@receiver(post_save, sender=RestaurantPackagedMaterialConsumption)
+def record_lineage_on_consumption_save(sender, instance, created, raw=False, **kwargs):
+    """
+    Write the lineage of a consumption saved on its own, and write it again when the consumption changes.
+    The bulk consumption of orders records the lineage of its consumptions itself, see `orders.consumption`
+    """
+    if raw:
+        return
+    if not created:
+        MaterialLineage.objects.filter(consumption=instance).delete()
+    record_lineage([instance])
+
+
+def invalidate_recipes(product_ids) -> None:
+    """
+    Drop cached recipes along with the recipes using them as components, now, and again on commit in case they
+    were read back before the transaction ended
+    """
+    product_ids = {product_id for product_id in product_ids if product_id is not None}
+    product_ids |= get_parent_products(product_ids)
+    recipe_cache.invalidate(product_ids)
+    transaction.on_commit(lambda: recipe_cache.invalidate(product_ids))
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def invalidate_recipe_on_ingredient_change(sender, instance, **kwargs):
+    """
+    Invalidate the cached recipe of the product owning a changed ingredient, and of its previous product
+    """
+    invalidate_recipes([instance.product_id, instance.old_value('product')])
+
+
+@receiver(post_save, sender=RecipeComponent)
+@receiver(post_delete, sender=RecipeComponent)
+def invalidate_recipe_on_component_change(sender, instance, **kwargs):
+    """
+    Invalidate the cached recipe of the product owning a changed component, and of its previous product
+    """
+    invalidate_recipes([instance.product_id, instance.old_value('product')])
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+def invalidate_recipe_on_product_change(sender, instance, **kwargs):
+    """
+    Invalidate the cached recipe of a changed product
+    """
+    invalidate_recipes([instance.pk])
@@ -1,3 +1,370 @@
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
+from django.core.management import call_command
 from django.test import TestCase
 
-# Create your tests here.
+from accounts.models import CustomerUser, InventoryCoordinatorUser, TransporterUser, WorkerUser
+from inventory.models import Supplier, Category, Material, RawMaterial, ReadyMaterial, PackagedMaterial
+from orders.consumption import consume_ingredients
+from orders.models import Order, OrderItem
+from restaurant.lineage import backfill_lineage
+from restaurant.models import (Restaurant, RestaurantPackagedMaterial, RestaurantPackagedMaterialConsumption,
+                               RestaurantStockPosition, MaterialLineage, Product, RecipeIngredient, RecipeComponent)
+from restaurant.recipes import recipe_cache, get_product_bom, get_products_bom
+from workstation.models import Workstation, WorkstationRawMaterialConsumption, WorkstationPreparedMaterial
+
+
+class RestaurantStockTestCase(TestCase):
+    """
+    Two restaurants and a few materials, without any lot.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.transporter = TransporterUser.objects.create(username='transporter', email='transporter@example.com')
+        category = Category.objects.create(name='Category')
+        cls.restaurant = Restaurant.objects.create(name='Restaurant', location='Location')
+        cls.other_restaurant = Restaurant.objects.create(name='Other restaurant', location='Location')
+        cls.material_list = [
+            Material.objects.create(category=category, material_name=f'Material {index}') for index in range(3)
+        ]
+
+    def create_lot(self, material, quantity, restaurant=None, **kwargs):
+        return RestaurantPackagedMaterial.objects.create(
+            restaurant=restaurant or self.restaurant, material=material, initial_package_quantity=quantity,
+            transporter=self.transporter, **kwargs
+        )
+
+    def get_positions(self) -> dict:
+        return {
+            (restaurant_id, material_id): (quantity, reserved_quantity)
+            for restaurant_id, material_id, quantity, reserved_quantity in RestaurantStockPosition.objects.values_list(
+                'restaurant_id', 'material_id', 'quantity', 'reserved_quantity'
+            )
+        }
+
+
+class StockPositionTests(RestaurantStockTestCase):
+
+    def test_lots_add_up_per_restaurant_and_material(self):
+        material, other_material, _ = self.material_list
+        self.create_lot(material, 10)
+        self.create_lot(material, 5)
+        self.create_lot(other_material, 7)
+        self.create_lot(material, 3, restaurant=self.other_restaurant)
+
+        self.assertEqual(self.get_positions(), {
+            (self.restaurant.pk, material.pk): (15, 0),
+            (self.restaurant.pk, other_material.pk): (7, 0),
+            (self.other_restaurant.pk, material.pk): (3, 0),
+        })
+
+    def test_quantity_changes_apply_their_difference(self):
+        material = self.material_list[0]
+        lot = self.create_lot(material, 10)
+        self.create_lot(material, 5)
+
+        lot.reduce_current_package_quantity(4)
+        self.assertEqual(self.get_positions()[self.restaurant.pk, material.pk], (11, 0))
+
+        lot.reduce_current_package_quantity(6)
+        self.assertEqual(self.get_positions()[self.restaurant.pk, material.pk], (5, 0))
+        self.assertIsNotNone(lot.finished_date)
+
+    def test_moved_lot_moves_its_stock(self):
+        material, other_material, _ = self.material_list
+        lot = self.create_lot(material, 10)
+
+        lot = RestaurantPackagedMaterial.objects.get(pk=lot.pk)
+        lot.restaurant = self.other_restaurant
+        lot.material = other_material
+        lot.save()
+
+        positions = self.get_positions()
+        self.assertEqual(positions[self.restaurant.pk, material.pk], (0, 0))
+        self.assertEqual(positions[self.other_restaurant.pk, other_material.pk], (10, 0))
+
+    def test_deleted_lot_removes_its_stock(self):
+        material = self.material_list[0]
+        lot = self.create_lot(material, 10)
+        self.create_lot(material, 5)
+
+        lot.delete()
+
+        self.assertEqual(self.get_positions()[self.restaurant.pk, material.pk], (5, 0))
+
+    def test_rebuild_matches_incremental_positions(self):
+        material, other_material, _ = self.material_list
+        lot = self.create_lot(material, 10)
+        self.create_lot(other_material, 8, restaurant=self.other_restaurant)
+        lot.reduce_current_package_quantity(3)
+        incremental = self.get_positions()
+
+        RestaurantStockPosition.objects.update(quantity=0)
+        RestaurantStockPosition.objects.rebuild()
+
+        self.assertEqual(self.get_positions(), incremental)
+
+    def test_rebuild_bumps_position_versions(self):
+        material = self.material_list[0]
+        self.create_lot(material, 10)
+        position = RestaurantStockPosition.objects.get(restaurant=self.restaurant, material=material)
+
+        RestaurantStockPosition.objects.rebuild()
+
+        rebuilt = RestaurantStockPosition.objects.get(pk=position.pk)
+        self.assertGreater(rebuilt.version, position.version)
+        self.assertFalse(
+            RestaurantStockPosition.objects.filter(pk=position.pk, version=position.version).exists()
+        )
+
+    def test_rebuild_zeroes_positions_without_stock(self):
+        material = self.material_list[0]
+        lot = self.create_lot(material, 10)
+        RestaurantPackagedMaterial.objects.filter(pk=lot.pk).delete()
+
+        RestaurantStockPosition.objects.rebuild()
+
+        self.assertEqual(self.get_positions(), {(self.restaurant.pk, material.pk): (0, 0)})
+
+
+class RecipeTestCase(TestCase):
+    """
+    A few materials and an empty cache, recipes are created by each test.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        category = Category.objects.create(name='Category')
+        cls.material_list = [
+            Material.objects.create(category=category, material_name=f'Material {index}') for index in range(3)
+        ]
+
+    def setUp(self):
+        cache.clear()
+        recipe_cache.clear()
+
+    def create_product(self, name, ingredients=None):
+        product = Product.objects.create(name=name, selling_price=1)
+        for material, quantity in (ingredients or {}).items():
+            RecipeIngredient.objects.create(product=product, material=material, quantity_consumed=quantity)
+        return product
+
+
+class RecipeCacheTests(RecipeTestCase):
+
+    def test_cached_recipe_is_read_without_queries(self):
+        material = self.material_list[0]
+        product = self.create_product('Product', {material: 2})
+        self.assertEqual(get_product_bom(product.pk), {material.pk: 2})
+
+        with self.assertNumQueries(0):
+            self.assertEqual(get_product_bom(product.pk), {material.pk: 2})
+
+        # Another process only has the shared level
+        recipe_cache.clear()
+        with self.assertNumQueries(0):
+            self.assertEqual(get_product_bom(product.pk), {material.pk: 2})
+
+    def test_ingredient_changes_invalidate_recipe(self):
+        material, other_material, _ = self.material_list
+        product = self.create_product('Product', {material: 2})
+        get_product_bom(product.pk)
+
+        ingredient = RecipeIngredient.objects.get(product=product)
+        ingredient.quantity_consumed = 5
+        ingredient.save()
+        self.assertEqual(get_product_bom(product.pk), {material.pk: 5})
+
+        RecipeIngredient.objects.create(product=product, material=other_material, quantity_consumed=1)
+        self.assertEqual(get_product_bom(product.pk), {material.pk: 5, other_material.pk: 1})
+
+        ingredient.delete()
+        self.assertEqual(get_product_bom(product.pk), {other_material.pk: 1})
+
+    def test_load_racing_with_invalidation_is_not_stored(self):
+        material = self.material_list[0]
+        product = self.create_product('Product', {material: 2})
+        load = recipe_cache.load
+
+        def load_then_change_recipe(*args, **kwargs):
+            boms = load(*args, **kwargs)
+            RecipeIngredient.objects.filter(product=product).update(quantity_consumed=3)
+            recipe_cache.invalidate([product.pk])
+            return boms
+
+        with mock.patch.object(recipe_cache, 'load', side_effect=load_then_change_recipe):
+            self.assertEqual(get_product_bom(product.pk), {material.pk: 2})
+
+        self.assertEqual(recipe_cache.get_cached([product.pk]), {})
+        self.assertEqual(get_product_bom(product.pk), {material.pk: 3})
+
+
+class SubRecipeTests(RecipeTestCase):
+
+    def setUp(self):
+        super().setUp()
+        material, other_material, third_material = self.material_list
+        # A dish using two sauces, one of them made with the other
+        self.base = self.create_product('Base', {material: 2})
+        self.sauce = self.create_product('Sauce', {other_material: 1})
+        self.dish = self.create_product('Dish', {third_material: 4})
+        RecipeComponent.objects.create(product=self.sauce, component=self.base, quantity_consumed=3)
+        RecipeComponent.objects.create(product=self.dish, component=self.sauce, quantity_consumed=2)
+        RecipeComponent.objects.create(product=self.dish, component=self.base, quantity_consumed=1)
+
+    def test_bill_of_materials_is_flattened(self):
+        material, other_material, third_material = self.material_list
+        self.assertEqual(get_products_bom([self.dish.pk, self.sauce.pk]), {
+            self.dish.pk: {material.pk: 2 * 3 * 2 + 2, other_material.pk: 2, third_material.pk: 4},
+            self.sauce.pk: {material.pk: 6, other_material.pk: 1},
+        })
+
+    def test_walked_components_are_memoized(self):
+        get_product_bom(self.dish.pk)
+
+        with self.assertNumQueries(0):
+            get_products_bom([self.sauce.pk, self.base.pk])
+
+    def test_component_changes_invalidate_their_users(self):
+        material = self.material_list[0]
+        get_product_bom(self.dish.pk)
+
+        RecipeIngredient.objects.filter(product=self.base).get().delete()
+        RecipeIngredient.objects.create(product=self.base, material=material, quantity_consumed=1)
+
+        self.assertEqual(get_product_bom(self.dish.pk)[material.pk], 3 * 2 + 1)
+
+    def test_cycles_are_refused(self):
+        with self.assertRaises(ValidationError):
+            RecipeComponent.objects.create(product=self.base, component=self.dish, quantity_consumed=1)
+        with self.assertRaises(ValidationError):
+            RecipeComponent.objects.create(product=self.base, component=self.base, quantity_consumed=1)
+
+    def test_cycles_written_around_validation_are_detected(self):
+        RecipeComponent.objects.bulk_create([
+            RecipeComponent(id='ING-SUB-CYCLE', product=self.base, component=self.dish, quantity_consumed=1)
+        ])
+        recipe_cache.invalidate([self.base.pk, self.sauce.pk, self.dish.pk])
+        recipe_cache.clear()
+
+        with self.assertRaisesMessage(ValidationError, 'Recipe cycle detected'):
+            get_product_bom(self.dish.pk)
+
+
+class LineageTests(TestCase):
+    """
+    A restaurant lot packaged from a raw material lot, and another delivered without upstream lots.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        coordinator = InventoryCoordinatorUser.objects.create(username='coordinator', email='c@example.com')
+        worker = WorkerUser.objects.create(username='worker', email='w@example.com')
+        transporter = TransporterUser.objects.create(username='transporter', email='t@example.com')
+        customer = CustomerUser.objects.create(username='customer', email='cu@example.com')
+        cls.supplier = Supplier.objects.create(name='Supplier')
+        cls.material = Material.objects.create(category=Category.objects.create(name='Category'),
+                                               material_name='Flour')
+        cls.material.suppliers.add(cls.supplier)
+        cls.restaurant = Restaurant.objects.create(name='Restaurant', location='Location')
+
+        cls.raw_material = RawMaterial.objects.create(
+            supplier=cls.supplier, material=cls.material, inventory_coordinator=coordinator, initial_quantity=10,
+            storage_location='Storage'
+        )
+        consumption = WorkstationRawMaterialConsumption.objects.create(
+            workstation=Workstation.objects.create(name='Workstation', location='Location'),
+            raw_material=cls.raw_material, worker=worker, quantity_consumed=10, transporter=transporter
+        )
+        cls.ready_material = ReadyMaterial.objects.create(
+            workstation_prepared_material=WorkstationPreparedMaterial.objects.create(
+                workstation_raw_material_consumption=consumption, quantity=10
+            ),
+            inventory_coordinator=coordinator, initial_quantity=10, transporter=transporter
+        )
+        cls.packaged_material = PackagedMaterial.objects.create(ready_material=cls.ready_material, worker=worker,
+                                                                quantity=10)
+        cls.lot = RestaurantPackagedMaterial.objects.create(
+            restaurant=cls.restaurant, material=cls.material, package_material=cls.packaged_material,
+            initial_package_quantity=10, transporter=transporter
+        )
+        cls.unpackaged_lot = RestaurantPackagedMaterial.objects.create(
+            restaurant=cls.restaurant, material=cls.material, initial_package_quantity=10, transporter=transporter
+        )
+
+        product = Product.objects.create(name='Bread', selling_price=Decimal('3'))
+        RecipeIngredient.objects.create(product=product, material=cls.material, quantity_consumed=1)
+        order = Order.objects.create(restaurant=cls.restaurant, customer=customer)
+        cls.order_item = OrderItem.objects.create(order=order, product=product, quantity=1)
+
+    def create_consumption(self, lot, quantity=1):
+        return RestaurantPackagedMaterialConsumption.objects.create(
+            order_item=self.order_item, restaurant_package_material=lot, material=self.material,
+            quantity_consumed=quantity
+        )
+
+    def get_lineage(self, consumption) -> tuple:
+        return MaterialLineage.objects.filter(consumption=consumption).values_list(
+            'order_item_id', 'restaurant_id', 'restaurant_package_material_id', 'package_material_id',
+            'ready_material_id', 'raw_material_id', 'supplier_id', 'quantity_consumed'
+        ).get()
+
+    def test_saved_consumption_records_every_upstream_level(self):
+        consumption = self.create_consumption(self.lot, 3)
+
+        self.assertEqual(self.get_lineage(consumption), (
+            self.order_item.pk, self.restaurant.pk, self.lot.pk, self.packaged_material.pk, self.ready_material.pk,
+            self.raw_material.pk, self.supplier.pk, 3
+        ))
+
+    def test_levels_a_lot_lacks_stay_empty(self):
+        consumption = self.create_consumption(self.unpackaged_lot)
+
+        self.assertEqual(self.get_lineage(consumption), (
+            self.order_item.pk, self.restaurant.pk, self.unpackaged_lot.pk, None, None, None, None, 1
+        ))
+
+    def test_changed_consumption_rewrites_its_lineage(self):
+        consumption = self.create_consumption(self.unpackaged_lot)
+
+        consumption.restaurant_package_material = self.lot
+        consumption.quantity_consumed = 2
+        consumption.save()
+
+        self.assertEqual(MaterialLineage.objects.count(), 1)
+        self.assertEqual(self.get_lineage(consumption)[2:], (
+            self.lot.pk, self.packaged_material.pk, self.ready_material.pk, self.raw_material.pk, self.supplier.pk, 2
+        ))
+
+    def test_bulk_consumption_records_one_lineage_per_consumption(self):
+        [consumption] = consume_ingredients(self.restaurant.pk, [
+            (self.order_item.pk, self.order_item.product_id, 1)
+        ])
+
+        self.assertEqual(MaterialLineage.objects.count(), 1)
+        self.assertEqual(self.get_lineage(consumption)[1], self.restaurant.pk)
+
+    def test_backfill_writes_missing_lineage_once(self):
+        recorded = self.create_consumption(self.unpackaged_lot)
+        missing = RestaurantPackagedMaterialConsumption.objects.bulk_create([
+            RestaurantPackagedMaterialConsumption(
+                id=f'CONS-BULK-{index}', order_item=self.order_item, restaurant_package_material=lot,
+                material=self.material, quantity_consumed=1
+            )
+            for index, lot in enumerate([self.lot, self.unpackaged_lot, self.lot])
+        ])
+
+        self.assertEqual(backfill_lineage(batch_size=2), 3)
+        self.assertEqual(backfill_lineage(), 0)
+        self.assertEqual(MaterialLineage.objects.count(), 4)
+        self.assertEqual(self.get_lineage(missing[0])[5:], (self.raw_material.pk, self.supplier.pk, 1))
+        self.assertEqual(self.get_lineage(recorded)[2], self.unpackaged_lot.pk)
+
+        output = StringIO()
+        call_command('backfill_material_lineage', stdout=output)
+        self.assertIn('Wrote 0 material lineage rows.', output.getvalue())
@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 00:22
+
+import accounts.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workstation', '0005_alter_workstationpreparedmaterial_quantity'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='equipment',
+            name='eq_id_index',
+        ),
+        migrations.RemoveIndex(
+            model_name='workstation',
+            name='ws_id_index',
+        ),
+        migrations.RemoveIndex(
+            model_name='workstationpreparedmaterial',
+            name='ws_prepared_mat_id_index',
+        ),
+        migrations.RemoveIndex(
+            model_name='workstationrawmaterialconsumption',
+            name='ws_rm_id_index',
+        ),
+        migrations.AlterField(
+            model_name='equipment',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=56, primary_key=True, serialize=False, verbose_name='Equipment ID'),
+        ),
+        migrations.AlterField(
+            model_name='workstation',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=53, primary_key=True, serialize=False, verbose_name='Workstation ID'),
+        ),
+        migrations.AlterField(
+            model_name='workstationpreparedmaterial',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=56, primary_key=True, serialize=False, verbose_name='Prepared Material ID'),
+        ),
+        migrations.AlterField(
+            model_name='workstationrawmaterialconsumption',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=56, primary_key=True, serialize=False, verbose_name='Consumption ID'),
+        ),
+    ]
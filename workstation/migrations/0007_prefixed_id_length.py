@@ -0,0 +1,34 @@
+# Generated by Django 5.2.18 on 2026-10-18 01:25
+
+import accounts.fields
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('workstation', '0006_index_cleanup'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='equipment',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=58, primary_key=True, serialize=False, verbose_name='Equipment ID'),
+        ),
+        migrations.AlterField(
+            model_name='workstation',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=55, primary_key=True, serialize=False, verbose_name='Workstation ID'),
+        ),
+        migrations.AlterField(
+            model_name='workstationpreparedmaterial',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=58, primary_key=True, serialize=False, verbose_name='Prepared Material ID'),
+        ),
+        migrations.AlterField(
+            model_name='workstationrawmaterialconsumption',
+            name='id',
+            field=accounts.fields.PrefixedIDField(editable=False, max_length=58, primary_key=True, serialize=False, verbose_name='Consumption ID'),
+        ),
+    ]
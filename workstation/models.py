@@ -5,9 +5,11 @@ from django.utils import timezone
 from django.utils.translation import gettext_lazy as _
 
 from accounts.fields import PrefixedIDField
+from accounts.mixins import FieldTrackerMixin
 from accounts.models import WorkerUser, TransporterUser
 from inventory.enums import Unit
 from inventory.models import RawMaterial, Category
+from inventory.stock import get_available_quantity
 
 
 class Workstation(models.Model):
@@ -23,9 +25,6 @@ class Workstation(models.Model):
     class Meta:
         verbose_name = _('Workstation')
         verbose_name_plural = _('Workstations')
-        indexes = [
-            models.Index(fields=['id'], name='ws_id_index')
-        ]
 
     def __str__(self):
         return self.name
@@ -43,15 +42,12 @@ class Equipment(models.Model):
     class Meta:
         verbose_name = _('Equipment')
         verbose_name_plural = _('Equipment')
-        indexes = [
-            models.Index(fields=['id'], name='eq_id_index')
-        ]
 
     def __str__(self):
         return self.name
 
 
-class WorkstationRawMaterialConsumption(models.Model):
+class WorkstationRawMaterialConsumption(FieldTrackerMixin, models.Model):
     id = PrefixedIDField(prefix='WS-RM', verbose_name=_('Consumption ID'))
 
     workstation = models.ForeignKey(
@@ -80,23 +76,30 @@ class WorkstationRawMaterialConsumption(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name=_('Created At'))
     updated_at = models.DateTimeField(auto_now=True, verbose_name=_('Updated At'))
 
+    tracked_fields = ('quantity_consumed',)
+
     class Meta:
         verbose_name = _('Raw Material Consumption')
         verbose_name_plural = _('Raw Materials Consumption')
-        indexes = [
-            models.Index(fields=['id'], name='ws_rm_id_index')
-        ]
 
     def clean(self):
         # Ensure consumed quantity doesn't exceed available raw material quantity
         if self.raw_material:
-            if self.quantity_consumed > self.raw_material.current_quantity:
+            # Only new consumptions, the ones recorded before the lot expired can still be corrected
+            if self._state.adding and (self.raw_material.expired_at or (
+                self.raw_material.expiration_date and self.raw_material.expiration_date < timezone.localdate()
+            )):
+                raise ValidationError(
+                    {'raw_material': f'The raw material expired on {self.raw_material.expiration_date}.'}
+                )
+            available_quantity = get_available_quantity(self.raw_material)
+            if self.quantity_consumed > available_quantity:
                 raise ValidationError(
-                    {'quantity_consumed': f'Only {self.raw_material.current_quantity} units available.'}
+                    {'quantity_consumed': f'Only {available_quantity} units available.'}
                 )
             if self.unit != self.raw_material.unit:
                 raise ValidationError(
-                    {'unit': f'Only {self.raw_material.units} unit is acceptable.'}
+                    {'unit': f'Only {self.raw_material.unit} unit is acceptable.'}
                 )
 
     def save(self, *args, **kwargs):
@@ -122,9 +125,6 @@ class WorkstationPreparedMaterial(models.Model):
     class Meta:
         verbose_name = _('Workstation Prepared Material')
         verbose_name_plural = _('Workstation Prepared Materials')
-        indexes = [
-            models.Index(fields=['id'], name='ws_prepared_mat_id_index')
-        ]
 
     def clean(self):
         # Ensure consumed quantity doesn't exceed available raw material quantity